@@ -1,32 +1,80 @@
+import datetime
 import json
+import os
 
 from django.conf import settings
 from django.conf.urls import patterns, url
 from django.contrib import admin
+from django.contrib.admin import helpers
 from django.contrib.admin.filters import FieldListFilter
-from django.contrib.admin.views.main import ChangeList, IGNORED_PARAMS
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib import messages
+from django.contrib.admin.views.main import ChangeList, IGNORED_PARAMS, PAGE_VAR, SEARCH_VAR
 from django.core import urlresolvers
 from django.core.exceptions import SuspiciousOperation
+from django.core.paginator import InvalidPage
+from django.db.models.sql.datastructures import EmptyResultSet
 from django.db import models
+from django.db.models import F
 from django.db.models.fields import FieldDoesNotExist
-from django.http import HttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404, render_to_response, redirect
 from django.template import RequestContext
+from django.template.loader import render_to_string
+from django.utils import timezone, translation
 from django.utils.encoding import smart_str
+from django.utils.html import format_html, format_html_join
+from django.utils.http import quote_etag, parse_etags
+from django.utils.timesince import timesince
+from django.utils.translation import ugettext_lazy as _
+from django.contrib.auth.models import User
 from django.contrib.admin.util import get_fields_from_path, lookup_needs_distinct, prepare_lookup_value
 
-from models import CustomFilter, CustomQuery, CustomBundledQuery
+from models import CustomFilter, CustomQuery, CustomBundledQuery, prefetch_choices, set_prefetched_choices
 from forms import CustomFilterForm, AddCustomFilterForm
+import annotations
+import budget
+import caching
+import counters
+import facets
+import metrics
+import middleware
+import profiling
+import provisioning
+import routing
+import schema
+import snapshots
+import warmup
+from execution import ADMINFILTERS_SINGLE_FLIGHT, run_parallel, single_flight
+from sharding import ShardedQuerySet, shard_identifier
 
 ADMINFILTERS_ADD_PARAM = getattr(settings, 'ADMINFILTERS_ADD_PARAM', 'add_adminfilters')
 ADMINFILTERS_LOAD_PARAM = getattr(settings, 'ADMINFILTERS_LOAD_PARAM', 'load_adminfilters')
 ADMINFILTERS_SAVE_PARAM = getattr(settings, 'ADMINFILTERS_SAVE_PARAM', 'save_adminfilters')
 ADMINFILTERS_CREATE_FILTERS = getattr(settings, 'ADMINFILTERS_CREATE_FILTERS', False)
+ADMINFILTERS_LIVE_PARAM = getattr(settings, 'ADMINFILTERS_LIVE_PARAM', 'live_adminfilters')
+ADMINFILTERS_PROVISIONING_ADMIN = getattr(settings, 'ADMINFILTERS_PROVISIONING_ADMIN', False)
+
+COUNT_AGGREGATE = 'adminfilters_count'
+AGGREGATE_FUNCTIONS = {
+    'sum': (models.Sum, _(u'Sum')),
+    'avg': (models.Avg, _(u'Average')),
+    'min': (models.Min, _(u'Minimum')),
+    'max': (models.Max, _(u'Maximum')),
+}
+
+# columns, which are deferred in changelist when they aren't shown
+WIDE_FIELDS = (models.TextField, models.BinaryField)
 
 
 class CustomChangeList(ChangeList):
     """Customized class for extending filters loading."""
     current_filter = None
+    aggregates = ()
+    applied_lookups = None
+    snapshot = None
+    base_root_queryset = None
 
     def get_filters(self, request):
         if not request.session.get('use_new_filters'):
@@ -41,7 +89,8 @@ class CustomChangeList(ChangeList):
 
         # loading filter set params into change list, so they will be applied in queryset
         if self.current_filter:
-            filter_params, self.exclude_params, self.bundled_params = self.current_filter[0].get_filter_params()
+            with metrics.timer('adminfilters_compile_seconds', model=caching.model_label(self.model)):
+                filter_params, self.exclude_params, self.bundled_params = self.current_filter[0].get_compiled_params()
             self.params.update(**filter_params)
 
         lookup_params = self.params.copy() # a dictionary of the query string
@@ -107,18 +156,45 @@ class CustomChangeList(ChangeList):
             except FieldDoesNotExist, e:
                 lookup_params.pop(key)
                 # raise IncorrectLookupParameters(e)
+        self.applied_lookups = lookup_params
         return filter_specs, bool(filter_specs), lookup_params, use_distinct
 
         # CustomFilter.objects.all().delete()
         # return f
 
     def get_query_set(self, request):
+        """
+        Filtered queryset, it's read from read database for GET requests, so actions change rows of primary database.
+        Sharded changelist is filtered on every database separately, since subqueries of filter set can't be run
+        on other database than their outer query.
+        """
+        # queryset is built again for actions, so root queryset of model admin is kept
+        if self.base_root_queryset is None:
+            self.base_root_queryset = self.root_queryset
+        self.root_queryset = self.base_root_queryset
+        with routing.reading(request) as alias:
+            qs = super(CustomChangeList, self).get_query_set(request)
+            shards = self.model_admin.shard_databases
+            if shards:
+                qs = ShardedQuerySet([self.filter_query_set(request, qs.using(shard)) for shard in shards])
+                self.root_queryset = ShardedQuerySet([self.root_queryset.using(shard) for shard in shards])
+                return qs
+            if alias:
+                qs = qs.using(alias)
+                self.root_queryset = self.root_queryset.using(alias)
+            return self.filter_query_set(request, qs)
+
+    def filter_query_set(self, request, qs):
+        """Applying filter set to queryset of changelist, its subqueries are run on database of given queryset."""
 
-        qs = super(CustomChangeList, self).get_query_set(request)
         try:
             qs = qs.exclude(**self.exclude_params)
         except:
             pass
+        if self.current_filter:
+            qs = self.current_filter[0].apply_queries(qs)
+        # ordering of model admin can refer to annotations, which aren't used by filter set
+        qs = annotations.annotate(qs, [str(o).lstrip('-') for o in qs.query.order_by])
         try:
             for query in self.current_filter[0].bundled_queries.all():
                 query_instance = query.query_instance(request, self.bundled_params,
@@ -128,10 +204,253 @@ class CustomChangeList(ChangeList):
                     qs = updated_qs
         except:
             pass
+        return self.plan_queryset(qs)
+
+    def list_display_fields(self):
+        """Model fields shown in list_display, or None if some columns are calculated from whole object."""
+
+        fields = []
+        for field_name in self.list_display:
+            if field_name == 'action_checkbox':
+                continue
+            try:
+                fields.append(self.lookup_opts.get_field(field_name))
+            except FieldDoesNotExist:
+                return None
+        return fields
+
+    def plan_queryset(self, qs):
+        """
+        Joining only foreign keys shown in list_display and deferring wide columns, which aren't shown.
+        Model admin can override both with list_select_related_fields and list_defer_fields.
+        """
+        display_fields = self.list_display_fields()
+        related = self.model_admin.list_select_related_fields
+        if related is None and not self.list_select_related:
+            related = [f.name for f in self.lookup_opts.fields
+                       if f.name in self.list_display and isinstance(f.rel, models.ManyToOneRel)]
+        # default change list follows all relations, when any foreign key is shown,
+        # select_related of model admin's own queryset is kept as is
+        if related is not None and not self.root_queryset.query.select_related:
+            qs = qs._clone()
+            qs.query.select_related = False
+            if related:
+                qs = qs.select_related(*related)
+
+        deferred = self.model_admin.list_defer_fields
+        if deferred is None and display_fields is not None:
+            shown = set(f.name for f in display_fields)
+            deferred = [f.name for f in self.lookup_opts.fields if isinstance(f, WIDE_FIELDS) and f.name not in shown]
+        if deferred:
+            qs = qs.defer(*deferred)
         return qs
 
+    def aggregate_fields(self):
+        return [(self.model._meta.get_field(field_name), function)
+                for field_name, function in self.model_admin.list_aggregates]
+
+    def maintained_count(self, root=False):
+        """Count of rows maintained by signals, or None if it can't be used for current changelist."""
+
+        if not self.model_admin.maintained_counts or self.model_admin.shard_databases or self.params.get(SEARCH_VAR):
+            return None
+        if root:
+            return counters.get_count(self.model, [])
+        if not self.counts_filter_set():
+            return None
+        lookups = counters.filter_lookups(self.current_filter[0])
+        return counters.get_count(self.model, lookups) if lookups is not None else None
+
+    def counts_filter_set(self):
+        """Checking if changelist rows are exactly rows of filter set, so count of filter set can be used."""
+
+        if not self.current_filter or self.applied_lookups is None:
+            return False
+        if self.model_admin.shard_databases or self.params.get(SEARCH_VAR):
+            return False
+        # lookups which don't come from filter set, like parameters of other list filters, aren't counted
+        filter_params = self.current_filter[0].get_compiled_params()[0]
+        return set(self.applied_lookups) == set(str(key) for key in filter_params)
+
+    def get_aggregates(self):
+        """Counting filtered rows together with declared aggregates, in one query."""
+
+        if not self.model_admin.list_aggregates:
+            count = self.maintained_count()
+            if count is None and warmup.ADMINFILTERS_WARMUP and self.counts_filter_set():
+                scope = self.model_admin.queryset_cache_scope(self.current_filter[0].user_id)
+                count = warmup.cached_count(self.current_filter[0], scope)
+            if count is not None:
+                return {COUNT_AGGREGATE: count}
+        aggregates = dict(('%s__%s' % (field.name, function), AGGREGATE_FUNCTIONS[function][0](field.name))
+                          for field, function in self.aggregate_fields())
+        # "pk" alias isn't resolved in subquery of annotated queryset
+        aggregates[COUNT_AGGREGATE] = models.Count(self.lookup_opts.pk.name)
+        return self.queryset.order_by().aggregate(**aggregates)
+
+    def root_count(self):
+        count = self.maintained_count(root=True)
+        return self.root_queryset.count() if count is None else count
+
+    def get_snapshot(self, request):
+        """Snapshot of just loaded filter set, if its results weren't changed by user since loading."""
+
+        if not self.current_filter or request.session.get(snapshots.SESSION_KEY) != self.current_filter[0].pk:
+            return None
+        if set(request.GET) - set([PAGE_VAR]) or self.model_admin.list_aggregates:
+            return None
+        # snapshots store primary keys of one database
+        if self.model_admin.shard_databases:
+            return None
+        return snapshots.get_snapshot(self.current_filter[0], self.get_ordering(request, self.queryset))
+
+    def get_snapshot_results(self, request, snapshot):
+        """Taking page rows by primary keys stored in snapshot, so filtered queries aren't run."""
+
+        pks = snapshot.pk_list
+        bottom = self.page_num * self.list_per_page
+        if self.show_all or bottom + self.list_per_page > len(pks) and snapshot.count > len(pks):
+            return False
+        page_pks = pks[bottom:bottom + self.list_per_page]
+        # rows deleted after snapshot was taken are skipped
+        rows = self.plan_queryset(self.root_queryset).in_bulk(page_pks)
+        page = [rows[pk] for pk in page_pks if pk in rows]
+        filtered = bool(self.get_filters_params() or self.params.get(SEARCH_VAR))
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.set_results(paginator, snapshot.count, self.root_count() if filtered else snapshot.count, page)
+        self.snapshot = snapshot
+        live_url = u'%s?%s=1' % (request.path, ADMINFILTERS_LIVE_PARAM)
+        messages.info(request, format_html(_(u'Results are taken {0} ago. <a href="{1}">Show live results</a>'),
+                                           timesince(snapshot.created), live_url))
+        return True
+
+    def get_results(self, request):
+        """
+        Running count, page and choices queries concurrently, if it's enabled for model admin.
+        Otherwise, queries are run one after another by default change list.
+        Filter set, which was just loaded, is served from its snapshot, when there's one.
+        Queries, which exceed time budget of model admin, are cancelled and changelist shows what is left.
+        """
+        with routing.reading(request):
+            self.load_results(request)
+
+    def load_results(self, request):
+        snapshot = self.get_snapshot(request)
+        if snapshot and self.get_snapshot_results(request, snapshot):
+            return
+
+        concurrent = self.model_admin.concurrent_queries
+        # sharded querysets run their queries on several databases, so they aren't limited
+        seconds = self.model_admin.query_time_budget if not self.model_admin.shard_databases else None
+        if not (concurrent or self.model_admin.list_aggregates or self.model_admin.maintained_counts
+                or warmup.ADMINFILTERS_WARMUP or seconds or ADMINFILTERS_SINGLE_FLIGHT or metrics.ADMINFILTERS_METRICS):
+            return super(CustomChangeList, self).get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        filtered = bool(self.get_filters_params() or self.params.get(SEARCH_VAR))
+        bottom = self.page_num * self.list_per_page
+        alias, root_alias = (self.queryset.db, self.root_queryset.db) if seconds else (None, None)
+        aggregates = tuple(self.model_admin.list_aggregates)
+        label = caching.model_label(self.model)
+
+        def count_rows():
+            with metrics.timer('adminfilters_count_seconds', model=label):
+                return self.shared('count', self.queryset, self.get_aggregates, aggregates)
+
+        def load_page():
+            with metrics.timer('adminfilters_query_seconds', model=label):
+                return self.shared('page', self.queryset, lambda: list(self.queryset[bottom:bottom + self.list_per_page]),
+                                   bottom, self.list_per_page)
+
+        tasks = [lambda: budget.call(alias, seconds, count_rows),
+                 lambda: budget.call(alias, seconds, load_page),
+                 lambda: budget.call(root_alias, seconds,
+                                     lambda: self.shared('count', self.root_queryset, self.root_count)) if filtered else None]
+        # rendered filters are likely to be taken from cache, so their choices aren't needed
+        if concurrent and self.current_filter and not caching.ADMINFILTERS_CACHE_FRAGMENTS:
+            queries = list(self.current_filter[0].queries.all())
+            tasks.append(lambda: prefetch_choices(queries))
+        results = run_parallel(tasks) if concurrent else [task() for task in tasks]
+        if budget.EXCEEDED in results:
+            messages.warning(request, _(u'Filter set took longer than %s seconds, so results are incomplete. '
+                                        u'Please narrow the filter.') % seconds)
+        page = results[1] if results[1] is not budget.EXCEEDED else []
+        if results[0] is budget.EXCEEDED:
+            # count isn't known, it's enough for paginator to show this page and link to the next one
+            more = 1 if len(page) == self.list_per_page else 0
+            results[0] = dict([(COUNT_AGGREGATE, max(bottom + len(page) + more, bottom + 1))] +
+                              [('%s__%s' % (field.name, function), None) for field, function in self.aggregate_fields()])
+        # aggregates might be shared with concurrent changelists, so they are copied before count is taken out
+        results[0] = dict(results[0])
+        result_count = results[0].pop(COUNT_AGGREGATE)
+        full_result_count = results[2] if filtered and results[2] is not budget.EXCEEDED else result_count
+        if len(results) > 3:
+            set_prefetched_choices(results[3])
+        self.aggregates = [{'label': u'%s: %s' % (AGGREGATE_FUNCTIONS[function][1], field.verbose_name),
+                            'value': results[0]['%s__%s' % (field.name, function)]}
+                           for field, function in self.aggregate_fields()]
+
+        self.set_results(paginator, result_count, full_result_count, page)
+
+    def shared(self, kind, queryset, task, *extra):
+        """
+        Running query once for concurrent changelists with identical query, if single-flight is enabled.
+        Queries are identified by SQL with parameters, so they include filter set, ordering and permissions.
+        """
+        if not ADMINFILTERS_SINGLE_FLIGHT:
+            return task()
+        source = getattr(queryset, 'queryset', queryset)
+        if kind == 'count':
+            # ordering doesn't change counts
+            source = source.order_by()
+        try:
+            sql = str(source.query)
+        except EmptyResultSet:
+            return task()
+        databases = getattr(queryset, 'aliases', [source.db])
+        return single_flight(caching.make_key('flight', kind, caching.fingerprint((databases, sql) + extra)), task)
+
+    def set_results(self, paginator, result_count, full_result_count, page):
+        paginator._count = result_count
+        can_show_all = result_count <= self.list_max_show_all
+        multi_page = result_count > self.list_per_page
+        if self.show_all and can_show_all and multi_page:
+            result_list = self.queryset._clone()
+        else:
+            try:
+                paginator.validate_number(self.page_num + 1)
+            except InvalidPage:
+                raise IncorrectLookupParameters
+            result_list = page
+
+        self.result_count = result_count
+        self.full_result_count = full_result_count
+        self.result_list = result_list
+        self.can_show_all = can_show_all
+        self.multi_page = multi_page
+        self.paginator = paginator
+
 
 class CustomFiltersAdmin(admin.ModelAdmin):
+    # fields with full-text index, used by "matches words" criteria
+    fulltext_fields = ()
+    # aliases of databases with the same schema, changelist is evaluated on all of them
+    shard_databases = ()
+    # running count, page and filter choices queries of changelist concurrently
+    concurrent_queries = False
+    # aggregates of filtered rows, shown below results, e.g. (('importance', 'sum'), ('importance', 'avg'))
+    list_aggregates = ()
+    # counts of filter sets with equality criterias only are maintained on save and delete, instead of COUNT(*)
+    maintained_counts = False
+    # get_queryset returns the same rows for every user, so warmed up counts and histograms are shared by users
+    user_independent_queryset = False
+    # foreign keys loaded with changelist rows and deferred columns, by default they are calculated from list_display
+    list_select_related_fields = None
+    list_defer_fields = None
+    # seconds given to count and page queries of filtered changelist, slower queries are cancelled
+    query_time_budget = None
+    # annotations offered as filter fields and ordering, e.g. {'categories_count': Count('category', distinct=True)}
+    filter_annotations = {}
 
     class Media:
         js = ('/static/admin/js/admin/DateTimeShortcuts.js',
@@ -147,10 +466,43 @@ class CustomFiltersAdmin(admin.ModelAdmin):
                'all': ('/static/adminfilters/css/adminfilters.css',)
         }
 
+    def __init__(self, *args, **kwargs):
+        super(CustomFiltersAdmin, self).__init__(*args, **kwargs)
+        # choices of filter fields are taken from this model and its related models
+        caching.track_model(self.model)
+        if self.filter_annotations:
+            annotations.register(self.model, self.filter_annotations)
+        if self.maintained_counts:
+            counters.track_model(self.model)
+
+    def action_checkbox(self, obj):
+        # primary keys aren't unique across shards, so selected rows are identified by database too
+        if not self.shard_databases:
+            return super(CustomFiltersAdmin, self).action_checkbox(obj)
+        return helpers.checkbox.render(helpers.ACTION_CHECKBOX_NAME, shard_identifier(obj))
+    action_checkbox.short_description = admin.ModelAdmin.action_checkbox.short_description
+    action_checkbox.allow_tags = True
+
+    @property
+    def delete_selected_confirmation_template(self):
+        return 'sharded_delete_selected_confirmation.html' if self.shard_databases else None
+
+    def queryset_cache_scope(self, user_id):
+        """Part of cache keys of values calculated from get_queryset, which may return different rows per user."""
+
+        return 'all' if self.user_independent_queryset else 'user-%s' % user_id
+
     def changelist_view(self, request, *args, **kwargs):
         if not request.session.get('use_new_filters'):
             return super(CustomFiltersAdmin, self).changelist_view(request, *args, **kwargs)
 
+        if ADMINFILTERS_LIVE_PARAM in request.GET:
+            request.session.pop(snapshots.SESSION_KEY, None)
+            return redirect(request.path)
+
+        if profiling.is_requested(request) and not getattr(request, 'adminfilters_profiled', False):
+            return self.profiled_changelist_view(request, *args, **kwargs)
+
         if not getattr(self, 'default_list_filter', None):
             self.default_list_filter = self.list_filter
 
@@ -160,11 +512,12 @@ class CustomFiltersAdmin(admin.ModelAdmin):
                                                                  app_name=self.model._meta.app_label, default=True)
         # once custom filter set has been created, adding fields from list_filter setting to current filter set
         if ADMINFILTERS_CREATE_FILTERS and created:
+            # queries of just created filter set are inserted at once, bulk insert doesn't send signals,
+            # so definition hash is updated explicitly below
+            CustomQuery.objects.bulk_create([CustomQuery(custom_filter=new_filter, field=field)
+                                             for field in self.default_list_filter if isinstance(field, (str, unicode))])
             for field in self.default_list_filter:
-                # since custom list_filters are not supported for now, limiting filterset criteria to fields only
-                if isinstance(field, (str, unicode)):
-                    CustomQuery.objects.get_or_create(custom_filter=new_filter, field=field)
-                else:
+                if not isinstance(field, (str, unicode)):
                     query = CustomBundledQuery.objects.get_or_create(custom_filter=new_filter, module_name=field.__module__,
                                                              class_name=field.__name__)[0]
                     query_instance = query.query_instance(None, {}, self.model, None)
@@ -173,15 +526,52 @@ class CustomFiltersAdmin(admin.ModelAdmin):
             else:
                 # if there are no pre-defined fields, adding first available field so filter set won't be empty
                 CustomQuery.objects.create(custom_filter=new_filter, field=new_filter.choices[0][0])
+            new_filter.update_definition_hash()
 
         # disabling right sidebar with filters by setting empty list_filter setting
         self.list_filter = []
 
+        if self.list_aggregates and not self.change_list_template:
+            self.change_list_template = 'aggregates_change_list.html'
+
         # overriding default ordering
         if new_filter.filter_ordering:
             self.ordering = new_filter.filter_ordering
         return super(CustomFiltersAdmin, self).changelist_view(request, *args, **kwargs)
 
+    def profiled_changelist_view(self, request, *args, **kwargs):
+        """Running changelist under profiler, captured files are linked in message."""
+
+        request.adminfilters_profiled = True
+        if profiling.ADMINFILTERS_PROFILE_PARAM in request.GET:
+            # parameter isn't passed to filter form and to pagination links
+            request.GET._mutable = True
+            request.GET.pop(profiling.ADMINFILTERS_PROFILE_PARAM)
+            request.GET._mutable = False
+            request.META['QUERY_STRING'] = request.GET.urlencode()
+        filter_sets = CustomFilter.objects.filter(user=request.user, model_name=self.model.__name__,
+                                                  app_name=self.model._meta.app_label, default=True)
+        name = profiling.capture_name(request)
+        try:
+            links = format_html_join(u', ', u'<a href="{0}">{1}</a>',
+                                     [(urlresolvers.reverse('adminfilters_profile', args=(name, kind)), kind)
+                                      for kind in sorted(profiling.CAPTURE_FILES)])
+        except urlresolvers.NoReverseMatch:
+            links = os.path.join(profiling.ADMINFILTERS_PROFILE_DIRECTORY, name + '.*')
+        # message is added before rendering, so it's shown on profiled page
+        messages.info(request, format_html(_(u'Request was profiled: {0}'), links))
+
+        def view():
+            # template response and filters are rendered inside profiler, they would be rendered after it otherwise
+            response = self.changelist_view(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            if middleware.is_installed():
+                response = middleware.CustomFiltersMiddleware().process_response(request, response)
+            return response
+
+        return profiling.profile(request, name, view, lambda: provisioning.export_filters(filter_sets))
+
     def lookup_allowed(self, *args, **kwargs):
         return True
 
@@ -201,16 +591,36 @@ class CustomFiltersAdmin(admin.ModelAdmin):
         """Extending change list class for loading custom filters."""
         return CustomChangeList
 
+    def prefetch_filter_choices(self, custom_filter, new_fields=()):
+        """
+        Loading choices of relation fields of filter set and of fields being added concurrently, one query per thread,
+        if concurrent queries are enabled. Otherwise, choices are loaded one after another, when form is built.
+        """
+        if not self.concurrent_queries:
+            return
+        columns = custom_filter.columns
+        queries = list(custom_filter.queries.all()) + [CustomQuery(custom_filter=custom_filter, field=field)
+                                                       for field in new_fields if field and field not in columns]
+        queries = [query for query in queries if query.is_relation]
+        choices = {}
+        for loaded in run_parallel([lambda query=query: prefetch_choices([query]) for query in queries]):
+            choices.update(loaded)
+        set_prefetched_choices(choices)
+
     def add_new_filter(self, request):
         """
         Controller for adding new filter set.
         On successful save, user will be redirected back to changelist controller.
         """
+        with routing.reading(request):
+            return self.edit_new_filter(request)
 
+    def edit_new_filter(self, request):
         # creating temporary filter set, it's available to attach field until it's saved
         current_filter, created = CustomFilter.objects.get_or_create(user=request.user, app_name=self.opts.app_label,
                                                                      model_name=self.model.__name__,
                                                                      default=False, name='temporary')
+        self.prefetch_filter_choices(current_filter, [request.POST.get(ADMINFILTERS_ADD_PARAM)])
         form = AddCustomFilterForm(custom_filter=current_filter)
         if request.method == 'POST':
             form = AddCustomFilterForm(request.POST, custom_filter=current_filter)
@@ -246,23 +656,44 @@ class CustomFiltersAdmin(admin.ModelAdmin):
         """
         Dedicated controller for saving filter set and its settings.
         """
+        action = ('add' if request.GET.get(ADMINFILTERS_ADD_PARAM) else 'load' if request.GET.get(ADMINFILTERS_LOAD_PARAM)
+                  else 'save' if request.GET.get(ADMINFILTERS_SAVE_PARAM) else 'other')
+        label = caching.model_label(self.model)
+        metrics.inc('adminfilters_save_filter_total', model=label, action=action)
+        with metrics.timer('adminfilters_save_filter_seconds', model=label, action=action):
+            with routing.reading(request):
+                return self.update_filter(request)
+
+    def update_filter(self, request):
         new_query = request.GET.get(ADMINFILTERS_ADD_PARAM, None)
         load_preset = request.GET.get(ADMINFILTERS_LOAD_PARAM, None)
         save_filter = request.GET.get(ADMINFILTERS_SAVE_PARAM, None)
         data = {'success': True}
 
+        if load_preset or save_filter:
+            routing.record_write(request)
+
         if load_preset:
             CustomFilter.objects.filter(user=request.user, model_name=self.model.__name__,
                                         app_name=self.model._meta.app_label).update(default=False)
-            CustomFilter.objects.filter(id=load_preset).update(default=True)
+            CustomFilter.objects.filter(id=load_preset).update(default=True, load_count=F('load_count') + 1,
+                                                               last_loaded=timezone.now())
+            # first pages of loaded filter set are served from its snapshot, until user changes it
+            request.session[snapshots.SESSION_KEY] = int(load_preset)
+        elif save_filter:
+            request.session.pop(snapshots.SESSION_KEY, None)
 
         new_filter = CustomFilter.objects.get(user=request.user, model_name=self.model.__name__,
                                               app_name=self.model._meta.app_label, default=True)
         if new_query:
-            form = CustomFilterForm(request.GET.copy(), custom_filter=new_filter, new_query=new_query)
-            return render_to_response('custom_filter_form.html', {'form': form}, context_instance=RequestContext(request))
+            def render():
+                self.prefetch_filter_choices(new_filter, [new_query])
+                form = CustomFilterForm(request.GET.copy(), custom_filter=new_filter, new_query=new_query)
+                return render_to_string('custom_filter_form.html', {'form': form}, context_instance=RequestContext(request))
+            return HttpResponse(caching.cached_fragment(self.model, lambda: caching.fragment_key(request, new_filter, 'add', new_query), render))
 
         if save_filter:
+            self.prefetch_filter_choices(new_filter)
             form = CustomFilterForm(request.GET.copy(), custom_filter=new_filter)
             if form.is_valid():
                 form.save()
@@ -272,6 +703,52 @@ class CustomFiltersAdmin(admin.ModelAdmin):
                 data.update(response=response, success=False)
         return HttpResponse(json.dumps(data), content_type='application/json')
 
+    def filter_schema(self, request):
+        """
+        JSON description of current filter set, used by client side for rendering field rows.
+        Row of single field is described if "field" parameter is given.
+        """
+        with routing.reading(request):
+            return self.render_filter_schema(request)
+
+    def render_filter_schema(self, request):
+        current_filter = get_object_or_404(CustomFilter, user=request.user, model_name=self.model.__name__,
+                                           app_name=self.model._meta.app_label, default=True)
+        field = request.GET.get('field', None)
+        etag = caching.fingerprint((current_filter.version, caching.data_version(self.model),
+                                    translation.get_language(), field))
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponseNotModified()
+        else:
+            self.prefetch_filter_choices(current_filter, [field])
+            data = schema.filter_schema(current_filter, field)
+            response = HttpResponse(json.dumps(data, cls=DjangoJSONEncoder), content_type='application/json')
+        response['ETag'] = quote_etag(etag)
+        return response
+
+    def histogram(self, request):
+        """
+        JSON histogram of date field values by day, week or month.
+        Histogram is calculated for rows, matching current filter set without criteria of this field.
+        """
+        current_filter = get_object_or_404(CustomFilter, user=request.user, model_name=self.model.__name__,
+                                           app_name=self.model._meta.app_label, default=True)
+        query = CustomQuery(custom_filter=current_filter, field=request.GET.get('field', ''))
+        period = request.GET.get('period', 'month')
+        if query.field_type not in ('date', 'datetime') or period not in facets.PERIODS:
+            raise Http404
+        queryset = self.get_queryset(request).using(routing.request_alias(request))
+        queryset = current_filter.get_queryset(queryset, skip_fields=[query.field])
+        buckets = facets.cached_date_histogram(current_filter, queryset, query.field, query.model_field, period,
+                                               self.queryset_cache_scope(request.user.pk))
+        data = {'field': query.field,
+                'field_type': query.field_type,
+                'period': period,
+                'buckets': [{'start': start, 'end': end, 'count': count,
+                             # "between" criteria excludes start value, so range starts from the day before bucket
+                             'after': start - datetime.timedelta(1)} for start, end, count in buckets]}
+        return HttpResponse(json.dumps(data, cls=DjangoJSONEncoder), content_type='application/json')
+
     def delete_filter(self, request, filter_id):
         """Deleting custom filter and redirecting back to change list. User allowed to delete own filters only."""
 
@@ -294,8 +771,34 @@ class CustomFiltersAdmin(admin.ModelAdmin):
         custom_urls = patterns('',
             url(r'^add_filter/$', self.add_new_filter, name='%s_%s_add_filter' % options),
             url(r'^save_filter/$', self.save_filter, name='%s_%s_save_filter' % options),
+            url(r'^filter_schema/$', self.filter_schema, name='%s_%s_filter_schema' % options),
+            url(r'^histogram/$', self.histogram, name='%s_%s_histogram' % options),
             url(r'^delete_filter/(\d+)/$', self.delete_filter, name='%s_%s_delete_filter' % options),
             url(r'^clear_filter/$', self.clear_filter, name='%s_%s_clear_filter' % options),
         )
 
         return custom_urls + urls
+
+
+class CustomFilterAdmin(admin.ModelAdmin):
+    """Filter sets of all users, with actions for exporting them and cloning them to staff users."""
+
+    list_display = ('name', 'user', 'app_name', 'model_name', 'default', 'load_count')
+    list_filter = ('app_name', 'model_name', 'default')
+    actions = ['export_filter_sets', 'clone_to_staff_users']
+
+    def export_filter_sets(self, request, queryset):
+        response = HttpResponse(json.dumps(provisioning.export_filters(queryset), indent=2),
+                                content_type='application/json')
+        response['Content-Disposition'] = 'attachment; filename=adminfilters.json'
+        return response
+    export_filter_sets.short_description = _(u'Export selected filter sets to JSON')
+
+    def clone_to_staff_users(self, request, queryset):
+        users = list(User.objects.filter(is_staff=True, is_active=True).values_list('pk', flat=True))
+        created = provisioning.import_filters(provisioning.export_filters(queryset), users)
+        self.message_user(request, _(u'%s filter sets were created.') % created)
+    clone_to_staff_users.short_description = _(u'Clone selected filter sets to all staff users')
+
+if ADMINFILTERS_PROVISIONING_ADMIN:
+    admin.site.register(CustomFilter, CustomFilterAdmin)
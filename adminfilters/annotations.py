@@ -0,0 +1,70 @@
+"""
+Annotations of filtered model, declared with ``filter_annotations`` of CustomFiltersAdmin.
+
+Annotation, like ``Count('category')`` or ``Max('event__start')``, is offered as filter field and ordering
+choice. Queryset is annotated only with annotations used by filter set, criterias on them are compiled to
+``HAVING`` clause, so filtering and ordering stay in database and only page of rows is loaded.
+"""
+from django.db import models
+
+from . import paths
+from .caching import model_label
+
+_annotations = {}
+_fields = {}
+
+
+def register(model, annotations):
+    _annotations[model_label(model)] = dict(annotations)
+
+
+def get_annotations(model):
+    return _annotations.get(model_label(model), {})
+
+
+def is_annotation(model, name):
+    return model is not None and name in get_annotations(model)
+
+
+def label(name):
+    return name.replace('_', ' ').capitalize()
+
+
+def annotation_field(model, name):
+    """
+    Unbound model field describing value of annotation, so form rows and criterias are chosen as for model fields.
+    Minimum and maximum of date fields are dates, other aggregates are compared as integers.
+    """
+    key = (model_label(model), name)
+    if key not in _fields:
+        aggregate = get_annotations(model)[name]
+        field = models.IntegerField()
+        if aggregate.name in ('Min', 'Max'):
+            path = paths.resolve(model, aggregate.lookup)
+            if path is not None and isinstance(path.field, models.DateField):
+                field = path.field.__class__()
+        field.set_attributes_from_name(name)
+        field.verbose_name = label(name)
+        _fields[key] = field
+    return _fields[key]
+
+
+def field_choices(model):
+    return [(name, label(name)) for name in sorted(get_annotations(model))]
+
+
+def ordering_choices(model):
+    choices = []
+    for name, verbose_name in field_choices(model):
+        choices.append((name, verbose_name + '(Asc)'))
+        choices.append(('-' + name, verbose_name + '(Desc)'))
+    return choices
+
+
+def annotate(queryset, names):
+    """Annotating queryset with given declared annotations, names which aren't annotations are ignored."""
+
+    declared = get_annotations(queryset.model)
+    used = dict((name, declared[name]) for name in names
+                if name in declared and name not in queryset.query.aggregates)
+    return queryset.annotate(**used) if used else queryset
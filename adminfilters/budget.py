@@ -0,0 +1,75 @@
+"""
+Time budget of filtered changelist queries.
+
+Query, which runs longer than the budget, is cancelled by database: with ``statement_timeout`` on PostgreSQL
+and with progress handler on SQLite. Queries on other backends are not limited. Cancelled query raises
+``BudgetExceeded``, so changelist can show what it has instead of waiting for database.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+# number of SQLite virtual machine instructions between checks of deadline
+SQLITE_PROGRESS_STEPS = 1000
+POSTGRESQL_QUERY_CANCELED = '57014'
+
+EXCEEDED = object()
+
+
+class BudgetExceeded(Exception):
+    pass
+
+
+@contextmanager
+def time_budget(alias, seconds):
+    """Cancelling queries on given database, which are run in the block after given number of seconds."""
+
+    connection = connections[alias or DEFAULT_DB_ALIAS] if seconds else None
+    if connection is None or connection.vendor not in ('postgresql', 'sqlite'):
+        yield
+        return
+    if connection.vendor == 'postgresql':
+        nested = connection.in_atomic_block
+        # cancelled query breaks transaction, so it's run in its own transaction or savepoint
+        with transaction.atomic(using=connection.alias):
+            cursor = connection.cursor()
+            cursor.execute('SET LOCAL statement_timeout = %d' % max(int(seconds * 1000), 1))
+            try:
+                yield
+            except DatabaseError as e:
+                if getattr(getattr(e, '__cause__', None), 'pgcode', None) == POSTGRESQL_QUERY_CANCELED:
+                    raise BudgetExceeded()
+                raise
+            if nested:
+                cursor.execute('SET LOCAL statement_timeout TO DEFAULT')
+    else:
+        deadline = time.time() + seconds
+        state = {'exceeded': False}
+
+        def interrupt():
+            if time.time() > deadline:
+                state['exceeded'] = True
+                return 1
+            return 0
+
+        connection.cursor()
+        connection.connection.set_progress_handler(interrupt, SQLITE_PROGRESS_STEPS)
+        try:
+            yield
+        except DatabaseError:
+            if state['exceeded']:
+                raise BudgetExceeded()
+            raise
+        finally:
+            connection.connection.set_progress_handler(None, 0)
+
+
+def call(alias, seconds, task):
+    """Running callable within time budget, EXCEEDED is returned if it was cancelled."""
+
+    try:
+        with time_budget(alias, seconds):
+            return task()
+    except BudgetExceeded:
+        return EXCEEDED
@@ -0,0 +1,150 @@
+"""
+Caching of rendered filter fragments.
+
+Fragments are keyed on user, filter set and its state, active language and GET parameters.
+Choices of filter fields depend on data of filtered model and its related models, so every
+tracked model has version counter, which is bumped on save and delete. Models reached through
+relation paths of filter fields are tracked up to ``ADMINFILTERS_RELATION_DEPTH``, choices of
+paths through untracked models aren't cached.
+"""
+import hashlib
+import time
+import urllib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete
+from django.utils import translation
+from django.utils.encoding import smart_str
+
+from . import metrics, paths
+
+ADMINFILTERS_CACHE_FRAGMENTS = getattr(settings, 'ADMINFILTERS_CACHE_FRAGMENTS', False)
+ADMINFILTERS_CACHE_TIMEOUT = getattr(settings, 'ADMINFILTERS_CACHE_TIMEOUT', 60 * 60)
+ADMINFILTERS_CACHE_PREFIX = getattr(settings, 'ADMINFILTERS_CACHE_PREFIX', 'adminfilters')
+ADMINFILTERS_CACHE_CHOICES = getattr(settings, 'ADMINFILTERS_CACHE_CHOICES', False)
+
+_tracked_models = set()
+
+
+def make_key(*parts):
+    return ':'.join([ADMINFILTERS_CACHE_PREFIX] + [smart_str(p) for p in parts])
+
+
+def fingerprint(value):
+    return hashlib.md5(smart_str(value)).hexdigest()
+
+
+def params_fingerprint(params):
+    """Fingerprint of query parameters, which doesn't depend on parameters order."""
+
+    items = []
+    for key in sorted(params.keys()):
+        for value in params.getlist(key) if hasattr(params, 'getlist') else [params[key]]:
+            items.append((smart_str(key), smart_str(value)))
+    return fingerprint(urllib.urlencode(items))
+
+
+def model_label(model):
+    return '%s.%s' % (model._meta.app_label, model.__name__)
+
+
+def related_models(model):
+    """Models, which values are used as choices for filter fields of given model."""
+
+    return [f.rel.to for f in model._meta.fields + model._meta.many_to_many if f.rel]
+
+
+def track_model(model):
+    """Enabling version counters for model and all models it refers to, also through relations of filter paths."""
+
+    for reached in paths.reachable_models(model):
+        for m in [reached] + related_models(reached):
+            _tracked_models.add(model_label(m))
+
+
+def is_tracked(model):
+    return model_label(model) in _tracked_models
+
+
+def get_versions(labels):
+    keys = dict((make_key('version', label), label) for label in labels)
+    versions = cache.get_many(keys.keys())
+    missing = dict((k, int(time.time() * 1000)) for k in keys if k not in versions)
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[k] for k in sorted(keys)]
+
+
+def bump_version(label):
+    key = make_key('version', label)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # counter was evicted or never set, starting from current timestamp to avoid reusing old values
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def data_version(model, path=None):
+    """Combined version of model data and data of its related models, also of models along given resolved path."""
+
+    labels = set([model_label(model)] + [model_label(m) for m in related_models(model)])
+    if path is not None:
+        labels.update(model_label(m) for m in paths.path_models(path))
+    return '-'.join(str(v) for v in get_versions(sorted(labels)))
+
+
+def fragment_key(request, custom_filter, *extra):
+    return make_key('fragment', request.user.pk, custom_filter.pk, custom_filter.version,
+                    translation.get_language(), data_version(custom_filter.model),
+                    params_fingerprint(request.GET), *extra)
+
+
+def cached_fragment(model, get_key, render):
+    """Getting rendered fragment of filter set for given model from cache, rendering and storing it on cache miss.
+
+    Key is built by get_key callable, only when caching is enabled, since it costs cache lookups of versions.
+    """
+
+    if not ADMINFILTERS_CACHE_FRAGMENTS:
+        return render()
+    key = get_key()
+    content = cache.get(key)
+    metrics.inc('adminfilters_cache_requests_total', cache='fragment', model=model_label(model),
+                result='miss' if content is None else 'hit')
+    if content is None:
+        content = render()
+        cache.set(key, content, ADMINFILTERS_CACHE_TIMEOUT)
+    return content
+
+
+def cached_choices(model, field_name, load):
+    """
+    Getting choices of relation field from cache, they are valid until data of the model,
+    or of models along path of the field, is changed.
+    """
+    if not ADMINFILTERS_CACHE_CHOICES:
+        return load()
+    path = None
+    if '__' in field_name:
+        path = paths.resolve(model, field_name)
+        # changes of untracked models wouldn't invalidate cached choices
+        if path is None or not all(is_tracked(m) for m in paths.path_models(path)):
+            return load()
+    key = make_key('choices', model_label(model), field_name, data_version(model, path))
+    choices = cache.get(key)
+    metrics.inc('adminfilters_cache_requests_total', cache='choices', model=model_label(model),
+                result='miss' if choices is None else 'hit')
+    if choices is None:
+        choices = load()
+        cache.set(key, choices, ADMINFILTERS_CACHE_TIMEOUT)
+    return choices
+
+
+def data_changed(sender, **kwargs):
+    if is_tracked(sender):
+        bump_version(model_label(sender))
+
+post_save.connect(data_changed, dispatch_uid='adminfilters_data_changed_save')
+post_delete.connect(data_changed, dispatch_uid='adminfilters_data_changed_delete')
@@ -0,0 +1,186 @@
+"""
+Incrementally maintained counts of filter sets built only of equality criterias.
+
+Filter set is reduced to list of lookups ``[field name, negated, values]``, every lookup set of tracked
+model has its own counter row. Saving or deleting a row checks it against lookups of all counters
+of the model and adjusts matching counters with ``F()`` updates, so count of filtered changelist
+doesn't require ``COUNT(*)`` query. Bulk updates don't send signals, so counters are rebuilt in full
+when they are older than ``ADMINFILTERS_COUNTS_MAX_AGE`` or by ``rebuild_adminfilters_counts`` command.
+"""
+import datetime
+
+import simplejson
+
+from django.conf import settings
+from django.contrib.admin.util import prepare_lookup_value
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import F
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.utils import timezone
+
+from .caching import fingerprint, model_label
+from .models import CustomFilterCount, SUBQUERY_CRITERIAS
+
+ADMINFILTERS_COUNTS_MAX_AGE = getattr(settings, 'ADMINFILTERS_COUNTS_MAX_AGE', None)
+
+EQUALITY_LOOKUPS = ('exact', 'in')
+
+_tracked_models = set()
+
+
+def track_model(model):
+    _tracked_models.add(model_label(model))
+
+
+def is_tracked(model):
+    return model_label(model) in _tracked_models
+
+
+def to_python(field, value):
+    if field.rel:
+        field = field.rel.get_related_field()
+    try:
+        return field.to_python(value)
+    except ValidationError:
+        return value
+
+
+def normalize(field, value):
+    """Values are compared as unicode, so lookups can be stored as JSON."""
+    return unicode(to_python(field, value))
+
+
+def filter_lookups(custom_filter):
+    """
+    Lookups of filter set, or None if filter set has criterias which can't be checked for single row,
+    like ranges, dates, text search or bundled queries.
+    """
+    if custom_filter.bundled_queries.exists() or custom_filter.queries.filter(criteria__in=SUBQUERY_CRITERIAS).exists():
+        return None
+    if [q for q in custom_filter.queries.all() if q.is_multi_valued or q.is_annotation or q.group_name]:
+        return None
+    model = custom_filter.model
+    filter_params, exclude_params, bundled_params = custom_filter.get_filter_params()
+    lookups = []
+    for negated, params in ((False, filter_params), (True, exclude_params)):
+        for key, value in sorted(params.items()):
+            name, lookup = key.split('__', 1) if '__' in key else (key, 'exact')
+            if lookup not in EQUALITY_LOOKUPS:
+                return None
+            try:
+                field = model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+            if isinstance(field, (models.DateField, models.TimeField, models.ManyToManyField)):
+                return None
+            values = prepare_lookup_value(key, value)
+            if lookup == 'exact':
+                values = [values]
+            lookups.append([name, negated, sorted(set(normalize(field, v) for v in values))])
+    return lookups
+
+
+def matches(model, lookups, row):
+    """Checking if row, given as dictionary of field values, matches lookups."""
+
+    for name, negated, values in lookups:
+        if (normalize(model._meta.get_field(name), row.get(name)) in values) == negated:
+            return False
+    return True
+
+
+def count_rows(model, lookups):
+    queryset = model._default_manager.all()
+    for name, negated, values in lookups:
+        field = model._meta.get_field(name)
+        params = {'%s__in' % name: [to_python(field, v) for v in values]}
+        queryset = queryset.exclude(**params) if negated else queryset.filter(**params)
+    return queryset.count()
+
+
+def counter_key(model, data):
+    return fingerprint(model_label(model) + data)
+
+
+def is_stale(counter):
+    if ADMINFILTERS_COUNTS_MAX_AGE is None:
+        return False
+    return counter.rebuilt < timezone.now() - datetime.timedelta(seconds=ADMINFILTERS_COUNTS_MAX_AGE)
+
+
+def get_count(model, lookups):
+    """Maintained count of rows matching lookups, counter is built on first use."""
+
+    data = simplejson.dumps(lookups)
+    key = counter_key(model, data)
+    try:
+        counter = CustomFilterCount.objects.get(key=key)
+    except CustomFilterCount.DoesNotExist:
+        counter, created = CustomFilterCount.objects.get_or_create(
+            key=key, defaults={'model_label': model_label(model), 'lookups': data,
+                               'count': count_rows(model, lookups), 'rebuilt': timezone.now()})
+    if is_stale(counter):
+        counter.count = rebuild(model, counter)
+    return counter.count
+
+
+def rebuild(model, counter):
+    """Recounting rows of counter in full, repairing drift after bulk updates."""
+
+    count = count_rows(model, simplejson.loads(counter.lookups))
+    CustomFilterCount.objects.filter(pk=counter.pk).update(count=count, rebuilt=timezone.now())
+    return count
+
+
+def model_counters(model):
+    return [(pk, simplejson.loads(lookups)) for pk, lookups in
+            CustomFilterCount.objects.filter(model_label=model_label(model)).values_list('pk', 'lookups')]
+
+
+def matched_counters(model, counters, row):
+    return set(pk for pk, lookups in counters if matches(model, lookups, row))
+
+
+def instance_row(instance):
+    return dict((f.name, getattr(instance, f.attname)) for f in instance._meta.fields)
+
+
+def adjust(pks, delta):
+    if pks:
+        CustomFilterCount.objects.filter(pk__in=pks).update(count=F('count') + delta)
+
+
+def row_saving(sender, instance, using=None, **kwargs):
+    """Remembering counters matched by stored row, before it's changed."""
+
+    if not is_tracked(sender):
+        return
+    counters = model_counters(sender)
+    instance._adminfilters_counters = counters
+    instance._adminfilters_matched = set()
+    if counters and instance.pk is not None:
+        names = set(name for pk, lookups in counters for name, negated, values in lookups)
+        rows = sender._default_manager.using(using).filter(pk=instance.pk).values(*names)
+        if rows:
+            instance._adminfilters_matched = matched_counters(sender, counters, rows[0])
+
+
+def row_saved(sender, instance, **kwargs):
+    counters = getattr(instance, '_adminfilters_counters', None)
+    if not counters:
+        return
+    matched = matched_counters(sender, counters, instance_row(instance))
+    adjust(matched - instance._adminfilters_matched, 1)
+    adjust(instance._adminfilters_matched - matched, -1)
+    del instance._adminfilters_counters, instance._adminfilters_matched
+
+
+def row_deleted(sender, instance, **kwargs):
+    if is_tracked(sender):
+        adjust(matched_counters(sender, model_counters(sender), instance_row(instance)), -1)
+
+pre_save.connect(row_saving, dispatch_uid='adminfilters_counters_saving')
+post_save.connect(row_saved, dispatch_uid='adminfilters_counters_saved')
+post_delete.connect(row_deleted, dispatch_uid='adminfilters_counters_deleted')
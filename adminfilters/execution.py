@@ -0,0 +1,178 @@
+"""
+Concurrent execution of independent read queries.
+
+Callables are run in pool of threads shared by the whole process, so number of concurrent queries
+is bounded for all requests together. Django database connections are per thread, so every worker
+uses its own connections, they are kept or closed after every callable like after request.
+Active language and read database of current request are passed to workers.
+
+Identical queries, which are run by concurrent requests, can be coalesced with ``single_flight``:
+the first caller runs the query, others wait for it and share its result. With shared cache,
+callers in other processes wait for the result too.
+"""
+import Queue
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.utils import translation
+
+from . import routing
+
+ADMINFILTERS_MAX_WORKERS = getattr(settings, 'ADMINFILTERS_MAX_WORKERS', 4)
+ADMINFILTERS_SINGLE_FLIGHT = getattr(settings, 'ADMINFILTERS_SINGLE_FLIGHT', False)
+ADMINFILTERS_SINGLE_FLIGHT_CACHE = getattr(settings, 'ADMINFILTERS_SINGLE_FLIGHT_CACHE', False)
+ADMINFILTERS_SINGLE_FLIGHT_TIMEOUT = getattr(settings, 'ADMINFILTERS_SINGLE_FLIGHT_TIMEOUT', 30)
+
+# interval of checking cache for result of query, run by other process
+POLL_INTERVAL = 0.05
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+_queue = Queue.Queue()
+_workers = []
+_workers_lock = threading.Lock()
+_worker_state = threading.local()
+
+
+class Batch(object):
+    """Callables of one run_parallel call, their results are kept in order of callables."""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self.results = [None] * len(tasks)
+        self.errors = []
+        self.pending = len(tasks)
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.language = translation.get_language()
+        self.alias = routing.read_alias()
+
+    def run(self, index):
+        translation.activate(self.language)
+        routing._state.alias = self.alias
+        # connections of worker are reused between tasks like between requests, following CONN_MAX_AGE
+        close_old_connections()
+        try:
+            # remaining tasks are skipped once one of them failed
+            if not self.errors:
+                self.results[index] = self.tasks[index]()
+        except Exception:
+            self.errors.append(sys.exc_info())
+        finally:
+            close_old_connections()
+            routing.deactivate()
+            translation.deactivate()
+            with self.lock:
+                self.pending -= 1
+                if not self.pending:
+                    self.done.set()
+
+
+def worker():
+    _worker_state.active = True
+    while True:
+        batch, index = _queue.get()
+        batch.run(index)
+
+
+def start_workers():
+    """Starting threads of process-wide pool, it's done on first use."""
+
+    with _workers_lock:
+        while len(_workers) < ADMINFILTERS_MAX_WORKERS:
+            thread = threading.Thread(target=worker, name='adminfilters-worker-%s' % len(_workers))
+            thread.daemon = True
+            thread.start()
+            _workers.append(thread)
+
+
+def run_parallel(tasks):
+    """
+    Running callables concurrently in pool of ADMINFILTERS_MAX_WORKERS threads shared by the whole process,
+    results are returned in order of given callables. Callables run by worker, like queries of sharded queryset
+    in concurrent changelist, are run one after another, so workers don't wait for each other.
+    """
+    tasks = list(tasks)
+    if len(tasks) <= 1 or getattr(_worker_state, 'active', False):
+        return [task() for task in tasks]
+
+    start_workers()
+    batch = Batch(tasks)
+    for index in range(len(tasks)):
+        _queue.put((batch, index))
+    batch.done.wait()
+    if batch.errors:
+        raise batch.errors[0][0], batch.errors[0][1], batch.errors[0][2]
+    return batch.results
+
+
+class Flight(object):
+    """Execution of task, shared by callers with the same key."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def single_flight(key, task):
+    """
+    Running task once for concurrent callers with the same key in this process, other callers wait
+    and get the same result or exception. Callers in other processes wait too, if cache mode is enabled.
+    """
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Flight()
+    if not leader:
+        flight.done.wait()
+        if flight.error:
+            raise flight.error[0], flight.error[1], flight.error[2]
+        return flight.result
+    try:
+        flight.result = cached_flight(key, task) if ADMINFILTERS_SINGLE_FLIGHT_CACHE else task()
+    except Exception:
+        flight.error = sys.exc_info()
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+    return flight.result
+
+
+def cached_flight(key, task):
+    """
+    Running task in one process at a time, holding lock in cache. Processes, which didn't get the lock,
+    wait for result of the lock holder and run task themselves if it doesn't appear, e.g. when task failed.
+    """
+    lock_key = '%s:lock' % key
+    token = uuid.uuid4().hex
+    deadline = time.time() + ADMINFILTERS_SINGLE_FLIGHT_TIMEOUT
+    holder = None
+    while True:
+        if holder:
+            result = cache.get('%s:result:%s' % (key, holder))
+            if result is not None:
+                return result[0]
+        if cache.add(lock_key, token, ADMINFILTERS_SINGLE_FLIGHT_TIMEOUT):
+            break
+        holder = cache.get(lock_key) or holder
+        if time.time() > deadline:
+            return task()
+        time.sleep(POLL_INTERVAL)
+    try:
+        result = task()
+        # result is stored under token of this execution, so it's taken only by processes waiting for it
+        cache.set('%s:result:%s' % (key, token), (result,), ADMINFILTERS_SINGLE_FLIGHT_TIMEOUT)
+        return result
+    finally:
+        cache.delete(lock_key)
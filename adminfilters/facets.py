@@ -0,0 +1,85 @@
+"""
+Date histogram of filtered rows.
+
+Rows, matching filter set without criteria of histogram field, are counted in one GROUP BY query
+on truncated date, date fields of related models are joined. Weeks are built from day buckets, since
+database backends truncate dates to day, month or year only. Histograms are cached by filter set definition,
+model data version and scope of model admin queryset, which is user, unless the queryset is the same for
+every user.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, models
+from django.db.models.constants import LOOKUP_SEP
+from django.utils import timezone
+
+from . import caching
+
+PERIODS = ('day', 'week', 'month')
+
+
+def to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return datetime.datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def bucket_end(start, period):
+    if period == 'day':
+        return start
+    if period == 'week':
+        return start + datetime.timedelta(6)
+    next_month = (start.replace(day=28) + datetime.timedelta(4)).replace(day=1)
+    return next_month - datetime.timedelta(1)
+
+
+def lookup_column(query, lookup, connection):
+    """Quoted column of field at lookup path, relations on the path are joined in the query."""
+
+    field, targets, opts, joins, path = query.setup_joins(lookup.split(LOOKUP_SEP), query.get_meta(),
+                                                          query.get_initial_alias())
+    targets, alias, joins = query.trim_joins(targets, joins, path)
+    return '%s.%s' % (connection.ops.quote_name(alias), connection.ops.quote_name(targets[0].column))
+
+
+def date_histogram(queryset, lookup, field, period):
+    """
+    List of (bucket start, bucket end, count) tuples, ordered by date. Lookup is name of date field
+    or path to it through relations, rows are counted once per bucket of their related values.
+    """
+
+    connection = connections[queryset.db]
+    rows = queryset.order_by().filter(**{'%s__isnull' % lookup: False})
+    column = lookup_column(rows.query, lookup, connection)
+    kind = 'day' if period == 'week' else period
+    params = []
+    if isinstance(field, models.DateTimeField):
+        tzname = timezone.get_current_timezone_name() if settings.USE_TZ else None
+        sql, params = connection.ops.datetime_trunc_sql(kind, column, tzname)
+    else:
+        sql = connection.ops.date_trunc_sql(kind, column)
+    rows = rows.extra(select={'bucket': sql}, select_params=params).values('bucket')
+    rows = rows.annotate(count=models.Count('pk', distinct=LOOKUP_SEP in lookup))
+
+    counts = {}
+    for row in rows:
+        start = to_date(row['bucket'])
+        if period == 'week':
+            start -= datetime.timedelta(start.weekday())
+        counts[start] = counts.get(start, 0) + row['count']
+    return [(start, bucket_end(start, period), counts[start]) for start in sorted(counts)]
+
+
+def cached_date_histogram(custom_filter, queryset, lookup, field, period, scope):
+    # relative date criteria depend on current date
+    key = caching.make_key('histogram', custom_filter.definition_hash, scope, lookup, period, queryset.db,
+                           caching.data_version(queryset.model), datetime.date.today())
+    histogram = cache.get(key)
+    if histogram is None:
+        histogram = date_histogram(queryset, lookup, field, period)
+        cache.set(key, histogram, caching.ADMINFILTERS_CACHE_TIMEOUT)
+    return histogram
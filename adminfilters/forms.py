@@ -1,3 +1,5 @@
+import re
+
 from django import forms
 from django.conf import settings
 from django.contrib.admin import widgets
@@ -13,6 +15,24 @@ ADMINFILTERS_LOAD_PARAM = getattr(settings, 'ADMINFILTERS_LOAD_PARAM', 'load_adm
 ADMINFILTERS_SAVE_PARAM = getattr(settings, 'ADMINFILTERS_SAVE_PARAM', 'save_adminfilters')
 
 
+def parse_value_list(text, field_type):
+    """Splitting pasted list of values, duplicates and values, which don't fit field type, are skipped."""
+
+    values = []
+    seen = set()
+    # codes might contain spaces, so only integers are separated by whitespace
+    separators = r'[\s,;]+' if field_type == 'integer' else r'[\r\n,;]+'
+    for value in re.split(separators, text or ''):
+        value = value.strip()
+        if not value or value in seen or len(value) > 255:
+            continue
+        if field_type == 'integer' and not re.match(r'^-?\d+$', value):
+            continue
+        seen.add(value)
+        values.append(value)
+    return values
+
+
 class CustomFilterForm(forms.Form):
     """Form for managing filter set."""
     
@@ -86,6 +106,15 @@ class CustomFilterForm(forms.Form):
                                                                             initial=True,
                                                                             required=False,
                                                                             widget=forms.CheckboxInput(attrs={'class':'enable'}))
+                if not query.is_annotation:
+                    # rendered next to the label, they aren't part of the row
+                    gwidget = forms.TextInput(attrs={'class': 'group', 'size': 6, 'placeholder': _(u'OR group')})
+                    self.fields['%s_group' % query.field] = forms.CharField(initial=query.group, required=False,
+                                                                            max_length=255, widget=gwidget)
+                    self.fields['%s_group_negated' % query.field] = forms.BooleanField(label=_(u'not'),
+                                                                            initial=query.group_negated,
+                                                                            required=False,
+                                                                            widget=forms.CheckboxInput(attrs={'class':'group_negated'}))
                 if query.criterias:
                     self.fields['%s_criteria' % query.field] = forms.ChoiceField(choices=query.criterias,
                                                                              initial=query.criteria,
@@ -145,6 +174,14 @@ class CustomFilterForm(forms.Form):
                         self.initial['%s_end' % query.field] = field.to_python(bvalue[1]) if bvalue[1] else None
                         self.initial['%s_dago' % query.field] = ''
                         self.initial['%s_value' % query.field] = ''
+                if 'in_list' in dict(query.criterias or ()):
+                    # stored list isn't rendered, it can be large - empty list keeps stored values
+                    placeholder = _(u'%d values') % query.values.count() if query.criteria == 'in_list' else ''
+                    lwidget = forms.Textarea(attrs={'class': 'value_list', 'rows': 5, 'cols': 20, 'placeholder': placeholder})
+                    self.fields['%s_list' % query.field] = forms.CharField(widget=lwidget, required=False)
+                    row.append('%s_list' % query.field)
+                    if query.criteria == 'in_list':
+                        self.initial['%s_value' % query.field] = ''
                 self.field_rows.append(row)
 
     def save(self, *args, **kwargs):
@@ -164,12 +201,18 @@ class CustomFilterForm(forms.Form):
                 query.save()
             else:
                 query.delete()
+        # group is negated as whole, when any of its rows is marked
+        enabled_fields = [f[:-len('_enabled')] for f in params if f.endswith('_enabled')]
+        negated_groups = set(params.get('%s_group' % f, '').strip() for f in enabled_fields
+                             if params.get('%s_group_negated' % f, None))
         for query in list(self.custom_filter.queries.all()) + self.new_fields:
             if not isinstance(query, CustomQuery):
                 query = CustomQuery(custom_filter=self.custom_filter, field=query)
             if params.get('%s_enabled' % query.field, None):
                 criteria = params.get('%s_criteria' % query.field, 'exact')
                 query.criteria = criteria
+                query.group = params.get('%s_group' % query.field, '').strip()[:255]
+                query.group_negated = bool(query.group) and query.group in negated_groups
                 value = params.getlist('%s_value' % query.field, None)
 
                 # some sort of hack to detect if we have multiple values
@@ -177,6 +220,7 @@ class CustomFilterForm(forms.Form):
                     value = params.get('%s_value' % query.field, None)
 
                 days_ago = params.get('%s_dago' % query.field, None)
+                value_list = None
 
                 field = DateTimeField()
 
@@ -192,6 +236,12 @@ class CustomFilterForm(forms.Form):
                 elif criteria in ('lt', 'gt') and query.field_type in ('date', 'datetime'):
                     start = field.to_python('%s %s' % (params.get('%s_value_0' % query.field, ''), params.get('%s_value_1' % query.field, '')))
                     query.field_value = str(start)
+                elif criteria == 'in_list':
+                    query.is_multiple = False
+                    value_list = parse_value_list(params.get('%s_list' % query.field, ''), query.field_type)
+                    if not value_list and query.pk and query.values.exists():
+                        value_list = None
+                    value = None
                 elif criteria == 'days_ago':
                     query.field_value = days_ago
                 elif criteria == 'this_week':
@@ -209,6 +259,8 @@ class CustomFilterForm(forms.Form):
                     query.value = value[0]
 
                 query.save()
+                if value_list is not None:
+                    query.value_list = value_list
             else:
                 query.delete()
         self.custom_filter.save()
@@ -0,0 +1,144 @@
+"""
+Full-text index support for "matches words" criteria.
+
+SQLite uses FTS5 external content tables, kept in sync with triggers. PostgreSQL uses GIN index
+on tsvector expression of the column. Indexes are created with ``build_adminfilters_fulltext``
+management command, for fields listed in ``fulltext_fields`` of CustomFiltersAdmin.
+When there's no index for the field, criteria falls back to "contains" lookup for every word.
+Fields of related models are searched in the table of the model owning the field, and matching
+rows are selected with ``IN`` subquery.
+"""
+import re
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.util import truncate_name
+
+from . import paths
+
+ADMINFILTERS_FULLTEXT_CONFIG = getattr(settings, 'ADMINFILTERS_FULLTEXT_CONFIG', 'simple')
+
+# missing index is checked again after this number of seconds, it may be built while process is running
+INDEX_RECHECK_INTERVAL = 60
+
+_indexes = {}
+
+
+def split_words(text):
+    return [w for w in re.split(r'\s+', text or '') if w]
+
+
+def index_name(connection, model, field):
+    name = 'adminfilters_fts_%s_%s' % (model._meta.db_table, field.column)
+    return truncate_name(name, connection.ops.max_name_length())
+
+
+def tsvector_sql(connection, field):
+    return "to_tsvector('%s', COALESCE(%s, ''))" % (ADMINFILTERS_FULLTEXT_CONFIG, connection.ops.quote_name(field.column))
+
+
+def has_index(connection, model, field):
+    """Checking if index exists, existing index is cached per process, missing one is checked again after a while."""
+
+    name = index_name(connection, model, field)
+    key = (connection.alias, name)
+    cached = _indexes.get(key)
+    if cached is True or (cached is not None and time.time() < cached):
+        return cached is True
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        return False
+    cursor = connection.cursor()
+    if connection.vendor == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [name])
+    else:
+        cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = %s", [name])
+    # missing index is stored as time of the next check
+    _indexes[key] = cursor.fetchone() is not None or time.time() + INDEX_RECHECK_INTERVAL
+    return _indexes[key] is True
+
+
+def filter_queryset(queryset, path, text):
+    """
+    Filtering queryset by rows, which field with given path contains all given words.
+    Field of related model is searched in queryset of its model, which is applied as ``IN`` subquery.
+    """
+    words = split_words(text)
+    if not words:
+        return queryset
+    resolved = paths.resolve(queryset.model, path)
+    if not resolved.hops:
+        return filter_words(queryset, resolved.field, words)
+    owner = resolved.model
+    # tables of subquery are aliased, so primary key column isn't qualified, subquery has no joins
+    matching = filter_words(owner._default_manager.using(queryset.db).all(), resolved.field, words, qualified=False)
+    lookup = '__'.join(resolved.names[:-1] + [owner._meta.pk.name, 'in'])
+    if resolved.multi_valued_hop is not None:
+        return paths.filter_subquery(queryset, lookup, matching.values('pk'))
+    return queryset.filter(**{lookup: matching.values('pk')})
+
+
+def filter_words(queryset, field, words, qualified=True):
+    """Filtering queryset by rows, which field of queryset model contains all given words."""
+
+    model = queryset.model
+    connection = connections[queryset.db]
+    if has_index(connection, model, field):
+        qn = connection.ops.quote_name
+        pk_column = qn(model._meta.pk.column)
+        if qualified:
+            pk_column = '%s.%s' % (qn(model._meta.db_table), pk_column)
+        if connection.vendor == 'sqlite':
+            name = qn(index_name(connection, model, field))
+            match = ' '.join('"%s"' % w.replace('"', '""') for w in words)
+            where = '%s IN (SELECT rowid FROM %s WHERE %s MATCH %%s)' % (pk_column, name, name)
+            return queryset.extra(where=[where], params=[match])
+        if connection.vendor == 'postgresql':
+            where = "%s IN (SELECT %s FROM %s WHERE %s @@ plainto_tsquery('%s', %%s))" % (
+                pk_column, qn(model._meta.pk.column), qn(model._meta.db_table), tsvector_sql(connection, field),
+                ADMINFILTERS_FULLTEXT_CONFIG)
+            return queryset.extra(where=[where], params=[' '.join(words)])
+    for word in words:
+        queryset = queryset.filter(**{'%s__icontains' % field.name: word})
+    return queryset
+
+
+def create_index(connection, model, field):
+    name = index_name(connection, model, field)
+    qn = connection.ops.quote_name
+    table, column, pk = qn(model._meta.db_table), qn(field.column), qn(model._meta.pk.column)
+    cursor = connection.cursor()
+    if connection.vendor == 'sqlite':
+        fts = qn(name)
+        cursor.execute("CREATE VIRTUAL TABLE %s USING fts5(%s, content=%s, content_rowid=%s)" % (
+            fts, column, "'%s'" % model._meta.db_table, "'%s'" % model._meta.pk.column))
+        cursor.execute("CREATE TRIGGER %s AFTER INSERT ON %s BEGIN "
+                       "INSERT INTO %s(rowid, %s) VALUES (new.%s, new.%s); END" % (
+                           qn(name + '_ai'), table, fts, column, pk, column))
+        cursor.execute("CREATE TRIGGER %s AFTER DELETE ON %s BEGIN "
+                       "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.%s, old.%s); END" % (
+                           qn(name + '_ad'), table, fts, fts, column, pk, column))
+        cursor.execute("CREATE TRIGGER %s AFTER UPDATE ON %s BEGIN "
+                       "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', old.%s, old.%s); "
+                       "INSERT INTO %s(rowid, %s) VALUES (new.%s, new.%s); END" % (
+                           qn(name + '_au'), table, fts, fts, column, pk, column, fts, column, pk, column))
+        cursor.execute("INSERT INTO %s(%s) VALUES ('rebuild')" % (fts, fts))
+    elif connection.vendor == 'postgresql':
+        cursor.execute("CREATE INDEX %s ON %s USING gin (%s)" % (qn(name), table, tsvector_sql(connection, field)))
+    else:
+        return False
+    _indexes[(connection.alias, name)] = True
+    return True
+
+
+def drop_index(connection, model, field):
+    name = index_name(connection, model, field)
+    qn = connection.ops.quote_name
+    cursor = connection.cursor()
+    if connection.vendor == 'sqlite':
+        for suffix in ('_ai', '_ad', '_au'):
+            cursor.execute("DROP TRIGGER IF EXISTS %s" % qn(name + suffix))
+        cursor.execute("DROP TABLE IF EXISTS %s" % qn(name))
+    elif connection.vendor == 'postgresql':
+        cursor.execute("DROP INDEX IF EXISTS %s" % qn(name))
+    _indexes.pop((connection.alias, name), None)
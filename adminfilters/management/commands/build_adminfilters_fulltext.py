@@ -0,0 +1,38 @@
+from optparse import make_option
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand
+from django.db import connections, DEFAULT_DB_ALIAS, transaction
+
+from adminfilters import fulltext, paths
+from adminfilters.admin import CustomFiltersAdmin
+
+
+class Command(BaseCommand):
+    help = 'Builds or rebuilds full-text indexes for fields listed in fulltext_fields of CustomFiltersAdmin.'
+    option_list = BaseCommand.option_list + (
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+                    help='Database alias, where indexes are created.'),
+        make_option('--drop', action='store_true', dest='drop', default=False,
+                    help='Drop indexes without creating them again.'),
+    )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        admin.autodiscover()
+        for model, model_admin in admin.site._registry.items():
+            if not isinstance(model_admin, CustomFiltersAdmin):
+                continue
+            for field_name in model_admin.fulltext_fields:
+                # field of related model is indexed in table of its model
+                path = paths.resolve(model, field_name)
+                field = path.field
+                with transaction.atomic(using=connection.alias):
+                    fulltext.drop_index(connection, path.model, field)
+                    if options['drop']:
+                        self.stdout.write('Dropped index for %s.%s' % (model.__name__, field_name))
+                    elif fulltext.create_index(connection, path.model, field):
+                        self.stdout.write('Built index for %s.%s' % (model.__name__, field_name))
+                    else:
+                        self.stdout.write('Full-text index is not supported by %s backend, skipping %s.%s' % (
+                            connection.vendor, model.__name__, field_name))
@@ -0,0 +1,29 @@
+from optparse import make_option
+
+import simplejson
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand, CommandError
+
+from adminfilters import schema
+
+
+class Command(BaseCommand):
+    help = 'Precomputes filter metadata for all models registered with CustomFiltersAdmin.'
+    option_list = BaseCommand.option_list + (
+        make_option('--output', dest='output', default=None,
+                    help='Path of schema file, ADMINFILTERS_SCHEMA_FILE setting is used by default.'),
+    )
+
+    def handle(self, *args, **options):
+        path = options.get('output') or schema.ADMINFILTERS_SCHEMA_FILE
+        if not path:
+            raise CommandError('Schema file path is not configured, set ADMINFILTERS_SCHEMA_FILE or use --output.')
+
+        admin.autodiscover()
+        models = schema.registered_models()
+        data = schema.build_schema(models)
+        with open(path, 'w') as schema_file:
+            simplejson.dump(data, schema_file, separators=(',', ':'))
+        schema.load(path)
+        self.stdout.write('Schema for %d model(s) was written to %s' % (len(models), path))
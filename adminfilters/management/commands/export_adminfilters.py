@@ -0,0 +1,34 @@
+from optparse import make_option
+
+import simplejson
+
+from django.core.management.base import BaseCommand
+
+from adminfilters import provisioning
+from adminfilters.models import CustomFilter
+
+
+class Command(BaseCommand):
+    help = 'Exports filter sets to JSON.'
+    option_list = BaseCommand.option_list + (
+        make_option('--user', dest='users', action='append', default=[],
+                    help='Export filter sets of given user only, can be used several times.'),
+        make_option('--model', dest='model', default=None,
+                    help='Export filter sets of given model only, in app_label.Model format.'),
+        make_option('--output', dest='output', default=None,
+                    help='Path of output file, JSON is written to standard output by default.'),
+    )
+
+    def handle(self, *args, **options):
+        queryset = CustomFilter.objects.exclude(name='temporary').order_by('pk')
+        if options['users']:
+            queryset = queryset.filter(user__username__in=options['users'])
+        if options['model']:
+            app_name, model_name = options['model'].split('.')
+            queryset = queryset.filter(app_name=app_name, model_name=model_name)
+        data = simplejson.dumps(provisioning.export_filters(queryset), indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(data)
+        else:
+            self.stdout.write(data)
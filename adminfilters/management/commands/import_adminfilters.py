@@ -0,0 +1,42 @@
+from optparse import make_option
+
+import simplejson
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from adminfilters import provisioning
+
+
+class Command(BaseCommand):
+    args = '<file>'
+    help = ('Imports filter sets from JSON file, created by export_adminfilters. Filter sets are created '
+            'for their original owners, or cloned to given users.')
+    option_list = BaseCommand.option_list + (
+        make_option('--user', dest='users', action='append', default=[],
+                    help='Clone filter sets to given user, can be used several times.'),
+        make_option('--all-staff', action='store_true', dest='all_staff', default=False,
+                    help='Clone filter sets to all active staff users.'),
+        make_option('--replace', action='store_true', dest='replace', default=False,
+                    help='Replace existing filter sets with the same model, name and default flag.'),
+        make_option('--batch-size', dest='batch_size', type='int', default=None,
+                    help='Number of rows inserted in one query.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Path of JSON file is required.')
+        with open(args[0]) as source:
+            definitions = simplejson.load(source)
+
+        users = None
+        if options['all_staff']:
+            users = list(User.objects.filter(is_staff=True, is_active=True).values_list('pk', flat=True))
+        elif options['users']:
+            users = list(User.objects.filter(username__in=options['users']).values_list('pk', flat=True))
+            if len(users) != len(set(options['users'])):
+                raise CommandError('Some of given users do not exist.')
+
+        created = provisioning.import_filters(definitions, users, replace=options['replace'],
+                                              batch_size=options['batch_size'])
+        self.stdout.write('Created %s filter sets' % created)
@@ -0,0 +1,32 @@
+from optparse import make_option
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand
+
+from adminfilters import snapshots
+from adminfilters.admin import CustomFiltersAdmin
+
+
+class Command(BaseCommand):
+    help = 'Stores count and first pages of the most loaded filter sets, so they are served without running queries.'
+    option_list = BaseCommand.option_list + (
+        make_option('--limit', dest='limit', type='int', default=20,
+                    help='Number of filter sets to materialize.'),
+        make_option('--min-loads', dest='min_loads', type='int', default=1,
+                    help='Minimal number of loads of filter set.'),
+    )
+
+    def handle(self, *args, **options):
+        admin.autodiscover()
+        materialized = 0
+        for custom_filter in snapshots.popular_filters(options['min_loads']):
+            model_admin = admin.site._registry.get(custom_filter.model)
+            # snapshots of sharded changelists aren't used, they store primary keys of one database
+            if not isinstance(model_admin, CustomFiltersAdmin) or model_admin.shard_databases:
+                continue
+            snapshot = snapshots.materialize(custom_filter, model_admin)
+            self.stdout.write('Materialized %s filter set "%s" of %s: %s rows' % (
+                custom_filter.model_name, custom_filter.name, custom_filter.user, snapshot.count))
+            materialized += 1
+            if materialized >= options['limit']:
+                break
@@ -0,0 +1,30 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db.models import get_model
+
+from adminfilters import counters
+from adminfilters.models import CustomFilterCount
+
+
+class Command(BaseCommand):
+    help = 'Recounts maintained counts of filter sets, repairing drift after bulk updates.'
+    option_list = BaseCommand.option_list + (
+        make_option('--model', dest='model', default=None,
+                    help='Rebuild counts of given model only, in app_label.Model format.'),
+    )
+
+    def handle(self, *args, **options):
+        queryset = CustomFilterCount.objects.all()
+        if options['model']:
+            queryset = queryset.filter(model_label=options['model'])
+        for counter in queryset:
+            model = get_model(*counter.model_label.split('.'))
+            if model is None:
+                counter.delete()
+                self.stdout.write('Deleted count of missing model %s' % counter.model_label)
+                continue
+            count = counters.rebuild(model, counter)
+            if count != counter.count:
+                self.stdout.write('Rebuilt count of %s %s: %s -> %s' % (counter.model_label, counter.lookups,
+                                                                        counter.count, count))
@@ -0,0 +1,182 @@
+"""
+Metrics of filter operations in Prometheus text format.
+
+Counters and latency histograms are aggregated in process. With ADMINFILTERS_METRICS_DIRECTORY every
+process also writes its metrics to its own file in the directory, at most once per
+ADMINFILTERS_METRICS_FLUSH_INTERVAL seconds and on exit, and exposition sums files of all processes,
+so metrics of preforked workers are served by any of them.
+"""
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import simplejson
+
+from django.conf import settings
+
+ADMINFILTERS_METRICS = getattr(settings, 'ADMINFILTERS_METRICS', False)
+ADMINFILTERS_METRICS_DIRECTORY = getattr(settings, 'ADMINFILTERS_METRICS_DIRECTORY', None)
+ADMINFILTERS_METRICS_FLUSH_INTERVAL = getattr(settings, 'ADMINFILTERS_METRICS_FLUSH_INTERVAL', 5)
+ADMINFILTERS_METRICS_BUCKETS = getattr(settings, 'ADMINFILTERS_METRICS_BUCKETS',
+                                       (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+METRICS = {
+    'adminfilters_compile_seconds': ('histogram', 'Compiling filter set into changelist parameters.'),
+    'adminfilters_query_seconds': ('histogram', 'Loading page of filtered changelist.'),
+    'adminfilters_count_seconds': ('histogram', 'Counting rows of filtered changelist.'),
+    'adminfilters_choices_seconds': ('histogram', 'Loading choices of relation field.'),
+    'adminfilters_middleware_seconds': ('histogram', 'Rendering filter set into changelist page.'),
+    'adminfilters_save_filter_seconds': ('histogram', 'Handling request to save, load or extend filter set.'),
+    'adminfilters_save_filter_total': ('counter', 'Requests to save, load or extend filter set.'),
+    'adminfilters_cache_requests_total': ('counter', 'Lookups of cached fragments and choices.'),
+}
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_last_flush = [0]
+
+
+def labels_key(labels):
+    return tuple(sorted((k, unicode(v)) for k, v in labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    if not ADMINFILTERS_METRICS:
+        return
+    key = (name, labels_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+    maybe_flush()
+
+
+def observe(name, seconds, **labels):
+    if not ADMINFILTERS_METRICS:
+        return
+    key = (name, labels_key(labels))
+    with _lock:
+        # counts per bucket, the last one is for values above all buckets, followed by sum of values
+        histogram = _histograms.setdefault(key, [0] * (len(ADMINFILTERS_METRICS_BUCKETS) + 1) + [0.0])
+        for index, bound in enumerate(ADMINFILTERS_METRICS_BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            index = len(ADMINFILTERS_METRICS_BUCKETS)
+        histogram[index] += 1
+        histogram[-1] += seconds
+    maybe_flush()
+
+
+@contextmanager
+def timer(name, **labels):
+    """Observing duration of the block, also when it raises."""
+
+    if not ADMINFILTERS_METRICS:
+        yield
+        return
+    started = time.time()
+    try:
+        yield
+    finally:
+        observe(name, time.time() - started, **labels)
+
+
+def snapshot():
+    with _lock:
+        return ([[name, list(labels), value] for (name, labels), value in _counters.items()],
+                [[name, list(labels), list(values)] for (name, labels), values in _histograms.items()])
+
+
+def process_path(pid=None):
+    return os.path.join(ADMINFILTERS_METRICS_DIRECTORY, 'adminfilters-%s.json' % (pid or os.getpid()))
+
+
+def flush():
+    """Writing metrics of current process to its file, file is replaced at once, so readers don't see partial file."""
+
+    if not ADMINFILTERS_METRICS_DIRECTORY:
+        return
+    _last_flush[0] = time.time()
+    counters, histograms = snapshot()
+    path = process_path()
+    temporary = '%s.%s.tmp' % (path, threading.current_thread().ident)
+    with open(temporary, 'w') as target:
+        simplejson.dump({'counters': counters, 'histograms': histograms}, target)
+    os.rename(temporary, path)
+
+
+def maybe_flush():
+    if ADMINFILTERS_METRICS_DIRECTORY and time.time() - _last_flush[0] > ADMINFILTERS_METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def collect():
+    """Metrics of current process, summed with metrics of other processes, when they write them to files."""
+
+    counters, histograms = snapshot()
+    if ADMINFILTERS_METRICS_DIRECTORY and os.path.isdir(ADMINFILTERS_METRICS_DIRECTORY):
+        own = os.path.basename(process_path())
+        for filename in os.listdir(ADMINFILTERS_METRICS_DIRECTORY):
+            if not filename.startswith('adminfilters-') or not filename.endswith('.json') or filename == own:
+                continue
+            try:
+                with open(os.path.join(ADMINFILTERS_METRICS_DIRECTORY, filename)) as source:
+                    data = simplejson.load(source)
+            except (IOError, ValueError):
+                continue
+            counters += data.get('counters', [])
+            histograms += data.get('histograms', [])
+
+    summed_counters, summed_histograms = {}, {}
+    for name, labels, value in counters:
+        key = (name, tuple(tuple(label) for label in labels))
+        summed_counters[key] = summed_counters.get(key, 0) + value
+    for name, labels, values in histograms:
+        key = (name, tuple(tuple(label) for label in labels))
+        summed = summed_histograms.setdefault(key, [0] * len(values))
+        summed_histograms[key] = [a + b for a, b in zip(summed, values)]
+    return summed_counters, summed_histograms
+
+
+def format_labels(labels, **extra):
+    items = list(labels) + sorted(extra.items())
+    if not items:
+        return ''
+    escaped = [(k, unicode(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items]
+    return u'{%s}' % u','.join(u'%s="%s"' % item for item in escaped)
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Metrics in Prometheus text exposition format."""
+
+    counters, histograms = collect()
+    lines = []
+    for name in sorted(METRICS):
+        metric_type, description = METRICS[name]
+        lines.append(u'# HELP %s %s' % (name, description))
+        lines.append(u'# TYPE %s %s' % (name, metric_type))
+        if metric_type == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(u'%s%s %s' % (name, format_labels(labels), format_value(value)))
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(ADMINFILTERS_METRICS_BUCKETS) + ['+Inf'], values[:-1]):
+                cumulative += count
+                lines.append(u'%s_bucket%s %s' % (name, format_labels(labels, le=bound), cumulative))
+            lines.append(u'%s_sum%s %s' % (name, format_labels(labels), format_value(values[-1])))
+            lines.append(u'%s_count%s %s' % (name, format_labels(labels), cumulative))
+    return u'\n'.join(lines) + u'\n'
+
+
+if ADMINFILTERS_METRICS and ADMINFILTERS_METRICS_DIRECTORY:
+    atexit.register(flush)
@@ -1,13 +1,17 @@
 import re
+import time
 
 from django.conf import settings
 from django.contrib import messages
 from django.core.urlresolvers import reverse
 from django.shortcuts import redirect
 from django.template.loader import render_to_string
+from django.utils.module_loading import import_by_path
 
-from .models import CustomFilter
+from .models import CustomFilter, clear_prefetched_choices
 from .forms import CustomFilterForm
+from .caching import cached_fragment, fingerprint, fragment_key, model_label
+from . import metrics, routing
 
 ADMINFILTERS_ADD_PARAM = getattr(settings, 'ADMINFILTERS_ADD_PARAM', 'add_adminfilters')
 ADMINFILTERS_LOAD_PARAM = getattr(settings, 'ADMINFILTERS_LOAD_PARAM', 'load_adminfilters')
@@ -16,10 +20,28 @@ ADMINFILTERS_SAVE_PARAM = getattr(settings, 'ADMINFILTERS_SAVE_PARAM', 'save_adm
 ADMINFILTERS_URLCONF = getattr(settings, 'ADMINFILTERS_URLCONF', None)
 
 
+def is_installed():
+    return any(issubclass(import_by_path(path), CustomFiltersMiddleware) for path in settings.MIDDLEWARE_CLASSES)
+
+
 class CustomFiltersMiddleware(object):
     """Middleware for loading current default filter set and rendering it."""
-    
+
     def process_response(self, request, response):
+        # profiled request has filters rendered already, inside profiler
+        if getattr(request, 'adminfilters_rendered', False):
+            return response
+        request.adminfilters_rendered = True
+        if request.method == 'POST' and response.status_code < 400:
+            routing.record_write(request)
+        try:
+            with routing.reading(request):
+                return self.render_filters(request, response)
+        finally:
+            routing.deactivate()
+            clear_prefetched_choices()
+
+    def render_filters(self, request, response):
         if 'use_new_filters' in request.META['QUERY_STRING']:
             return redirect(request.path)
         if hasattr(request, 'session') and not request.session.get('use_new_filters'):
@@ -36,12 +58,8 @@ class CustomFiltersMiddleware(object):
                 except:
                     custom_filters_loaded = False
                 if custom_filters_loaded:
-                    custom_filters = CustomFilter.get_filters(user=request.user, path_info=request.path_info)
-                    # we load last filter if there are no GET parameters
-                    if len(request.GET):
-                        form = CustomFilterForm(request.GET.copy(), custom_filter=current_filter[0], custom_filters=custom_filters)
-                    else:
-                        form = CustomFilterForm(custom_filter=current_filter[0], custom_filters=custom_filters)
+                    started = time.time()
+                    custom_filters = list(CustomFilter.get_filters(user=request.user, path_info=request.path_info))
                     opts = current_filter[0].model._meta
                     urlconf = getattr(request, 'urlconf', ADMINFILTERS_URLCONF)
                     delete_filter_url = reverse('admin:%s_%s_%s' % (opts.app_label, opts.module_name, 'delete_filter'), 
@@ -52,16 +70,33 @@ class CustomFiltersMiddleware(object):
                                               urlconf)
                     clear_filter_url = reverse('admin:%s_%s_%s' % (opts.app_label, opts.module_name, 'clear_filter'), 
                                               urlconf)
-                    content = render_to_string('header.html', {'form': form,
-                                                               'current_filter': opts,
-                                                               'opts': current_filter[0].model._meta,
-                                                               'add_param': ADMINFILTERS_ADD_PARAM,
-                                                               'load_param': ADMINFILTERS_LOAD_PARAM,
-                                                               'save_param': ADMINFILTERS_SAVE_PARAM,
-                                                               'save_filter_url': save_filter_url,
-                                                               'delete_filter_url': delete_filter_url,
-                                                               'add_filter_url': add_filter_url,
-                                                               'clear_filter_url': clear_filter_url})
+                    filter_schema_url = reverse('admin:%s_%s_%s' % (opts.app_label, opts.module_name, 'filter_schema'),
+                                                urlconf)
+                    histogram_url = reverse('admin:%s_%s_%s' % (opts.app_label, opts.module_name, 'histogram'),
+                                            urlconf)
+
+                    def render():
+                        # we load last filter if there are no GET parameters
+                        if len(request.GET):
+                            form = CustomFilterForm(request.GET.copy(), custom_filter=current_filter[0], custom_filters=custom_filters)
+                        else:
+                            form = CustomFilterForm(custom_filter=current_filter[0], custom_filters=custom_filters)
+                        return render_to_string('header.html', {'form': form,
+                                                                'current_filter': opts,
+                                                                'opts': current_filter[0].model._meta,
+                                                                'add_param': ADMINFILTERS_ADD_PARAM,
+                                                                'load_param': ADMINFILTERS_LOAD_PARAM,
+                                                                'save_param': ADMINFILTERS_SAVE_PARAM,
+                                                                'save_filter_url': save_filter_url,
+                                                                'delete_filter_url': delete_filter_url,
+                                                                'add_filter_url': add_filter_url,
+                                                                'clear_filter_url': clear_filter_url,
+                                                                'filter_schema_url': filter_schema_url,
+                                                                'histogram_url': histogram_url})
+                    presets = [(cf.pk, cf.verbose_name) for cf in custom_filters]
+                    content = cached_fragment(current_filter[0].model,
+                                              lambda: fragment_key(request, current_filter[0], 'header', fingerprint(presets)),
+                                              render)
                     response.content = response.content.replace(ADMINFILTERS_HEADER_TAG,  ADMINFILTERS_HEADER_TAG + content.encode('utf-8'))
 
                     # this part replaces pagination links with corrected)
@@ -77,4 +112,6 @@ class CustomFiltersMiddleware(object):
 
                     if current_filter[0].errors:
                         messages.warning(request, current_filter[0].errors)
+                    metrics.observe('adminfilters_middleware_seconds', time.time() - started,
+                                    model=model_label(current_filter[0].model))
         return response
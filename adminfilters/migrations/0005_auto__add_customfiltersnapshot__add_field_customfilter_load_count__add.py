@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'CustomFilterSnapshot'
+        db.create_table(u'adminfilters_customfiltersnapshot', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('custom_filter', self.gf('django.db.models.fields.related.OneToOneField')(related_name='snapshot', unique=True, to=orm['adminfilters.CustomFilter'])),
+            ('definition', self.gf('django.db.models.fields.CharField')(max_length=32)),
+            ('ordering', self.gf('django.db.models.fields.TextField')()),
+            ('pks', self.gf('django.db.models.fields.TextField')()),
+            ('count', self.gf('django.db.models.fields.BigIntegerField')()),
+            ('created', self.gf('django.db.models.fields.DateTimeField')()),
+        ))
+        db.send_create_signal(u'adminfilters', ['CustomFilterSnapshot'])
+
+        # Adding field 'CustomFilter.load_count'
+        db.add_column(u'adminfilters_customfilter', 'load_count',
+                      self.gf('django.db.models.fields.PositiveIntegerField')(default=0),
+                      keep_default=False)
+
+        # Adding field 'CustomFilter.last_loaded'
+        db.add_column(u'adminfilters_customfilter', 'last_loaded',
+                      self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True),
+                      keep_default=False)
+
+
+    def backwards(self, orm):
+        # Deleting model 'CustomFilterSnapshot'
+        db.delete_table(u'adminfilters_customfiltersnapshot')
+
+        # Deleting field 'CustomFilter.load_count'
+        db.delete_column(u'adminfilters_customfilter', 'load_count')
+
+        # Deleting field 'CustomFilter.last_loaded'
+        db.delete_column(u'adminfilters_customfilter', 'last_loaded')
+
+
+    models = {
+        u'adminfilters.custombundledquery': {
+            'Meta': {'object_name': 'CustomBundledQuery'},
+            'class_name': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'custom_filter': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'bundled_queries'", 'to': u"orm['adminfilters.CustomFilter']"}),
+            'field': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'module_name': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'})
+        },
+        u'adminfilters.customfilter': {
+            'Meta': {'object_name': 'CustomFilter'},
+            'app_name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'default': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'last_loaded': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'load_count': ('django.db.models.fields.PositiveIntegerField', [], {'default': '0'}),
+            'model_name': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'ordering': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'path_info': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'user': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['auth.User']"})
+        },
+        u'adminfilters.customfiltercount': {
+            'Meta': {'object_name': 'CustomFilterCount'},
+            'count': ('django.db.models.fields.BigIntegerField', [], {'default': '0'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'key': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '32'}),
+            'lookups': ('django.db.models.fields.TextField', [], {}),
+            'model_label': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'rebuilt': ('django.db.models.fields.DateTimeField', [], {})
+        },
+        u'adminfilters.customfiltersnapshot': {
+            'Meta': {'object_name': 'CustomFilterSnapshot'},
+            'count': ('django.db.models.fields.BigIntegerField', [], {}),
+            'created': ('django.db.models.fields.DateTimeField', [], {}),
+            'custom_filter': ('django.db.models.fields.related.OneToOneField', [], {'related_name': "'snapshot'", 'unique': 'True', 'to': u"orm['adminfilters.CustomFilter']"}),
+            'definition': ('django.db.models.fields.CharField', [], {'max_length': '32'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'ordering': ('django.db.models.fields.TextField', [], {}),
+            'pks': ('django.db.models.fields.TextField', [], {})
+        },
+        u'adminfilters.customquery': {
+            'Meta': {'object_name': 'CustomQuery'},
+            'criteria': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'custom_filter': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'queries'", 'to': u"orm['adminfilters.CustomFilter']"}),
+            'field': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_multiple': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'})
+        },
+        u'adminfilters.customqueryvalue': {
+            'Meta': {'object_name': 'CustomQueryValue'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'number': ('django.db.models.fields.BigIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'query': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'values'", 'to': u"orm['adminfilters.CustomQuery']"}),
+            'value': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        },
+        u'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        u'auth.permission': {
+            'Meta': {'ordering': "(u'content_type__app_label', u'content_type__model', u'codename')", 'unique_together': "((u'content_type', u'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        u'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'related_name': "u'user_set'", 'blank': 'True', 'to': u"orm['auth.Group']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'symmetrical': 'False', 'related_name': "u'user_set'", 'blank': 'True', 'to': u"orm['auth.Permission']"}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        }
+    }
+
+    complete_apps = ['adminfilters']
\ No newline at end of file
@@ -1,15 +1,23 @@
 import datetime
+import hashlib
+import operator
+import threading
 from django.forms.fields import DateTimeField
 import simplejson
 
+from django.contrib.admin.util import prepare_lookup_value
 from django.contrib.auth.models import User
 from django.conf import settings
+from django.core.exceptions import FieldError
 from django.core.urlresolvers import reverse
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import connections, models, router, transaction
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.utils.translation import ugettext as _
-from django.db.models.fields.related import ReverseSingleRelatedObjectDescriptor, SingleRelatedObjectDescriptor
+
+from . import annotations, caching, fulltext, metrics, paths, routing, schema
 
 EMPTY_CHOICES = [('', ''),]
 
@@ -25,14 +33,17 @@ INTEGER_FIELD_CHOICES = (
     ('gt', '>'), 
     ('lt', '<'),
     ('lte', '<='),
-    ('between', _(u'between'))
+    ('between', _(u'between')),
+    ('in_list', _(u'is one of (list)'))
 )
 
 CHAR_FIELD_CHOICES = (
     ('icontains', _(u'contains')),
     ('_notcontains', _(u'doesn\'t contain')), 
     ('startswith', _(u'starts with')),
-    ('endswith', _(u'ends with'))
+    ('endswith', _(u'ends with')),
+    ('in_list', _(u'is one of (list)')),
+    ('search', _(u'matches words'))
 )
 
 DATE_FIELD_CHOICES = (
@@ -57,7 +68,31 @@ BOOLEAN_FIELD_CHOICES = [
      ('false', _(u'False'))
 ]
 
+CRITERIAS = {
+    'choice': CHOICE_FIELD_CHOICES,
+    'integer': INTEGER_FIELD_CHOICES,
+    'char': CHAR_FIELD_CHOICES,
+    'date': DATE_FIELD_CHOICES,
+    'foreign_key': FOREIGN_KEY_CHOICES,
+}
+
+# criterias, which are applied to queryset with subqueries instead of lookup parameters
+SUBQUERY_CRITERIAS = ('in_list', 'search')
+
+# criterias of annotations, they are compared in HAVING clause, so subqueries and parts of dates aren't used
+ANNOTATION_INTEGER_CHOICES = tuple(c for c in INTEGER_FIELD_CHOICES if c[0] not in SUBQUERY_CRITERIAS)
+ANNOTATION_DATE_CHOICES = tuple(c for c in DATE_FIELD_CHOICES if c[0] in ('gt', 'lt', 'between'))
+
 ADMINFILTERS_URLCONF = getattr(settings, 'ADMINFILTERS_URLCONF', None)
+ADMINFILTERS_VALUE_LIST_BATCH_SIZE = getattr(settings, 'ADMINFILTERS_VALUE_LIST_BATCH_SIZE', 500)
+
+
+def get_criterias_name(criterias):
+    """Name of criterias set, used for storing it in precomputed schema."""
+    for name, choices in CRITERIAS.items():
+        if criterias is choices:
+            return name
+    return
 
 def import_module(app_name):
     django_apps = ('auth',)
@@ -68,6 +103,46 @@ def import_module(app_name):
     return module
 
 
+def query_state(field, criteria, is_multiple, value, group=None, group_negated=False):
+    """State of query, used in hashes of filter set. Group is added only to grouped queries, so other hashes are kept."""
+    state = (field, criteria, is_multiple, value)
+    return state + (group, bool(group_negated)) if group else state
+
+
+def make_definition_hash(app_name, model_name, ordering, queries, bundled_queries):
+    """Hash of filter set definition, queries are given as states of query_state, bundled ones as (field, value)."""
+    state = [app_name, model_name, ordering, queries, bundled_queries]
+    return hashlib.md5(simplejson.dumps(state)).hexdigest()
+
+
+def bulk_create(model, objs, batch_size):
+    """Inserting objects in batches, which are limited by database backend too, Django doesn't limit explicit batch size."""
+    connection = connections[router.db_for_write(model)]
+    fields = [f for f in model._meta.local_concrete_fields if not isinstance(f, models.AutoField)]
+    batch_size = max(min(batch_size, connection.ops.bulk_batch_size(fields, objs)), 1)
+    model.objects.bulk_create(objs, batch_size=batch_size)
+
+
+_prefetched = threading.local()
+
+
+def prefetch_choices(queries):
+    """
+    Loading choices of relation fields for current request, so they are not loaded again on form rendering.
+    Returns prefetched choices, so they can be loaded in other thread and passed to request thread.
+    """
+    return dict(((q.custom_filter.app_name, q.custom_filter.model_name, q.field), q.relation_choices())
+                for q in queries if q.is_relation)
+
+
+def set_prefetched_choices(choices):
+    _prefetched.choices = choices
+
+
+def clear_prefetched_choices():
+    _prefetched.choices = {}
+
+
 class CustomFilter(models.Model):
     """Model which stores filter set. """
     
@@ -78,6 +153,9 @@ class CustomFilter(models.Model):
     app_name = models.CharField(max_length=255)
     default = models.BooleanField(default=False)
     ordering = models.CharField(max_length=255)
+    load_count = models.PositiveIntegerField(default=0)
+    last_loaded = models.DateTimeField(null=True, blank=True)
+    definition_hash = models.CharField(max_length=32, blank=True, db_index=True)
 
     def get_ordering(self):
         if self.ordering:
@@ -107,18 +185,27 @@ class CustomFilter(models.Model):
     
     @property
     def all_fields_names(self):
+        model_schema = schema.get_model_schema(self.model)
+        if model_schema:
+            return model_schema['field_names']
         return self.model._meta.get_all_field_names()
     
     @property
     def choices(self):
         """List of fields, available for attaching to filter set. Already attached fields and primary key are excluded."""
         
-        return [(f.name, unicode(f.verbose_name).capitalize()) for f in self.all_fields if f.name not in self.columns and not f.primary_key]
+        columns = self.columns
+        return [(name, label) for name, label in paths.field_choices(self.model) + annotations.field_choices(self.model)
+                if name not in columns]
 
     @property
     def ordering_choices(self):
         """List of choices, available for ordering, both descending and ascending."""
-        
+
+        choices = schema.get_ordering_choices(self.model) or self._ordering_choices()
+        return choices + annotations.ordering_choices(self.model)
+
+    def _ordering_choices(self):
         choices = []
         for f in self.all_fields:
             choices.append((f.name, f.verbose_name.capitalize() + '(Asc)'))
@@ -138,7 +225,40 @@ class CustomFilter(models.Model):
     @property
     def verbose_name(self):
         return self.name if self.name else 'default'
+
+    @property
+    def version(self):
+        """Hash of filter set state, it's changed only when filter set settings or attached queries are changed."""
+
+        state = [self.name, self.default, self.ordering,
+                 [q.state for q in self.queries.order_by('id')],
+                 [(q.field, q.value) for q in self.bundled_queries.order_by('id')]]
+        return hashlib.md5(repr(state)).hexdigest()
     
+    @property
+    def definition(self):
+        """
+        Hash of model, ordering and attached queries, unlike version it doesn't change when filter set is renamed or loaded.
+        Filter sets of different users with the same definition share compiled parameters.
+        """
+
+        return make_definition_hash(self.app_name, self.model_name, self.ordering,
+                                    [q.state for q in self.queries.order_by('id')],
+                                    [(q.field, q.value) for q in self.bundled_queries.order_by('id')])
+
+    def update_definition_hash(self):
+        self.definition_hash = self.definition
+        CustomFilter.objects.filter(pk=self.pk).update(definition_hash=self.definition_hash)
+
+    def get_compiled_params(self):
+        """Filter parameters, cached by definition hash together with rendered fragments."""
+
+        if not self.definition_hash:
+            return self.get_filter_params()
+        # date criterias like "today" depend on current date
+        get_key = lambda: caching.make_key('plan', self.definition_hash, datetime.date.today())
+        return caching.cached_fragment(self.model, get_key, self.get_filter_params)
+
     @staticmethod
     def get_filters(path_info, user):
         """Getting available non-default filter sets."""
@@ -146,8 +266,21 @@ class CustomFilter(models.Model):
         return CustomFilter.objects.filter(path_info__startswith=path_info, user=user, 
                                            default=False).exclude(name='temporary')
 
-    def get_filter_params(self):
-        """Preparing parameters for change list queryset, based on attached queries."""
+    @property
+    def annotation_names(self):
+        """Declared annotations, used by attached queries or ordering."""
+
+        ordering = self.filter_ordering
+        names = self.columns + [o.lstrip('-') for o in (ordering if isinstance(ordering, list) else [ordering]) if o]
+        return [name for name in names if annotations.is_annotation(self.model, name)]
+
+    def get_filter_params(self, skip_fields=(), multi_valued=False, annotated=False, queries=None):
+        """
+        Preparing parameters for change list queryset, based on attached queries.
+        Parameters of fields behind multi-valued relations and of annotations are prepared separately,
+        they are applied with subqueries and to annotated queryset. Queries of OR groups are skipped,
+        unless they are given explicitly.
+        """
         
         filter_params = {}
         exclude_params = {}
@@ -155,7 +288,13 @@ class CustomFilter(models.Model):
 
         field = DateTimeField()
 
-        for query in self.queries.all():
+        for query in self.queries.all() if queries is None else queries:
+            if query.criteria in SUBQUERY_CRITERIAS or query.field in skip_fields:
+                continue
+            if query.is_multi_valued != multi_valued or query.is_annotation != annotated:
+                continue
+            if queries is None and query.group_name:
+                continue
             if query.model_field:
                 key = query.field
                 if query.criteria:  # avoiding load of empty criteria
@@ -245,15 +384,91 @@ class CustomFilter(models.Model):
             bundled_params[query.field] = query.value
         return filter_params, exclude_params, bundled_params
 
+    def apply_queries(self, queryset, skip_fields=()):
+        """Applying criterias, which can't be expressed with lookup parameters, to given queryset."""
+
+        queryset = annotations.annotate(queryset, self.annotation_names)
+        filter_params, exclude_params, bundled_params = self.get_filter_params(skip_fields, annotated=True)
+        if filter_params:
+            queryset = queryset.filter(**dict((str(k), prepare_lookup_value(k, v)) for k, v in filter_params.items()))
+        if exclude_params:
+            queryset = queryset.exclude(**dict((str(k), prepare_lookup_value(k, v)) for k, v in exclude_params.items()))
+        for query in self.queries.filter(criteria__in=SUBQUERY_CRITERIAS).exclude(field__in=skip_fields):
+            if query.group_name:
+                continue
+            if query.model_field and query.criteria == 'in_list':
+                queryset = queryset.filter(self.get_query_condition(query, queryset.db))
+            elif query.model_field and query.criteria == 'search':
+                queryset = fulltext.filter_queryset(queryset, query.field, query.field_value)
+        filter_params, exclude_params, bundled_params = self.get_filter_params(skip_fields, multi_valued=True)
+        for params, negated in ((filter_params, False), (exclude_params, True)):
+            for key, value in params.items():
+                queryset = paths.filter_subquery(queryset, str(key), prepare_lookup_value(key, value), negated)
+        for condition in self.get_group_conditions(queryset.db, skip_fields):
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def get_group_conditions(self, using=None, skip_fields=()):
+        """
+        Conditions of OR groups, criterias of the same group are joined with OR and negated group is excluded as whole.
+        Every group is one Q object, criterias behind multi-valued relations are checked with subqueries.
+        """
+        groups = {}
+        for query in self.queries.order_by('id'):
+            if query.group_name and query.field not in skip_fields and query.model_field:
+                groups.setdefault(query.group_name, []).append(query)
+        conditions = []
+        for name, queries in sorted(groups.items()):
+            # criterias without value don't restrict rows, so they aren't added to OR
+            query_conditions = [c for c in [self.get_query_condition(q, using) for q in queries] if c]
+            if not query_conditions:
+                continue
+            condition = reduce(operator.or_, query_conditions)
+            conditions.append(~condition if [q for q in queries if q.group_negated] else condition)
+        return conditions
+
+    def get_query_condition(self, query, using=None):
+        """Q object of single criteria."""
+
+        if query.criteria == 'in_list':
+            column = 'number' if query.field_type == 'integer' else 'value'
+            lookup, values = '%s__in' % query.field, CustomQueryValue.objects.filter(query=query).values(column)
+            if query.is_multi_valued:
+                return paths.subquery_condition(self.model, lookup, values, using)
+            return Q(**{lookup: values})
+        filter_params, exclude_params, bundled_params = self.get_filter_params(multi_valued=query.is_multi_valued,
+                                                                               queries=[query])
+        condition = Q()
+        for params, negated in ((filter_params, False), (exclude_params, True)):
+            for key, value in params.items():
+                key, value = str(key), prepare_lookup_value(key, value)
+                if query.is_multi_valued:
+                    lookup_condition = paths.subquery_condition(self.model, key, value, using)
+                else:
+                    lookup_condition = Q(**{key: value})
+                condition &= ~lookup_condition if negated else lookup_condition
+        return condition
+
+    def get_queryset(self, queryset, skip_fields=()):
+        """
+        Applying filter set to given queryset outside of change list.
+        Criterias of skipped fields and bundled queries, which require request, are not applied.
+        """
+        filter_params, exclude_params, bundled_params = self.get_filter_params(skip_fields)
+        for params, method in ((filter_params, 'filter'), (exclude_params, 'exclude')):
+            for key, value in params.items():
+                # parameters for fields, which were renamed or deleted, are skipped
+                try:
+                    queryset = getattr(queryset, method)(**{str(key): prepare_lookup_value(key, value)})
+                except (FieldError, FieldDoesNotExist):
+                    pass
+        return self.apply_queries(queryset, skip_fields)
+
     @property
     def errors(self):
-        skipped_fields = [f for f in self.columns if f not in self.all_fields_names]
-        for f in skipped_fields:
-            if '__' in f:
-                child_model_name, child_field_name = f.split('__')
-                child_model = getattr(self.model, child_model_name)
-                if child_model and child_field_name in child_model.related.opts.get_all_field_names():
-                    skipped_fields.remove(f)
+        skipped_fields = [f for f in self.columns if f not in self.all_fields_names
+                          and not ('__' in f and paths.resolve(self.model, f))
+                          and not annotations.is_annotation(self.model, f)]
         if skipped_fields:
             skipped_field_names = ['"%s"' % f for f in skipped_fields]
             return _(u'Fields: %s were skipped in current filterset. They might be renamed or deleted from original model.' % ','.join(skipped_field_names))
@@ -268,6 +483,9 @@ class CustomQuery(models.Model):
     criteria = models.CharField(max_length=255, null=True, blank=True)
     is_multiple = models.BooleanField(blank=True, default=False)
     value = models.CharField(max_length=255, null=True, blank=True)
+    # criterias of the same group are joined with OR, negated group is excluded
+    group = models.CharField(max_length=255, blank=True, default='')
+    group_negated = models.BooleanField(default=False)
     
     def get_value(self):
         if not self.is_multiple:
@@ -291,6 +509,27 @@ class CustomQuery(models.Model):
     # Property used for supporting multiple values assignment, provided in lists and dictionaries.
     # Multiple values are used in filter with "between" criteria, which filters values in range of two values.
     field_value = property(get_value, set_value)
+
+    def get_value_list(self):
+        return [v.value for v in self.values.all()]
+
+    def set_value_list(self, values):
+        """
+        Storing values of "is one of (list)" criteria, one row per value, so size of list isn't limited.
+        Query value keeps digest of the list, so unchanged list isn't rewritten.
+        """
+        digest = hashlib.md5(u'\n'.join(values).encode('utf-8')).hexdigest()
+        if digest == self.value and self.values.exists():
+            return
+        is_integer = self.field_type == 'integer'
+        with transaction.atomic():
+            self.values.all().delete()
+            bulk_create(CustomQueryValue, [CustomQueryValue(query=self, value=v, number=int(v) if is_integer else None)
+                                           for v in values], ADMINFILTERS_VALUE_LIST_BATCH_SIZE)
+            self.value = digest
+            self.save()
+
+    value_list = property(get_value_list, set_value_list)
     
     @property
     def choices(self):
@@ -300,22 +539,44 @@ class CustomQuery(models.Model):
         """
         
         choices = EMPTY_CHOICES if not self.value else []
+
+        static_choices = schema.get_field_choices(self.model, self.field) if '__' not in self.field else None
+        if static_choices is not None:
+            return choices + static_choices
         
         if (isinstance(self.model_field, models.CharField) or isinstance(self.model_field, models.IntegerField)) \
                                                                             and getattr(self.model_field, 'choices', None):
             field_choices = list(self.model_field.choices)
             return choices + [(str(c[0]), c[1]) for c in field_choices]
         
-        if isinstance(self.model_field, (models.fields.related.ForeignKey, models.fields.related.ManyToManyField)):
-            fk_ids = [fk_id[0] for fk_id in self.model.objects.values_list('%s__id' % self.field).annotate() if fk_id[0]]
-            kwargs = {'id__in': fk_ids}
-            fk_models = self.model_field.related.parent_model.objects.filter(**kwargs)
-            return choices + [(m.id, unicode(m)) for m in list(fk_models)]
+        if self.is_relation:
+            key = (self.custom_filter.app_name, self.custom_filter.model_name, self.field)
+            fk_choices = getattr(_prefetched, 'choices', {}).get(key)
+            if fk_choices is None:
+                fk_choices = self.relation_choices()
+            return choices + fk_choices
         
         if isinstance(self.model_field, models.BooleanField):
             return choices + BOOLEAN_FIELD_CHOICES
         return
     
+    @property
+    def is_relation(self):
+        return isinstance(self.model_field, (models.fields.related.ForeignKey, models.fields.related.ManyToManyField))
+
+    def relation_choices(self):
+        """For ForeignKey field it's list of aggregated unique values."""
+
+        return caching.cached_choices(self.model, self.field, self._relation_choices)
+
+    def _relation_choices(self):
+        alias = routing.read_alias()
+        with metrics.timer('adminfilters_choices_seconds', model=caching.model_label(self.model)):
+            fk_ids = [fk_id[0] for fk_id in self.model.objects.using(alias).values_list('%s__id' % self.field).annotate() if fk_id[0]]
+            kwargs = {'id__in': fk_ids}
+            fk_models = self.model_field.related.parent_model.objects.using(alias).filter(**kwargs)
+            return [(m.id, unicode(m)) for m in list(fk_models)]
+
     @property
     def model(self):
         """Dynamically importing application model."""
@@ -324,33 +585,74 @@ class CustomQuery(models.Model):
         return model
     
     @property
-    def child_model(self):
-        model_name = self.field.split('__')[0]
-        related_instance = getattr(self.model, model_name)
-        if related_instance:
-            if isinstance(related_instance, ReverseSingleRelatedObjectDescriptor):
-                return related_instance.field.related.model
-            else:
-                return related_instance.related.model
+    def path(self):
+        """Resolved relation path of the field, for fields of related models."""
+        if '__' in self.field:
+            return paths.resolve(self.model, self.field)
         return
+
+    @property
+    def child_model(self):
+        path = self.path
+        return path.model if path else None
+
+    @property
+    def is_multi_valued(self):
+        """Field is reached through reverse foreign key or many-to-many relation, so it's filtered with subquery."""
+        path = self.path
+        return path is not None and path.multi_valued_hop is not None
     
+    @property
+    def state(self):
+        return query_state(self.field, self.criteria, self.is_multiple, self.value, self.group, self.group_negated)
+
+    @property
+    def group_name(self):
+        """Name of OR group. Annotations and full-text search can't be joined with OR, so they aren't grouped."""
+        if not self.group or self.criteria == 'search' or self.is_annotation:
+            return ''
+        return self.group
+
+    @property
+    def is_annotation(self):
+        """Field is annotation declared by model admin, it's compared in HAVING clause of annotated queryset."""
+        return '__' not in self.field and annotations.is_annotation(self.model, self.field)
+
     @property
     def model_field(self):
+        if self.is_annotation:
+            return annotations.annotation_field(self.model, self.field)
         if '__' in self.field:
-            field_name = self.field.split('__')[1]
-            
-            return self.child_model._meta.get_field_by_name(field_name)[0]
+            path = self.path
+            return path.field if path else None
         elif self.field in self.custom_filter.all_fields_names:
             return self.model._meta.get_field_by_name(self.field)[0]
         return
     
+    @property
+    def field_schema(self):
+        """Precomputed metadata for attached field, if it's available."""
+        if '__' not in self.field:
+            return schema.get_field_schema(self.model, self.field)
+        return
+
     @property
     def field_verbose_name(self):
+        path = self.path
+        if path:
+            return path.label
         return self.model_field.verbose_name.capitalize()
     
     @property
     def criterias(self):
         """Preparing list of criterias for each filter, base on field type."""
+
+        if self.is_annotation:
+            return ANNOTATION_DATE_CHOICES if self.field_type in ('date', 'datetime') else ANNOTATION_INTEGER_CHOICES
+
+        field_schema = self.field_schema
+        if field_schema:
+            return CRITERIAS.get(field_schema['criterias'])
         
         if isinstance(self.model_field, models.IntegerField) and getattr(self.model_field, 'choices', None):
             return CHOICE_FIELD_CHOICES
@@ -371,6 +673,10 @@ class CustomQuery(models.Model):
     @property
     def field_type(self):
         """Identifying field type, based on model field class."""
+
+        field_schema = self.field_schema
+        if field_schema:
+            return field_schema['field_type']
         
         if not getattr(self.model_field, 'choices', None):
             if isinstance(self.model_field, models.IntegerField):
@@ -384,6 +690,43 @@ class CustomQuery(models.Model):
         return
 
 
+class CustomQueryValue(models.Model):
+    """Model which stores values of "is one of (list)" criteria."""
+
+    query = models.ForeignKey(CustomQuery, related_name='values')
+    value = models.CharField(max_length=255)
+    number = models.BigIntegerField(null=True, blank=True)
+
+
+class CustomFilterCount(models.Model):
+    """Model which stores number of rows matching equality lookups of filter set, maintained on every save and delete."""
+
+    model_label = models.CharField(max_length=255, db_index=True)
+    key = models.CharField(max_length=32, unique=True)
+    lookups = models.TextField()
+    count = models.BigIntegerField(default=0)
+    rebuilt = models.DateTimeField()
+
+
+class CustomFilterSnapshot(models.Model):
+    """Model which stores materialized results of popular filter set - its count and ordered primary keys of first pages."""
+
+    custom_filter = models.OneToOneField(CustomFilter, related_name='snapshot')
+    definition = models.CharField(max_length=32)
+    ordering = models.TextField()
+    pks = models.TextField()
+    count = models.BigIntegerField()
+    created = models.DateTimeField()
+
+    def get_pks(self):
+        return simplejson.loads(self.pks)
+
+    def set_pks(self, value):
+        self.pks = simplejson.dumps(value)
+
+    pk_list = property(get_pks, set_pks)
+
+
 class CustomBundledQuery(models.Model):
     """Model which stores fields for SimpleListFilter"""
     
@@ -401,8 +744,29 @@ class CustomBundledQuery(models.Model):
         return
 
 
+@receiver(pre_save, sender=CustomFilter)
+def definition_hash_updater(sender, instance, **kwargs):
+    instance.definition_hash = instance.definition
+
+
+@receiver(post_save, sender=CustomQuery)
+@receiver(post_delete, sender=CustomQuery)
+@receiver(post_save, sender=CustomBundledQuery)
+@receiver(post_delete, sender=CustomBundledQuery)
+def query_definition_updater(sender, instance, **kwargs):
+    try:
+        custom_filter = instance.custom_filter
+    except CustomFilter.DoesNotExist:
+        return
+    custom_filter.update_definition_hash()
+
+
 @receiver(post_save, sender=CustomFilter)
 def filter_updater(sender, instance, **kwargs):
     if not instance.path_info:
         instance.path_info = '/admin/%s/%s/' % (instance.app_name, instance.model_name.lower())
         instance.save()
+
+
+# precomputed schema is loaded once per process, on application startup
+schema.load()
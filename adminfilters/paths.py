@@ -0,0 +1,187 @@
+"""
+Relation paths of filter fields, like ``user__profile__region``.
+
+Existing paths within relation depth are resolved once per process. Lookups through single-valued relations (foreign keys and
+one-to-one relations) are joined as usual. Lookups through multi-valued relations (reverse foreign
+keys and many-to-many relations) are applied with ``IN`` subquery on the model owning the relation,
+so outer query doesn't get duplicated rows and doesn't need ``DISTINCT``.
+"""
+from django.conf import settings
+from django.db import models
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.related import RelatedObject
+
+ADMINFILTERS_RELATION_DEPTH = getattr(settings, 'ADMINFILTERS_RELATION_DEPTH', 0)
+
+_paths = {}
+
+
+class RelationPath(object):
+    """Resolved path: relation hops as (name, model owning the relation, multi-valued) and target field."""
+
+    def __init__(self, names, hops, field, model):
+        self.names = names
+        self.hops = hops
+        self.field = field
+        self.model = model
+
+    @property
+    def multi_valued_hop(self):
+        """Index of first multi-valued hop, or None if all relations are single-valued."""
+
+        for index, (name, model, multi_valued) in enumerate(self.hops):
+            if multi_valued:
+                return index
+        return None
+
+    @property
+    def label(self):
+        labels = [name_label(model, name) for name, model, multi_valued in self.hops] + [field_label(self.field)]
+        return u' / '.join(unicode(label).capitalize() for label in labels)
+
+
+def field_label(field):
+    if isinstance(field, RelatedObject):
+        return field.model._meta.verbose_name_plural
+    return field.verbose_name
+
+
+def name_label(model, name):
+    return field_label(model._meta.get_field_by_name(name)[0])
+
+
+def relation(model, name):
+    """Model, which is reached through relation with given name, and whether relation is multi-valued."""
+
+    field, owner, direct, m2m = model._meta.get_field_by_name(name)
+    if direct:
+        if not field.rel:
+            return None, False
+        return field.rel.to, m2m
+    # reverse relations are multi-valued, except reverse one-to-one
+    return field.model, m2m or not field.field.unique
+
+
+def resolve(model, path):
+    """
+    Resolving field path on given model. Returns None if path doesn't exist. Paths come from requests, so only
+    existing paths within relation depth of filter fields are cached, and the cache is bounded by models' fields.
+    """
+    key = (model, path)
+    if key in _paths:
+        return _paths[key]
+    resolved = _resolve(model, path)
+    if resolved is not None and len(resolved.hops) <= max(ADMINFILTERS_RELATION_DEPTH, 1):
+        _paths[key] = resolved
+    return resolved
+
+
+def _resolve(model, path):
+    names = path.split('__')
+    hops = []
+    current = model
+    try:
+        for name in names[:-1]:
+            next_model, multi_valued = relation(current, name)
+            if next_model is None:
+                return None
+            hops.append((name, current, multi_valued))
+            current = next_model
+        field = current._meta.get_field_by_name(names[-1])[0]
+    except FieldDoesNotExist:
+        return None
+    return RelationPath(names, hops, field, current)
+
+
+def split_lookup(model, lookup):
+    """Splitting lookup parameter into resolved path and lookup terms, like "exact" or "year"."""
+
+    parts = lookup.split('__')
+    for end in range(len(parts), 0, -1):
+        path = resolve(model, '__'.join(parts[:end]))
+        if path is not None:
+            return path, parts[end:]
+    return None, parts
+
+
+def is_multi_valued(model, path):
+    resolved = resolve(model, path)
+    return resolved is not None and resolved.multi_valued_hop is not None
+
+
+def subquery_condition(model, lookup, value, using=None):
+    """
+    Condition of lookup through multi-valued relation as IN subquery on the model owning the relation.
+    For "user__groups__name" it's ``Q(user__pk__in=User.objects.filter(groups__name=value))``.
+    """
+    path, terms = split_lookup(model, lookup)
+    index = path.multi_valued_hop
+    name, owner, multi_valued = path.hops[index]
+    inner_lookup = '__'.join(path.names[index:] + terms)
+    subquery = owner._default_manager.using(using).filter(**{inner_lookup: value}).values('pk')
+    outer_lookup = '__'.join(path.names[:index] + ['pk', 'in'])
+    return models.Q(**{outer_lookup: subquery})
+
+
+def filter_subquery(queryset, lookup, value, negated=False):
+    """Applying lookup through multi-valued relation as IN subquery on the model owning the relation."""
+
+    condition = subquery_condition(queryset.model, lookup, value, queryset.db)
+    if negated:
+        return queryset.exclude(condition)
+    return queryset.filter(condition)
+
+
+def relations(model):
+    """Names and labels of relations of the model, forward and reverse."""
+
+    fields = model._meta.fields + model._meta.local_many_to_many
+    names = [(f.name, f.verbose_name) for f in fields if f.rel]
+    names += [(r.field.related_query_name(), r.model._meta.verbose_name_plural) for r in
+              model._meta.get_all_related_objects() + model._meta.get_all_related_many_to_many_objects()]
+    return names
+
+
+def path_models(path):
+    """Models, which data is read through resolved path: models owning the relations, target model and model of choices."""
+
+    used = [model for name, model, multi_valued in path.hops] + [path.model]
+    rel = getattr(path.field, 'rel', None)
+    if rel:
+        used.append(rel.to)
+    return used
+
+
+def reachable_models(model, depth=None):
+    """Models reached from given model through relations of filter paths up to given depth."""
+
+    if depth is None:
+        depth = ADMINFILTERS_RELATION_DEPTH
+    reached = [model]
+    if depth > 0:
+        for name, verbose_name in relations(model):
+            next_model, multi_valued = relation(model, name)
+            if next_model is not None:
+                reached += [m for m in reachable_models(next_model, depth - 1) if m not in reached]
+    return reached
+
+
+def field_choices(model, depth=None, prefix='', label_prefix=u'', previous_model=None):
+    """
+    Fields available for filtering, with fields of related models up to given depth of relations.
+    Reverse relations are followed too, primary keys and relations back to previous model are skipped.
+    """
+    if depth is None:
+        depth = ADMINFILTERS_RELATION_DEPTH
+    fields = model._meta.fields + model._meta.local_many_to_many
+    choices = [(prefix + f.name, label_prefix + unicode(f.verbose_name).capitalize())
+               for f in fields if not f.primary_key]
+    if depth <= 0:
+        return choices
+    for name, verbose_name in relations(model):
+        next_model, multi_valued = relation(model, name)
+        if next_model is None or next_model is previous_model:
+            continue
+        choices += field_choices(next_model, depth - 1, '%s%s__' % (prefix, name),
+                                 u'%s%s / ' % (label_prefix, unicode(verbose_name).capitalize()), model)
+    return choices
@@ -0,0 +1,115 @@
+"""
+Profiling of single changelist request on demand of superuser.
+
+Request with ``ADMINFILTERS_PROFILE_PARAM`` parameter or cookie is run under cProfile, while another thread
+samples its stack. Statistics in pstats format, collapsed stacks for flame graph, SQL queries with timings
+and definition of current filter set are saved to ``ADMINFILTERS_PROFILE_DIRECTORY``. Capture includes rendering
+of template response, with paginated query of results, and rendering of filters by the middleware. Queries run
+by worker threads of concurrent changelist aren't captured. Other requests are only checked for the switch.
+"""
+import cProfile
+import collections
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import simplejson
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+ADMINFILTERS_PROFILE_PARAM = getattr(settings, 'ADMINFILTERS_PROFILE_PARAM', 'profile_adminfilters')
+ADMINFILTERS_PROFILE_DIRECTORY = getattr(settings, 'ADMINFILTERS_PROFILE_DIRECTORY',
+                                         os.path.join(tempfile.gettempdir(), 'adminfilters-profiles'))
+ADMINFILTERS_PROFILE_INTERVAL = getattr(settings, 'ADMINFILTERS_PROFILE_INTERVAL', 0.005)
+
+# file extensions and content types of captured files
+CAPTURE_FILES = {
+    'pstats': ('pstats', 'application/octet-stream'),
+    'stacks': ('collapsed', 'text/plain'),
+    'sql': ('sql.json', 'application/json'),
+    'filter': ('filter.json', 'application/json'),
+}
+CAPTURE_NAME = re.compile(r'^[\w-]+$')
+
+
+def is_requested(request):
+    if not (request.GET.get(ADMINFILTERS_PROFILE_PARAM) or request.COOKIES.get(ADMINFILTERS_PROFILE_PARAM)):
+        return False
+    return request.user.is_active and request.user.is_superuser
+
+
+def capture_name(request):
+    return '%s-%s-%s' % (time.strftime('%Y%m%d-%H%M%S'), request.user.pk, uuid.uuid4().hex[:8])
+
+
+def capture_path(name, kind):
+    return os.path.join(ADMINFILTERS_PROFILE_DIRECTORY, '%s.%s' % (name, CAPTURE_FILES[kind][0]))
+
+
+class StackSampler(threading.Thread):
+    """Sampling stack of given thread, stacks are counted in collapsed format - frames from root joined with ";"."""
+
+    def __init__(self, thread_id, interval):
+        super(StackSampler, self).__init__()
+        self.daemon = True
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append('%s:%s' % (os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            if frames:
+                self.stacks[';'.join(reversed(frames))] += 1
+            self.finished.wait(self.interval)
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+    def collapsed(self):
+        return ''.join('%s %d\n' % (stack, count) for stack, count in sorted(self.stacks.items()))
+
+
+def profile(request, name, view, filter_definitions):
+    """
+    Running view under profiler and saving captured files with given name. Returns rendered response of the view.
+    Filter set definitions are taken after the view, so they include changes made by the request.
+    """
+    captures = [CaptureQueriesContext(connection) for connection in connections.all()]
+    sampler = StackSampler(threading.current_thread().ident, ADMINFILTERS_PROFILE_INTERVAL)
+    profiler = cProfile.Profile()
+    for capture in captures:
+        capture.__enter__()
+    sampler.start()
+    try:
+        response = profiler.runcall(view)
+    finally:
+        sampler.stop()
+        for capture in reversed(captures):
+            capture.__exit__(None, None, None)
+
+    if not os.path.isdir(ADMINFILTERS_PROFILE_DIRECTORY):
+        os.makedirs(ADMINFILTERS_PROFILE_DIRECTORY)
+    profiler.dump_stats(capture_path(name, 'pstats'))
+    with open(capture_path(name, 'stacks'), 'w') as target:
+        target.write(sampler.collapsed())
+    queries = [{'database': capture.connection.alias, 'sql': query['sql'], 'time': query['time']}
+               for capture in captures for query in capture.captured_queries]
+    with open(capture_path(name, 'sql'), 'w') as target:
+        simplejson.dump({'path': request.get_full_path(), 'queries': queries}, target, indent=2)
+    with open(capture_path(name, 'filter'), 'w') as target:
+        simplejson.dump(filter_definitions(), target, indent=2)
+    return response
@@ -0,0 +1,139 @@
+"""
+Export of filter sets to JSON and bulk import of them to many users.
+
+Import creates filter sets, their queries, bundled queries and values of "is one of (list)" criteria
+with ``bulk_create`` in batches, inside one transaction. Signals aren't sent by ``bulk_create``,
+so path and definition hash of filter sets are calculated before they are inserted.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import CustomFilter, CustomQuery, CustomQueryValue, CustomBundledQuery, bulk_create, make_definition_hash, query_state
+
+ADMINFILTERS_PROVISIONING_BATCH_SIZE = getattr(settings, 'ADMINFILTERS_PROVISIONING_BATCH_SIZE', 1000)
+
+
+def export_filters(queryset):
+    """Definitions of filter sets as JSON serializable list."""
+
+    definitions = []
+    for custom_filter in queryset.select_related('user').prefetch_related('queries__values', 'bundled_queries'):
+        queries = []
+        for query in sorted(custom_filter.queries.all(), key=lambda q: q.pk):
+            definition = {'field': query.field, 'criteria': query.criteria, 'is_multiple': query.is_multiple,
+                          'value': query.value}
+            if query.group:
+                definition.update(group=query.group, group_negated=query.group_negated)
+            values = [(v.pk, v.value) for v in query.values.all()]
+            if values:
+                definition['values'] = [value for pk, value in sorted(values)]
+            queries.append(definition)
+        definitions.append({'user': custom_filter.user.username,
+                            'name': custom_filter.name,
+                            'default': custom_filter.default,
+                            'app_name': custom_filter.app_name,
+                            'model_name': custom_filter.model_name,
+                            'path_info': custom_filter.path_info,
+                            'ordering': custom_filter.ordering,
+                            'queries': queries,
+                            'bundled_queries': [{'module_name': q.module_name, 'class_name': q.class_name,
+                                                 'field': q.field, 'value': q.value}
+                                                for q in sorted(custom_filter.bundled_queries.all(), key=lambda q: q.pk)]})
+    return definitions
+
+
+def filter_key(user_id, app_name, model_name, name, default):
+    # there's only one default filter set per user and model, whatever its name is
+    return (user_id, app_name, model_name, '' if default else name or '', bool(default))
+
+
+def definition_key(user_id, definition):
+    return filter_key(user_id, definition['app_name'], definition['model_name'], definition.get('name'),
+                      definition.get('default'))
+
+
+def build_filter(user_id, definition):
+    app_name, model_name = definition['app_name'], definition['model_name']
+    ordering = definition.get('ordering') or ''
+    return CustomFilter(user_id=user_id, name=definition.get('name'), default=bool(definition.get('default')),
+                        app_name=app_name, model_name=model_name, ordering=ordering,
+                        path_info=definition.get('path_info') or '/admin/%s/%s/' % (app_name, model_name.lower()),
+                        definition_hash=make_definition_hash(
+                            app_name, model_name, ordering,
+                            [query_state(q['field'], q.get('criteria'), bool(q.get('is_multiple')), q.get('value'),
+                                         q.get('group'), q.get('group_negated'))
+                             for q in definition.get('queries', [])],
+                            [(q['field'], q.get('value')) for q in definition.get('bundled_queries', [])]))
+
+
+def import_filters(definitions, users=None, replace=False, batch_size=None):
+    """
+    Creating filter sets from definitions for given users, or for their original owners when users aren't given.
+    Existing filter sets with the same model, name and default flag are skipped, or replaced with replace=True.
+    Returns number of created filter sets.
+    """
+    batch_size = batch_size or ADMINFILTERS_PROVISIONING_BATCH_SIZE
+    if users is None:
+        owners = dict(User.objects.filter(username__in=set(d['user'] for d in definitions)).values_list('username', 'pk'))
+        targets = [(owners[d['user']], d) for d in definitions if d['user'] in owners]
+    else:
+        user_ids = [getattr(user, 'pk', user) for user in users]
+        targets = [(user_id, d) for user_id in user_ids for d in definitions]
+
+    created = 0
+    with transaction.atomic():
+        for start in range(0, len(targets), batch_size):
+            created += import_batch(targets[start:start + batch_size], replace, batch_size)
+    return created
+
+
+def existing_filters(user_ids, models):
+    queryset = CustomFilter.objects.filter(user__in=user_ids, app_name__in=set(a for a, m in models),
+                                           model_name__in=set(m for a, m in models))
+    return dict((filter_key(user_id, app_name, model_name, name, default), pk) for pk, user_id, app_name, model_name, name, default
+                in queryset.values_list('pk', 'user_id', 'app_name', 'model_name', 'name', 'default'))
+
+
+def import_batch(targets, replace, batch_size):
+    user_ids = set(user_id for user_id, d in targets)
+    models = set((d['app_name'], d['model_name']) for user_id, d in targets)
+    existing = existing_filters(user_ids, models)
+
+    # the latest definition wins, when there are several definitions of the same filter set
+    unique = {}
+    for user_id, definition in targets:
+        unique[definition_key(user_id, definition)] = (user_id, definition)
+    if replace:
+        CustomFilter.objects.filter(pk__in=[existing.pop(key) for key in unique if key in existing]).delete()
+    targets = [target for key, target in unique.items() if key not in existing]
+    bulk_create(CustomFilter, [build_filter(user_id, d) for user_id, d in targets], batch_size)
+
+    # bulk_create doesn't set primary keys, so created filter sets are looked up again
+    created = existing_filters(user_ids, models)
+    queries, bundled_queries, value_lists = [], [], {}
+    for user_id, definition in targets:
+        filter_id = created[definition_key(user_id, definition)]
+        for q in definition.get('queries', []):
+            queries.append(CustomQuery(custom_filter_id=filter_id, field=q['field'], criteria=q.get('criteria'),
+                                       is_multiple=bool(q.get('is_multiple')), value=q.get('value'),
+                                       group=q.get('group') or '', group_negated=bool(q.get('group_negated'))))
+            if q.get('values'):
+                value_lists[(filter_id, q['field'])] = q['values']
+        for q in definition.get('bundled_queries', []):
+            bundled_queries.append(CustomBundledQuery(custom_filter_id=filter_id, module_name=q.get('module_name'),
+                                                      class_name=q.get('class_name'), field=q['field'],
+                                                      value=q.get('value')))
+    bulk_create(CustomQuery, queries, batch_size)
+    bulk_create(CustomBundledQuery, bundled_queries, batch_size)
+
+    if value_lists:
+        values = []
+        query_ids = CustomQuery.objects.filter(custom_filter__in=set(f for f, field in value_lists)).values_list(
+            'pk', 'custom_filter_id', 'field')
+        for query_id, filter_id, field in query_ids:
+            for value in value_lists.get((filter_id, field), []):
+                number = int(value) if value.lstrip('-').isdigit() else None
+                values.append(CustomQueryValue(query_id=query_id, value=value, number=number))
+        bulk_create(CustomQueryValue, values, batch_size)
+    return len(targets)
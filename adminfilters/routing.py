@@ -0,0 +1,100 @@
+"""
+Routing of read-only filter queries to read replica.
+
+Changelist querysets, choices of filter fields and lookups of bundled filters are read from
+database set with ADMINFILTERS_READ_DATABASE, only while GET request is reading them inside ``reading``
+block. Everything else, like change forms, actions and login, uses primary database. Users, sessions
+and filter sets themselves are always read and written on primary database. After user's write,
+reads are kept on primary for ADMINFILTERS_READ_YOUR_WRITES seconds, so user doesn't see stale data
+because of replication lag.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from .caching import is_tracked
+
+ADMINFILTERS_READ_DATABASE = getattr(settings, 'ADMINFILTERS_READ_DATABASE', None)
+ADMINFILTERS_READ_YOUR_WRITES = getattr(settings, 'ADMINFILTERS_READ_YOUR_WRITES', 0)
+
+LAST_WRITE_SESSION_KEY = 'adminfilters_last_write'
+
+# models of these applications are always read from primary database
+PRIMARY_APPS = ('auth', 'sessions', 'contenttypes', 'admin', 'adminfilters')
+
+_state = threading.local()
+
+
+def request_alias(request):
+    """Database alias for read queries of given request, None means default routing."""
+
+    alias = ADMINFILTERS_READ_DATABASE
+    if not alias or request.method != 'GET':
+        return None
+    session = getattr(request, 'session', None)
+    last_write = session.get(LAST_WRITE_SESSION_KEY) if session is not None else None
+    if last_write and time.time() - last_write < ADMINFILTERS_READ_YOUR_WRITES:
+        return None
+    return alias
+
+
+@contextmanager
+def reading(request):
+    """Routing reads of filtered models to read database inside the block, yields alias of read database."""
+
+    previous = read_alias()
+    _state.alias = request_alias(request)
+    try:
+        yield _state.alias
+    finally:
+        _state.alias = previous
+
+
+def deactivate():
+    _state.alias = None
+
+
+def read_alias():
+    """Database alias for read queries, None means default routing."""
+
+    return getattr(_state, 'alias', None)
+
+
+def record_write(request):
+    if ADMINFILTERS_READ_DATABASE and ADMINFILTERS_READ_YOUR_WRITES and hasattr(request, 'session'):
+        request.session[LAST_WRITE_SESSION_KEY] = time.time()
+        _state.alias = None
+
+
+def is_routed(model):
+    return is_tracked(model) and model._meta.app_label not in PRIMARY_APPS
+
+
+class ReadReplicaRouter(object):
+    """
+    Database router, which sends reads of filtered models and their related models to read replica,
+    while adminfilters reads them for GET request. Objects loaded from replica are written to primary database,
+    writes of other objects are left to default routing. Should be added to DATABASE_ROUTERS setting.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = read_alias()
+        if alias and is_routed(model):
+            return alias
+        return
+
+    def db_for_write(self, model, **hints):
+        # objects of other databases, like shards, are saved where they were loaded from
+        instance = hints.get('instance')
+        if ADMINFILTERS_READ_DATABASE and instance is not None and instance._state.db == ADMINFILTERS_READ_DATABASE:
+            return DEFAULT_DB_ALIAS
+        return
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = (DEFAULT_DB_ALIAS, ADMINFILTERS_READ_DATABASE)
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return
@@ -0,0 +1,204 @@
+"""
+Precomputed filter metadata for models registered with CustomFiltersAdmin.
+
+Schema file is generated at deploy time by ``build_adminfilters_schema`` management command
+and loaded once per process, so workers don't rebuild field lists, criteria and ordering choices
+on their first requests. Every model entry keeps fingerprint of model definition, with labels of fields
+and choices, entries which don't match current model are ignored and metadata is calculated as usual.
+"""
+import hashlib
+import os
+
+import simplejson
+
+from django.conf import settings
+from django.utils import translation
+
+ADMINFILTERS_SCHEMA_FILE = getattr(settings, 'ADMINFILTERS_SCHEMA_FILE', None)
+
+SCHEMA_VERSION = 1
+
+_schema = None
+_model_schemas = {}
+
+
+def model_key(model):
+    return '%s.%s' % (model._meta.app_label, model.__name__)
+
+
+def model_fingerprint(model):
+    """
+    Hash of model fields definition, used for detecting stale schema entries. Labels are served from schema too,
+    so they are included in language of the schema.
+    """
+    parts = []
+    with translation.override(settings.LANGUAGE_CODE):
+        for f in model._meta.fields + model._meta.local_many_to_many:
+            parts.append((f.name, f.__class__.__name__, f.get_internal_type(), f.primary_key, unicode(f.verbose_name),
+                          [(unicode(c[0]), unicode(c[1])) for c in f.flatchoices]))
+    return hashlib.md5(repr(parts)).hexdigest()
+
+
+def load(path=None):
+    """Loading schema file, missing or broken file is treated as empty schema."""
+
+    global _schema
+    if _schema is not None and path in (None, _schema.get('path')):
+        return _schema
+    path = path or ADMINFILTERS_SCHEMA_FILE
+    if _schema is None or path != _schema.get('path'):
+        data = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as schema_file:
+                    data = simplejson.load(schema_file)
+            except (IOError, ValueError):
+                data = {}
+        if data.get('version') != SCHEMA_VERSION:
+            data = {}
+        data['path'] = path
+        _schema = data
+        _model_schemas.clear()
+    return _schema
+
+
+def get_model_schema(model):
+    """Getting precomputed metadata for given model, or None if there's no fresh entry for it."""
+
+    if model is None:
+        return
+    key = model_key(model)
+    if key not in _model_schemas:
+        entry = load().get('models', {}).get(key)
+        if entry and entry.get('fingerprint') != model_fingerprint(model):
+            entry = None
+        _model_schemas[key] = entry
+    return _model_schemas[key]
+
+
+def get_field_schema(model, field_name):
+    model_schema = get_model_schema(model)
+    if model_schema:
+        return model_schema['fields'].get(field_name)
+    return
+
+
+def get_ordering_choices(model):
+    """Ordering choices are stored with labels, so they are used only for language of the schema."""
+
+    model_schema = get_model_schema(model)
+    if model_schema and model_schema.get('language') == translation.get_language():
+        return [tuple(c) for c in model_schema['ordering']]
+    return
+
+
+def get_field_choices(model, field_name):
+    """Static choices of field are stored with labels too, so they are used only for language of the schema."""
+
+    model_schema = get_model_schema(model)
+    if model_schema and model_schema.get('language') == translation.get_language():
+        field_schema = model_schema['fields'].get(field_name)
+        if field_schema and 'choices' in field_schema:
+            return [tuple(c) for c in field_schema['choices']]
+    return
+
+
+def build_model_schema(model):
+    """Calculating metadata for given model the same way filter set does it at runtime."""
+
+    from .models import CustomFilter, CustomQuery, get_criterias_name
+
+    custom_filter = CustomFilter(app_name=model._meta.app_label, model_name=model.__name__)
+    fields = {}
+    for f in custom_filter.all_fields:
+        query = CustomQuery(custom_filter=custom_filter, field=f.name)
+        field_schema = {'type': f.get_internal_type(),
+                        'field_type': query.field_type,
+                        'criterias': get_criterias_name(query.criterias)}
+        # foreign key choices depend on data, so only static choices are stored
+        if f.choices or field_schema['type'] == 'BooleanField':
+            field_schema['choices'] = [list(c) for c in query.choices or [] if c[0] != '']
+        fields[f.name] = field_schema
+    return {'fingerprint': model_fingerprint(model),
+            'language': translation.get_language(),
+            'field_names': model._meta.get_all_field_names(),
+            'fields': fields,
+            'ordering': [[unicode(value), unicode(label)] for value, label in custom_filter._ordering_choices()]}
+
+
+def build_schema(models):
+    with translation.override(settings.LANGUAGE_CODE):
+        return {'version': SCHEMA_VERSION,
+                'models': dict((model_key(model), build_model_schema(model)) for model in models)}
+
+
+def registered_models(site=None):
+    """Models registered in admin site with CustomFiltersAdmin."""
+
+    from .admin import CustomFiltersAdmin
+
+    if site is None:
+        from django.contrib.admin import site
+    return [model for model, model_admin in site._registry.items() if isinstance(model_admin, CustomFiltersAdmin)]
+
+
+def query_schema(query):
+    """Description of filter field row - criteria, value widget and current value, used for rendering it on client side."""
+
+    row = {'field': query.field,
+           'label': unicode(query.field_verbose_name),
+           'field_type': query.field_type,
+           'enabled': True,
+           'criteria': query.criteria,
+           'criterias': [[value, unicode(label)] for value, label in query.criterias or []],
+           'value': query.field_value,
+           'is_multiple': query.is_multiple,
+           'range': query.field_type in ('date', 'datetime', 'integer'),
+           'days_ago': query.field_type in ('date', 'datetime'),
+           'value_list': 'in_list' in dict(query.criterias or ()),
+           'groupable': not query.is_annotation,
+           'group': query.group,
+           'group_negated': query.group_negated}
+    choices = query.choices
+    if choices:
+        row['widget'] = 'select_multiple' if query.is_multiple else 'select'
+        row['choices'] = [[unicode(value), unicode(label)] for value, label in choices]
+    elif query.field_type in ('date', 'datetime'):
+        row['widget'] = query.field_type
+    else:
+        row['widget'] = 'text'
+    return row
+
+
+def bundled_query_schema(query, model):
+    query_instance = query.query_instance(None, {}, model, None)
+    return {'field': query_instance.parameter_name,
+            'label': unicode(query_instance.title.title()),
+            'bundled': True,
+            'enabled': True,
+            'criteria': query.value,
+            'criterias': [[value, unicode(label)] for value, label in query_instance.lookups(None, model)],
+            'widget': None}
+
+
+def filter_schema(custom_filter, field=None):
+    """
+    Description of filter set with all its field rows.
+    If field name is given, only row of this field is described, field is not required to be attached to filter set.
+    """
+
+    from .models import CustomQuery
+
+    queries = list(custom_filter.queries.all())
+    if field:
+        queries = [q for q in queries if q.field == field] or [CustomQuery(custom_filter=custom_filter, field=field)]
+    rows = [query_schema(q) for q in queries if q.model_field]
+    if field:
+        return {'id': custom_filter.pk, 'rows': rows}
+    rows = [bundled_query_schema(q, custom_filter.model) for q in custom_filter.bundled_queries.all()] + rows
+    return {'id': custom_filter.pk,
+            'name': custom_filter.verbose_name,
+            'ordering': custom_filter.filter_ordering,
+            'ordering_choices': [[value, unicode(label)] for value, label in custom_filter.ordering_choices],
+            'add_choices': [[value, unicode(label)] for value, label in custom_filter.choices],
+            'rows': rows}
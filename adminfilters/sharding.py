@@ -0,0 +1,173 @@
+"""
+Evaluation of filtered queryset on several databases with the same schema.
+
+Counts are summed, pages are built with k-way merge of per-database querysets, limited to the
+end of requested page and sorted with the same ordering, so every database returns at most one page
+of rows for the first page and merging doesn't require loading whole result sets. Primary keys aren't unique
+across databases, so rows selected for admin actions are identified by alias of their database and primary key.
+"""
+import heapq
+from itertools import islice
+
+from django.db import models
+
+from .execution import run_parallel
+
+
+def shard_identifier(obj):
+    return u'%s:%s' % (obj._state.db, obj.pk)
+
+
+class Descending(object):
+    """Wrapper, reversing comparison of ordering value for descending ordering."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class ShardedQuerySet(object):
+    """
+    Queryset, evaluated on several databases. It's built of querysets of every database, so their subqueries
+    are run on the same database. Rows can be filtered, updated and deleted, so admin actions work on all databases.
+    """
+
+    ordered = True
+
+    def __init__(self, querysets):
+        self.querysets = list(querysets)
+        self.queryset = self.querysets[0]
+        self.aliases = [queryset.db for queryset in self.querysets]
+        self.model = self.queryset.model
+        ordering = [o for o in self.queryset.query.order_by or self.model._meta.ordering if o != '?']
+        if not [o for o in ordering if o.lstrip('-') in ('pk', self.model._meta.pk.name)]:
+            ordering.append('-pk')
+        self.ordering = ordering
+        self._result_cache = None
+
+    def _clone(self):
+        return ShardedQuerySet(self.querysets)
+
+    def using(self, alias):
+        for queryset in self.querysets:
+            if queryset.db == alias:
+                return queryset
+        return self.queryset.using(alias)
+
+    def each(self, method, *args, **kwargs):
+        """Running queryset method on every database concurrently, results are in order of databases."""
+
+        return run_parallel([lambda queryset=queryset: getattr(queryset, method)(*args, **kwargs)
+                             for queryset in self.querysets])
+
+    def count(self):
+        return sum(self.each('count'))
+
+    def filter(self, *args, **kwargs):
+        if not args and kwargs.keys() == ['pk__in']:
+            # selected rows of admin actions
+            return self.select(kwargs['pk__in'])
+        return ShardedQuerySet([queryset.filter(*args, **kwargs) for queryset in self.querysets])
+
+    def select(self, identifiers):
+        """Rows of given shard identifiers, every database is filtered by its own primary keys only."""
+
+        pks = dict((alias, []) for alias in self.aliases)
+        for identifier in identifiers:
+            alias, separator, pk = unicode(identifier).partition(u':')
+            if separator and alias in pks:
+                pks[alias].append(pk)
+        return ShardedQuerySet([queryset.filter(pk__in=pks[queryset.db]) if pks[queryset.db] else queryset.none()
+                                for queryset in self.querysets])
+
+    def exclude(self, *args, **kwargs):
+        return ShardedQuerySet([queryset.exclude(*args, **kwargs) for queryset in self.querysets])
+
+    def order_by(self, *field_names):
+        return ShardedQuerySet([queryset.order_by(*field_names) for queryset in self.querysets])
+
+    def update(self, **kwargs):
+        return sum(queryset.update(**kwargs) for queryset in self.querysets)
+
+    def delete(self):
+        for queryset in self.querysets:
+            queryset.delete()
+        self._result_cache = None
+
+    def aggregate(self, **aggregates):
+        """
+        Combining per-database aggregates. Counts and sums are added up, minimums and maximums are compared,
+        averages are weighted by number of rows with value on every database.
+        """
+
+        queries = {}
+        for name, aggregate in aggregates.items():
+            queries[name] = aggregate
+            if aggregate.name == 'Avg':
+                queries['%s__adminfilters_weight' % name] = models.Count(aggregate.lookup)
+        results = self.each('aggregate', **queries)
+        combined = {}
+        for name, aggregate in aggregates.items():
+            values = [r[name] for r in results if r[name] is not None]
+            if not values:
+                combined[name] = 0 if aggregate.name == 'Count' else None
+            elif aggregate.name == 'Avg':
+                weights = [r['%s__adminfilters_weight' % name] for r in results if r[name] is not None]
+                combined[name] = sum(v * w for v, w in zip(values, weights)) / float(sum(weights) or 1)
+            elif aggregate.name == 'Min':
+                combined[name] = min(values)
+            elif aggregate.name == 'Max':
+                combined[name] = max(values)
+            else:
+                combined[name] = sum(values)
+        return combined
+
+    def sort_key(self, row):
+        return tuple(Descending(value) if field.startswith('-') else value for field, value in zip(self.ordering, row))
+
+    def fetch(self, start, stop):
+        """Fetching merged rows, every database is queried for ordering values of its first rows only."""
+
+        fields = [o.lstrip('-') for o in self.ordering] + ['pk']
+
+        def keys(index, queryset):
+            rows = queryset.values_list(*fields)
+            rows = rows[:stop] if stop is not None else rows
+            return [(self.sort_key(row[:-1]), index, row[-1]) for row in rows]
+
+        shard_keys = run_parallel([lambda index=index, queryset=queryset: keys(index, queryset)
+                                   for index, queryset in enumerate(self.querysets)])
+        page = list(islice(heapq.merge(*shard_keys), start, stop))
+
+        def objects(index, queryset):
+            pks = [pk for key, shard, pk in page if shard == index]
+            return queryset.in_bulk(pks) if pks else {}
+
+        shard_objects = run_parallel([lambda index=index, queryset=queryset: objects(index, queryset)
+                                      for index, queryset in enumerate(self.querysets)])
+        return [shard_objects[shard][pk] for key, shard, pk in page]
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            if self._result_cache is not None:
+                return self._result_cache[k]
+            return self.fetch(k.start or 0, k.stop)
+        return self[k:k + 1][0]
+
+    def __iter__(self):
+        if self._result_cache is None:
+            self._result_cache = self.fetch(0, None)
+        return iter(self._result_cache)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __nonzero__(self):
+        return bool(self[0:1])
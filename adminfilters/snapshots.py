@@ -0,0 +1,73 @@
+"""
+Materialized results of popular filter sets.
+
+``materialize_adminfilters`` management command runs the most loaded named filter sets and stores
+their count and ordered primary keys of first pages. When such filter set is loaded, changelist
+serves first pages from snapshot without running filtered queries, until user asks for live results,
+changes the filter set or snapshot gets older than ``ADMINFILTERS_SNAPSHOT_MAX_AGE``.
+"""
+import datetime
+
+import simplejson
+
+from django.conf import settings
+from django.http import HttpRequest
+from django.utils import timezone
+
+from .models import CustomFilter, CustomFilterSnapshot
+
+ADMINFILTERS_SNAPSHOT_SIZE = getattr(settings, 'ADMINFILTERS_SNAPSHOT_SIZE', 500)
+ADMINFILTERS_SNAPSHOT_MAX_AGE = getattr(settings, 'ADMINFILTERS_SNAPSHOT_MAX_AGE', 24 * 60 * 60)
+
+SESSION_KEY = 'adminfilters_snapshot'
+
+
+def popular_filters(min_loads=1):
+    """Most loaded named filter sets. Filter sets with bundled queries depend on request, so they aren't materialized."""
+
+    return CustomFilter.objects.filter(load_count__gte=min_loads, bundled_queries=None).exclude(
+        name__isnull=True).exclude(name__in=('', 'temporary')).order_by('-load_count')
+
+
+def changelist_ordering(custom_filter, model_admin):
+    """Ordering of changelist for given filter set, with primary key added the same way changelist does it."""
+
+    model = custom_filter.model
+    ordering = list(custom_filter.filter_ordering or model_admin.ordering or model._meta.ordering)
+    pk_name = model._meta.pk.name
+    if not set(ordering) & set(['pk', '-pk', pk_name, '-' + pk_name]):
+        ordering.append('-pk')
+    return ordering
+
+
+def materialize(custom_filter, model_admin):
+    """Running filter set on behalf of its owner and storing its results."""
+
+    request = HttpRequest()
+    request.user = custom_filter.user
+    ordering = changelist_ordering(custom_filter, model_admin)
+    queryset = custom_filter.get_queryset(model_admin.get_queryset(request))
+    pks = list(queryset.order_by(*ordering).values_list('pk', flat=True)[:ADMINFILTERS_SNAPSHOT_SIZE])
+    snapshot, created = CustomFilterSnapshot.objects.get_or_create(
+        custom_filter=custom_filter, defaults={'count': 0, 'created': timezone.now()})
+    snapshot.definition = custom_filter.definition_hash
+    snapshot.ordering = simplejson.dumps(ordering)
+    snapshot.pk_list = pks
+    snapshot.count = len(pks) if len(pks) < ADMINFILTERS_SNAPSHOT_SIZE else queryset.count()
+    snapshot.created = timezone.now()
+    snapshot.save()
+    return snapshot
+
+
+def get_snapshot(custom_filter, ordering):
+    """Fresh snapshot of filter set, or None if filter set or ordering were changed since it was taken."""
+
+    try:
+        snapshot = custom_filter.snapshot
+    except CustomFilterSnapshot.DoesNotExist:
+        return None
+    if snapshot.created < timezone.now() - datetime.timedelta(seconds=ADMINFILTERS_SNAPSHOT_MAX_AGE):
+        return None
+    if snapshot.definition != custom_filter.definition_hash or simplejson.loads(snapshot.ordering) != list(ordering):
+        return None
+    return snapshot
@@ -8,7 +8,13 @@ $(function() {
         }
         $('.add_adminfilters').change(function () {
         	var fname = $(this).val();
-            form.ajaxSubmit({'success': update_form, url: form.data('save-action')});
+            if (form.data('schema-action')) {
+                // only schema of added field is loaded, row is rendered on client side
+                $.getJSON(form.data('schema-action'), {'field': fname}, add_row);
+            }
+            else {
+                form.ajaxSubmit({'success': update_form, url: form.data('save-action')});
+            }
         	$(this).find("option[value='"+fname+"']").remove();
         	$(this).find("option[value='']").attr('selected', true);
         });
@@ -98,8 +104,89 @@ function save_form(data) {
 		$('#custom_filter_form').html(responseText);
 	}
 }
-function bind_events() {
-	$('.enable').click(function () {
+function add_row(data) {
+    $.each(data.rows, function (index, row) {
+        var container = $('<div></div>').html(render_row(row));
+        var elements = container.children();
+        $('#custom_filter_form').append(elements);
+        if (typeof(DateTimeShortcuts) != 'undefined') {
+            elements.find('input.vDateField').each(function () {
+                DateTimeShortcuts.addCalendar(this);
+            });
+            elements.find('input.vTimeField').each(function () {
+                DateTimeShortcuts.addClock(this);
+            });
+        }
+        bind_events(elements);
+    });
+}
+function escape_html(value) {
+    return $('<div></div>').text(value === null || typeof(value) == 'undefined' ? '' : String(value)).html();
+}
+function render_select(name, choices, value, attrs) {
+    var values = $.isArray(value) ? value : [value];
+    var html = '<select name="' + name + '"' + (attrs || '') + '>';
+    $.each(choices, function (index, choice) {
+        var selected = $.inArray(String(choice[0]), $.map(values, String)) >= 0 ? ' selected="selected"' : '';
+        html += '<option value="' + escape_html(choice[0]) + '"' + selected + '>' + escape_html(choice[1]) + '</option>';
+    });
+    return html + '</select>';
+}
+function render_input(name, widget, value) {
+    if (widget == 'date') {
+        return '<input type="text" name="' + name + '" class="vDateField" size="10" value="' + escape_html(value) + '">';
+    }
+    if (widget == 'datetime') {
+        return '<p class="datetime">' + gettext('Date:') + ' <input type="text" name="' + name + '_0" class="vDateField" size="10"><br>' +
+               gettext('Time:') + ' <input type="text" name="' + name + '_1" class="vTimeField" size="8"></p>';
+    }
+    return '<input type="text" name="' + name + '" size="10" value="' + escape_html(value) + '">';
+}
+function render_row(row) {
+    // markup follows custom_filter_form.html template
+    var fname = row.field;
+    var html = '<div class="lcontainer"><input type="checkbox" name="' + fname + '_enabled" id="id_' + fname + '_enabled" class="enable" checked="checked">' +
+               ' <label for="id_' + fname + '_enabled" class="inline-label">' + escape_html(row.label) + '</label>';
+    if (row.groupable) {
+        // criterias with the same group name are joined with OR
+        html += ' <span class="group_container"><input type="text" name="' + fname + '_group" class="group" size="6" placeholder="' +
+                escape_html(gettext('OR group')) + '" value="' + escape_html(row.group) + '"> <label><input type="checkbox" name="' +
+                fname + '_group_negated" class="group_negated"' + (row.group_negated ? ' checked="checked"' : '') + '> ' +
+                escape_html(gettext('not')) + '</label></span>';
+    }
+    html += '</div>';
+    html += '<div class="fcontainer" id="' + fname + '_criteria_container">';
+    if (row.criterias.length) {
+        html += '<div class="lcontainer">' + render_select(fname + '_criteria', row.criterias, row.criteria, ' class="criteria"') + '</div>';
+    }
+    if (row.widget) {
+        html += '<div class="lcontainer" id="' + fname + '_value_container">';
+        if (row.choices) {
+            var multiple = row.widget == 'select_multiple' ? ' multiple="multiple"' : '';
+            html += render_select(fname + '_value', row.choices, row.value, ' class="value"' + multiple);
+        }
+        else {
+            html += render_input(fname + '_value', row.widget, row.value);
+        }
+        html += '</div>';
+    }
+    if (row.range || row.value_list) {
+        html += '<div id="' + fname + '_dcontainer" class="dcontainer">';
+        if (row.range) {
+            html += render_input(fname + '_start', row.widget, '') + render_input(fname + '_end', row.widget, '');
+        }
+        if (row.days_ago) {
+            html += '<input type="text" name="' + fname + '_dago" size="5" style="display: none">';
+        }
+        if (row.value_list) {
+            html += '<textarea name="' + fname + '_list" class="value_list" rows="5" cols="20"></textarea>';
+        }
+        html += '</div>';
+    }
+    return html + '</div><br clear="both">';
+}
+function bind_events(context) {
+	$('.enable', context).click(function () {
             var enabled = $(this).attr('checked');
             var enable_name = $(this).attr('name');
             var field_name = enable_name.substr(0, enable_name.indexOf('_enabled'));
@@ -110,18 +197,26 @@ function bind_events() {
                 $('#' + field_name + '_criteria_container').hide();
             }
         });
-        $('select.value').each(function () {
+        $('select.value', context).each(function () {
             if ($(this).find('option').length > 1) {
                 var name = $(this).attr('name');
                 var fname = name.substr(0, name.indexOf('_value'));
                 $(this).after(' <a href="javascript:expand_choices(\'' + fname + '\');" id="' + fname + '_toggle">expand</a>');
             }
         });
-        $('.dcontainer').each(function () {
+        $('.dcontainer', context).each(function () {
             $(this).find('p').css('float', 'left');
         });
 
-        $('.criteria').change(function () {
+        $('.criteria', context).each(function () {
+            if ($(this).find('option[value=days_ago]').length) {
+                var fvalue = $(this).attr('name');
+                var fname = fvalue.substr(0, fvalue.indexOf('_criteria'));
+                $(this).after(' <a href="javascript:show_histogram(\'' + fname + '\', \'month\');" id="' + fname + '_histogram_toggle">histogram</a>' +
+                              '<div class="histogram" id="' + fname + '_histogram"></div>');
+            }
+        });
+        $('.criteria', context).change(function () {
             var fvalue = $(this).attr('name');
             var fname = fvalue.substr(0, fvalue.indexOf('_criteria'));
             reset_containers(fname);
@@ -131,6 +226,7 @@ function bind_events() {
                 $('#' + fname + '_dcontainer').find('input').show();
                 $('#' + fname + '_dcontainer').find('span').show();
                 $('input[name=' + fname + '_dago]').hide();
+                $('#' + fname + '_dcontainer').find('textarea').hide();
                 $('#' + fname + '_value_container').hide();
             }
             else if ($.inArray($(this).val(), ['today', 'this_week', 'this_month', 'this_year']) >= 0) {
@@ -141,14 +237,65 @@ function bind_events() {
                 $('#' + fname + '_dcontainer').find('p').hide();
                 $('#' + fname + '_dcontainer').find('input').hide();
                 $('#' + fname + '_dcontainer').find('span').hide();
+                $('#' + fname + '_dcontainer').find('textarea').hide();
                 $('#' + fname + '_value_container').hide();
                 $('input[name=' + fname + '_dago]').show();
             }
+            else if ($(this).val() == 'in_list') {
+                $('#' + fname + '_dcontainer').show();
+                $('#' + fname + '_dcontainer').find('p').hide();
+                $('#' + fname + '_dcontainer').find('input').hide();
+                $('#' + fname + '_dcontainer').find('span').hide();
+                $('#' + fname + '_dcontainer').find('textarea').show();
+                $('#' + fname + '_value_container').hide();
+            }
 
         });
-        $('.criteria').each(function () {
-            if ($.inArray($(this).val(), ['today', 'this_week', 'this_month', 'this_year', 'days_ago', 'between']) >= 0) {
+        $('.criteria', context).each(function () {
+            if ($.inArray($(this).val(), ['today', 'this_week', 'this_month', 'this_year', 'days_ago', 'between', 'in_list']) >= 0) {
                 $(this).trigger('change');
             }
         });
 }
+function show_histogram(fname, period) {
+    var form = $('form[name=filters]');
+    $.getJSON(form.data('histogram-action'), {'field': fname, 'period': period}, render_histogram);
+}
+function render_histogram(data) {
+    var container = $('#' + data.field + '_histogram');
+    var max = 0;
+    $.each(data.buckets, function (index, bucket) {
+        max = Math.max(max, bucket.count);
+    });
+    var html = '<div class="histogram_periods">';
+    $.each(['day', 'week', 'month'], function (index, period) {
+        html += period == data.period ? ' <b>' + period + '</b>' :
+                ' <a href="javascript:show_histogram(\'' + data.field + '\', \'' + period + '\');">' + period + '</a>';
+    });
+    html += ' <a href="javascript:void(null);" class="histogram_close">close</a></div><div class="histogram_bars">';
+    $.each(data.buckets, function (index, bucket) {
+        var height = max ? Math.max(1, Math.round(bucket.count * 50 / max)) : 0;
+        html += '<a href="javascript:void(null);" class="histogram_bar" style="height: ' + height + 'px" data-after="' + bucket.after +
+                '" data-end="' + bucket.end + '" title="' + bucket.start + ' - ' + bucket.end + ': ' + bucket.count + '"></a>';
+    });
+    container.html(html + '</div>').show();
+    container.find('.histogram_close').click(function () {
+        container.hide();
+    });
+    container.find('.histogram_bar').click(function () {
+        select_range(data.field, data.field_type, $(this).data('after'), $(this).data('end'));
+    });
+}
+function select_range(fname, field_type, after, end) {
+    $('select[name=' + fname + '_criteria]').val('between').trigger('change');
+    if (field_type == 'datetime') {
+        $('input[name=' + fname + '_start_0]').val(after);
+        $('input[name=' + fname + '_start_1]').val('23:59:59');
+        $('input[name=' + fname + '_end_0]').val(end);
+        $('input[name=' + fname + '_end_1]').val('23:59:59');
+    }
+    else {
+        $('input[name=' + fname + '_start]').val(after);
+        $('input[name=' + fname + '_end]').val(end);
+    }
+}
@@ -2,6 +2,8 @@ from django import template
 from django.conf import settings
 from django.core.urlresolvers import reverse
 
+from adminfilters.sharding import shard_identifier as get_shard_identifier
+
 register = template.Library()
 
 ADMINFILTERS_URLCONF = getattr(settings, 'ADMINFILTERS_URLCONF', None)
@@ -30,6 +32,12 @@ def get_field_errors(value, arg):
     return ''
 
 
+@register.filter
+def shard_identifier(value):
+    """Identifier of row of sharded model admin, primary key together with alias of its database"""
+    return get_shard_identifier(value)
+
+
 @register.filter
 def get_container_name(value):
     return value[0:value.rfind('_')]
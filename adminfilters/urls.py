@@ -0,0 +1,6 @@
+from django.conf.urls import patterns, url
+
+urlpatterns = patterns('adminfilters.views',
+    url(r'^metrics/$', 'metrics', name='adminfilters_metrics'),
+    url(r'^profiles/([\w-]+)/(\w+)/$', 'profile', name='adminfilters_profile'),
+)
@@ -0,0 +1,32 @@
+import os
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+
+from . import profiling
+from .metrics import render as render_metrics
+
+
+@staff_member_required
+def metrics(request):
+    """Metrics of filter operations in Prometheus text format, for staff users only."""
+
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def profile(request, name, kind):
+    """File captured by profiling of changelist request, for superusers only."""
+
+    if not request.user.is_superuser:
+        raise PermissionDenied
+    if kind not in profiling.CAPTURE_FILES or not profiling.CAPTURE_NAME.match(name):
+        raise Http404
+    path = profiling.capture_path(name, kind)
+    if not os.path.exists(path):
+        raise Http404
+    with open(path, 'rb') as source:
+        response = HttpResponse(source.read(), content_type=profiling.CAPTURE_FILES[kind][1])
+    response['Content-Disposition'] = 'attachment; filename="%s"' % os.path.basename(path)
+    return response
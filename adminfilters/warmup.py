@@ -0,0 +1,100 @@
+"""
+Warming up filter state of staff users at login.
+
+Default filter sets of the user are loaded in background thread: choices of relation fields are
+stored in cache (when ``ADMINFILTERS_CACHE_CHOICES`` is enabled), compiled filter parameters are
+cached (when ``ADMINFILTERS_CACHE_FRAGMENTS`` is enabled), model schema is calculated and count
+of filtered rows, capped at ``ADMINFILTERS_WARMUP_COUNT_LIMIT``, is cached for the changelist. Counts
+are calculated from queryset of model admin, so they are cached per user, unless the model admin
+declares ``user_independent_queryset``. Number of concurrent warm-ups in process is bounded, logins above the limit are not warmed up.
+"""
+import datetime
+import logging
+import threading
+
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpRequest
+
+from . import caching, schema
+from .models import CustomFilter
+
+ADMINFILTERS_WARMUP = getattr(settings, 'ADMINFILTERS_WARMUP', False)
+ADMINFILTERS_WARMUP_CONCURRENCY = getattr(settings, 'ADMINFILTERS_WARMUP_CONCURRENCY', 2)
+ADMINFILTERS_WARMUP_COUNT_LIMIT = getattr(settings, 'ADMINFILTERS_WARMUP_COUNT_LIMIT', 10000)
+
+logger = logging.getLogger(__name__)
+
+_slots = threading.BoundedSemaphore(ADMINFILTERS_WARMUP_CONCURRENCY)
+
+
+def count_key(custom_filter, scope):
+    # date criterias like "today" depend on current date
+    return caching.make_key('count', custom_filter.definition_hash, scope,
+                            caching.data_version(custom_filter.model), datetime.date.today())
+
+
+def cached_count(custom_filter, scope):
+    """Warmed up count of filter set, or None if it's not cached or it reached the limit."""
+
+    count = cache.get(count_key(custom_filter, scope))
+    if count is None or count >= ADMINFILTERS_WARMUP_COUNT_LIMIT:
+        return None
+    return count
+
+
+def warm_filter(custom_filter, model_admin):
+    # without caching, choices and compiled parameters would be loaded again by the changelist
+    if caching.ADMINFILTERS_CACHE_CHOICES:
+        for query in custom_filter.queries.all():
+            if query.model_field and query.is_relation:
+                query.relation_choices()
+    if caching.ADMINFILTERS_CACHE_FRAGMENTS:
+        custom_filter.get_compiled_params()
+    # filter sets with bundled queries depend on request, so their rows aren't counted
+    if not custom_filter.bundled_queries.exists():
+        request = HttpRequest()
+        request.user = custom_filter.user
+        queryset = custom_filter.get_queryset(model_admin.get_queryset(request))
+        count = queryset.order_by()[:ADMINFILTERS_WARMUP_COUNT_LIMIT].count()
+        scope = model_admin.queryset_cache_scope(custom_filter.user_id)
+        cache.set(count_key(custom_filter, scope), count, caching.ADMINFILTERS_CACHE_TIMEOUT)
+
+
+def warm_user(user):
+    """Loading default filter sets of the user for every model registered with CustomFiltersAdmin."""
+
+    from django.contrib import admin
+
+    try:
+        for custom_filter in CustomFilter.objects.filter(user=user, default=True):
+            model = custom_filter.model
+            model_admin = admin.site._registry.get(model)
+            if model_admin is None or model not in schema.registered_models():
+                continue
+            schema.get_model_schema(model)
+            warm_filter(custom_filter, model_admin)
+    except Exception:
+        logger.exception('Warm-up of filters of user %s failed', user.pk)
+    finally:
+        _slots.release()
+        for connection in connections.all():
+            connection.close()
+
+
+def user_logged_in_warmup(sender, request, user, **kwargs):
+    if not ADMINFILTERS_WARMUP or not user.is_staff:
+        return
+    # the same user isn't warmed up again while cached values are alive
+    if not cache.add(caching.make_key('warmup', user.pk), True, caching.ADMINFILTERS_CACHE_TIMEOUT):
+        return
+    if not _slots.acquire(False):
+        cache.delete(caching.make_key('warmup', user.pk))
+        return
+    thread = threading.Thread(target=warm_user, args=(user,), name='adminfilters-warmup')
+    thread.daemon = True
+    thread.start()
+
+user_logged_in.connect(user_logged_in_warmup, dispatch_uid='adminfilters_warmup')
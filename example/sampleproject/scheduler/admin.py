@@ -1,12 +1,15 @@
 from django.contrib import admin
+from django.db.models import Count, Max
 from adminfilters.admin import CustomFiltersAdmin
 from models import Category, Event
 
 class CategoryAdmin(CustomFiltersAdmin):
     list_fields = ('name',)
+    filter_annotations = {'events_count': Count('event'), 'latest_event_start': Max('event__start')}
 
 class EventAdmin(CustomFiltersAdmin):
     list_filter = ('status', 'user')
+    filter_annotations = {'categories_count': Count('category')}
 
 admin.site.register(Category, CategoryAdmin)
 admin.site.register(Event, EventAdmin)
\ No newline at end of file
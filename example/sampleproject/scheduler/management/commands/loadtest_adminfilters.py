@@ -0,0 +1,185 @@
+import datetime
+import random
+import threading
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+
+from adminfilters.models import CustomFilter, CustomQuery
+from scheduler.models import Event
+
+CHANGELIST_URL = '/admin/scheduler/event/'
+SAVE_FILTER_URL = '/admin/scheduler/event/save_filter/'
+
+FIELDS = ('status', 'user', 'importance', 'active', 'start', 'created', 'name')
+ACTIONS = (('add_field', 2), ('save', 2), ('load_preset', 2), ('page', 4), ('sort', 2))
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[int(round(percent / 100.0 * (len(values) - 1)))]
+
+
+class QueriesCounter(object):
+    """Counting queries of current thread on all databases, reads can be routed to replica or shards."""
+
+    def __enter__(self):
+        self.contexts = [CaptureQueriesContext(connections[alias]) for alias in connections]
+        for context in self.contexts:
+            context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for context in self.contexts:
+            context.__exit__(exc_type, exc_value, traceback)
+
+    def __len__(self):
+        return sum(len(context) for context in self.contexts)
+
+
+class Session(object):
+    """Simulated staff session, every request is timed and its database queries are counted."""
+
+    def __init__(self, user, password, iterations, random_seed):
+        self.user = user
+        self.password = password
+        self.iterations = iterations
+        self.random = random.Random(random_seed)
+        self.client = Client()
+        self.samples = []
+        self.preset = CustomFilter.objects.filter(user=user, name='loadtest').values_list('pk', flat=True)[0]
+
+    def request(self, kind, url, data=None):
+        """Timing request, exception raised by view is counted as error of this request type."""
+
+        response = None
+        with QueriesCounter() as queries:
+            started = time.time()
+            try:
+                response = self.client.get(url, data or {})
+            except Exception:
+                pass
+            elapsed = time.time() - started
+        self.samples.append((kind, elapsed, len(queries), response is None or response.status_code >= 400))
+        return response
+
+    def run(self):
+        started = time.time()
+        try:
+            with QueriesCounter() as queries:
+                logged_in = self.client.login(username=self.user.username, password=self.password)
+                self.samples.append(('login', time.time() - started, len(queries), not logged_in))
+            self.request('toggle', CHANGELIST_URL, {'use_new_filters': 'true'})
+            actions = [action for action, weight in ACTIONS for i in range(weight)]
+            for i in range(self.iterations):
+                getattr(self, self.random.choice(actions))()
+        except Exception:
+            # session can't continue, its failure is reported as error, so it isn't lost with the thread
+            self.samples.append(('session', time.time() - started, 0, True))
+        finally:
+            for alias in connections:
+                connections[alias].close()
+
+    def add_field(self):
+        self.request('add_field', SAVE_FILTER_URL, {'add_adminfilters': self.random.choice(FIELDS)})
+
+    def save(self):
+        self.request('save', SAVE_FILTER_URL, {'save_adminfilters': '1', 'status_enabled': 'on', 'status_criteria': 'exact',
+                                               'status_value': str(self.random.randint(0, 2))})
+
+    def load_preset(self):
+        self.request('load_preset', SAVE_FILTER_URL, {'load_adminfilters': self.preset})
+        self.request('changelist', CHANGELIST_URL)
+
+    def page(self):
+        self.request('page', CHANGELIST_URL, {'p': self.random.randint(0, 4)})
+
+    def sort(self):
+        self.request('sort', CHANGELIST_URL, {'o': '%s%s' % (self.random.choice(['', '-']), self.random.randint(1, 2))})
+
+
+class Command(BaseCommand):
+    help = 'Runs simulated staff sessions against adminfilters and reports latency, throughput and queries per request type.'
+    option_list = BaseCommand.option_list + (
+        make_option('--users', dest='users', type='int', default=10,
+                    help='Number of concurrent sessions, every session uses its own staff user.'),
+        make_option('--iterations', dest='iterations', type='int', default=20,
+                    help='Number of actions made by every session.'),
+        make_option('--events', dest='events', type='int', default=1000,
+                    help='Minimal number of events in dataset, missing events are created.'),
+        make_option('--seed', dest='seed', type='int', default=0,
+                    help='Seed of random choices of sessions.'),
+        make_option('--force', action='store_true', dest='force', default=False,
+                    help='Run with DEBUG turned off, superusers and events are created in configured database.'),
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Load test creates superusers and events in configured database, '
+                               'it runs only with DEBUG turned on or with --force.')
+        password = User.objects.make_random_password(20)
+        users = self.prepare_users(options['users'], password)
+        self.prepare_events(options['events'], users)
+        connection.close()
+
+        sessions = [Session(user, password, options['iterations'], options['seed'] + i) for i, user in enumerate(users)]
+        threads = [threading.Thread(target=session.run) for session in sessions]
+        started = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - started
+        for alias in connections:
+            connections[alias].close()
+
+        samples = [sample for session in sessions for sample in session.samples]
+        self.report(samples, elapsed)
+
+    def prepare_users(self, count, password):
+        """Staff users get new random password on every run, so they can't be used after load test."""
+
+        users = []
+        for i in range(count):
+            user, created = User.objects.get_or_create(username='loadtest%s' % i,
+                                                       defaults={'is_staff': True, 'is_superuser': True})
+            user.set_password(password)
+            user.save()
+            preset, created = CustomFilter.objects.get_or_create(user=user, name='loadtest', app_name='scheduler',
+                                                                 model_name='Event', default=False)
+            if created:
+                CustomQuery.objects.create(custom_filter=preset, field='status', criteria='exact', value='1')
+                CustomQuery.objects.create(custom_filter=preset, field='importance', criteria='gte', value='2')
+            users.append(user)
+        return users
+
+    def prepare_events(self, count, users):
+        missing = count - Event.objects.count()
+        if missing <= 0:
+            return
+        today = datetime.date.today()
+        Event.objects.bulk_create([Event(name='Load test event %s' % i, description='Load test event ' * 20,
+                                         status=i % 3, importance=i % 7, user=users[i % len(users)],
+                                         start=today - datetime.timedelta(days=i % 365),
+                                         created=datetime.datetime.now() - datetime.timedelta(hours=i))
+                                   for i in range(missing)], batch_size=500)
+        self.stdout.write('Created %s events' % missing)
+
+    def report(self, samples, elapsed):
+        self.stdout.write('%-12s %8s %8s %8s %8s %8s %8s' % ('request', 'count', 'errors', 'p50 ms', 'p95 ms',
+                                                            'p99 ms', 'queries'))
+        kinds = sorted(set(sample[0] for sample in samples))
+        for kind in kinds:
+            times = [t * 1000 for k, t, q, e in samples if k == kind]
+            queries = [q for k, t, q, e in samples if k == kind]
+            errors = len([e for k, t, q, e in samples if k == kind and e])
+            self.stdout.write('%-12s %8d %8d %8.1f %8.1f %8.1f %8.1f' % (
+                kind, len(times), errors, percentile(times, 50), percentile(times, 95), percentile(times, 99),
+                sum(queries) / float(len(queries))))
+        self.stdout.write('%s requests in %.1f s, %.1f requests/s' % (len(samples), elapsed, len(samples) / elapsed))
@@ -0,0 +1,91 @@
+import datetime
+from contextlib import contextmanager
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+
+from adminfilters.models import CustomFilter
+from scheduler.models import Category, Event
+
+CHANGELIST_URL = '/admin/scheduler/event/'
+SAVE_FILTER_URL = CHANGELIST_URL + 'save_filter/'
+
+admin.autodiscover()
+
+
+@contextmanager
+def patched(target, **values):
+    """Replacing attributes of module or model admin for the block, settings of adminfilters are read on import."""
+
+    missing = object()
+    old = dict((name, target.__dict__.get(name, missing)) for name in values)
+    for name, value in values.items():
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for name, value in old.items():
+            if value is missing:
+                delattr(target, name)
+            else:
+                setattr(target, name, value)
+
+
+class AdminFiltersMixin(object):
+    """Staff user with new filters enabled and events of the sample application."""
+
+    multi_db = True
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.other_user = User.objects.create_user('bob', 'bob@example.com', 'password')
+        self.categories = [Category.objects.create(name='category %d' % i) for i in range(3)]
+        for i in range(30):
+            event = Event.objects.create(name=u'event %d' % i, description=u'meeting word%d' % (i % 5), status=i % 3,
+                                         user=self.user if i % 2 else self.other_user, importance=i % 7,
+                                         start=datetime.date(2014, 1 + i % 12, 1 + i % 27),
+                                         created=datetime.datetime(2014, 1 + i % 12, 3))
+            event.category.add(*self.categories[:i % 4])
+        self.model_admin = admin.site._registry[Event]
+        self.client.login(username='admin', password='password')
+        self.client.get(CHANGELIST_URL, {'use_new_filters': 'true'})
+        # default filter set is created by the first changelist with new filters
+        self.client.get(CHANGELIST_URL)
+
+    def tearDown(self):
+        # changelist view keeps ordering of the last filter set on model admin
+        self.model_admin.ordering = None
+
+    @property
+    def default_filter(self):
+        return CustomFilter.objects.get(user=self.user, app_name='scheduler', model_name='Event', default=True)
+
+    def save_filter(self, criterias=None, **params):
+        """Saving default filter set with given criterias, they are given as {field: (criteria, value)}."""
+
+        params['save_adminfilters'] = '1'
+        for field, (criteria, value) in (criterias or {}).items():
+            params.update({'%s_enabled' % field: 'on', '%s_criteria' % field: criteria, '%s_value' % field: value})
+        response = self.client.get(SAVE_FILTER_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def changelist(self, **params):
+        response = self.client.get(CHANGELIST_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def result_pks(self, response):
+        return sorted(obj.pk for obj in response.context['cl'].result_list)
+
+    def event_pks(self, **lookups):
+        return sorted(Event.objects.filter(**lookups).values_list('pk', flat=True))
+
+
+class AdminFiltersTestCase(AdminFiltersMixin, TestCase):
+    pass
+
+
+class AdminFiltersTransactionTestCase(AdminFiltersMixin, TransactionTestCase):
+    """Test case for queries run by worker threads, they don't see data of uncommitted transaction."""
@@ -0,0 +1,17 @@
+from django.db.models import Sum
+
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, patched
+
+
+class AggregatesTest(AdminFiltersTestCase):
+
+    def test_aggregates_of_filtered_rows(self):
+        self.save_filter({'status': ('exact', '1')})
+        with patched(self.model_admin, list_aggregates=(('importance', 'sum'), ('start', 'max'))):
+            response = self.changelist()
+        cl = response.context['cl']
+        self.assertEqual(cl.result_count, Event.objects.filter(status=1).count())
+        self.assertEqual(cl.aggregates[0]['value'], Event.objects.filter(status=1).aggregate(s=Sum('importance'))['s'])
+        self.assertContains(response, 'id="aggregates"')
@@ -0,0 +1,29 @@
+from django.db.models import Count
+
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, patched
+
+
+class AnnotationTest(AdminFiltersTestCase):
+
+    def annotated_pks(self, **lookups):
+        return sorted(Event.objects.annotate(categories_count=Count('category')).filter(**lookups).values_list('pk', flat=True))
+
+    def test_criteria_of_annotation(self):
+        self.save_filter({'categories_count': ('gte', '2')})
+        response = self.changelist()
+        self.assertEqual(self.result_pks(response), self.annotated_pks(categories_count__gte=2))
+        self.assertEqual(response.context['cl'].result_count, len(self.annotated_pks(categories_count__gte=2)))
+
+    def test_ordering_by_annotation_without_criteria(self):
+        self.save_filter({'status': ('exact', '1')}, ordering='-categories_count')
+        response = self.changelist()
+        counts = [obj.categories_count for obj in response.context['cl'].result_list]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+    def test_count_with_aggregates(self):
+        self.save_filter({'categories_count': ('gte', '1')})
+        with patched(self.model_admin, list_aggregates=(('importance', 'sum'),)):
+            response = self.changelist()
+        self.assertEqual(response.context['cl'].result_count, len(self.annotated_pks(categories_count__gte=1)))
@@ -0,0 +1,31 @@
+from django.db import DEFAULT_DB_ALIAS, connection
+
+from adminfilters import budget
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, patched
+
+
+class TimeBudgetTest(AdminFiltersTestCase):
+
+    def test_query_above_budget_is_cancelled(self):
+        slow = ('WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers WHERE n < 100000000) '
+                'SELECT COUNT(*) FROM numbers')
+        with self.assertRaises(budget.BudgetExceeded):
+            with budget.time_budget(DEFAULT_DB_ALIAS, 0.05):
+                connection.cursor().execute(slow)
+        # connection is usable after cancelled query
+        self.assertEqual(Event.objects.count(), 30)
+
+    def test_changelist_degrades(self):
+        self.save_filter({'status': ('exact', '1')})
+        with patched(self.model_admin, query_time_budget=5):
+            response = self.changelist()
+        self.assertEqual(self.result_pks(response), self.event_pks(status=1))
+        self.assertNotContains(response, 'took longer than')
+
+        with patched(budget, SQLITE_PROGRESS_STEPS=1):
+            with patched(self.model_admin, query_time_budget=0.000001):
+                response = self.changelist()
+        self.assertEqual(self.result_pks(response), [])
+        self.assertContains(response, 'took longer than')
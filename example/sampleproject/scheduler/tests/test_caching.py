@@ -0,0 +1,83 @@
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+
+from adminfilters import admin, caching, metrics, paths
+from adminfilters.models import CustomQuery
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, SAVE_FILTER_URL, patched
+
+
+class FragmentCacheTest(AdminFiltersTestCase):
+
+    def tearDown(self):
+        super(FragmentCacheTest, self).tearDown()
+        cache.clear()
+
+    def versions_counter(self):
+        calls = []
+        data_version = caching.data_version
+
+        def counted(model):
+            calls.append(model)
+            return data_version(model)
+        return calls, counted
+
+    def test_key_isnt_built_when_caching_is_disabled(self):
+        calls, counted = self.versions_counter()
+        with patched(caching, ADMINFILTERS_CACHE_FRAGMENTS=False, data_version=counted):
+            self.changelist()
+            self.client.get(SAVE_FILTER_URL, {'add_adminfilters': 'user'})
+        self.assertEqual(calls, [])
+
+    def test_fragment_is_cached(self):
+        calls, counted = self.versions_counter()
+        with patched(caching, ADMINFILTERS_CACHE_FRAGMENTS=True, data_version=counted):
+            first = self.client.get(SAVE_FILTER_URL, {'add_adminfilters': 'user'})
+            with patched(admin, render_to_string=None):
+                second = self.client.get(SAVE_FILTER_URL, {'add_adminfilters': 'user'})
+        self.assertTrue(calls)
+        self.assertEqual(first.content, second.content)
+
+    def test_cache_requests_are_counted_per_model(self):
+        with patched(caching, ADMINFILTERS_CACHE_FRAGMENTS=True):
+            with patched(metrics, ADMINFILTERS_METRICS=True, _counters={}):
+                self.client.get(SAVE_FILTER_URL, {'add_adminfilters': 'user'})
+                self.client.get(SAVE_FILTER_URL, {'add_adminfilters': 'user'})
+                counters = dict(metrics._counters)
+        for result in ('miss', 'hit'):
+            labels = metrics.labels_key({'cache': 'fragment', 'model': 'scheduler.Event', 'result': result})
+            self.assertEqual(counters[('adminfilters_cache_requests_total', labels)], 1)
+
+
+class ChoicesCacheTest(AdminFiltersTestCase):
+
+    def setUp(self):
+        super(ChoicesCacheTest, self).setUp()
+        self.group = Group.objects.create(name=u'editors')
+        self.user.groups.add(self.group)
+
+    def tearDown(self):
+        super(ChoicesCacheTest, self).tearDown()
+        cache.clear()
+
+    def group_choices(self, depth):
+        with patched(caching, ADMINFILTERS_CACHE_CHOICES=True, _tracked_models=set()):
+            with patched(paths, ADMINFILTERS_RELATION_DEPTH=depth):
+                caching.track_model(Event)
+                query = CustomQuery(custom_filter=self.default_filter, field='user__groups')
+                first = query.relation_choices()
+                Group.objects.filter(pk=self.group.pk).update(name=u'writers')
+                # update doesn't send signals, so cached choices are kept unless they aren't cached at all
+                second = query.relation_choices()
+                self.group.name = u'authors'
+                self.group.save()
+                return first, second, query.relation_choices()
+
+    def test_choices_of_path_are_invalidated_by_change_of_far_model(self):
+        self.assertEqual(self.group_choices(depth=1),
+                         ([(self.group.pk, u'editors')], [(self.group.pk, u'editors')], [(self.group.pk, u'authors')]))
+
+    def test_choices_of_path_through_untracked_model_arent_cached(self):
+        self.assertEqual(self.group_choices(depth=0),
+                         ([(self.group.pk, u'editors')], [(self.group.pk, u'writers')], [(self.group.pk, u'authors')]))
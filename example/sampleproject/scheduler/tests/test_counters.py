@@ -0,0 +1,32 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from adminfilters import counters
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, patched
+
+
+class MaintainedCountsTest(AdminFiltersTestCase):
+
+    def setUp(self):
+        super(MaintainedCountsTest, self).setUp()
+        counters.track_model(Event)
+
+    def tearDown(self):
+        super(MaintainedCountsTest, self).tearDown()
+        counters._tracked_models.discard(counters.model_label(Event))
+
+    def test_count_follows_saved_rows(self):
+        self.save_filter({'status': ('exact', '1')})
+        with patched(self.model_admin, maintained_counts=True):
+            self.assertEqual(self.changelist().context['cl'].result_count, Event.objects.filter(status=1).count())
+            event = Event.objects.filter(status=0)[0]
+            event.status = 1
+            event.save()
+            Event.objects.filter(status=1)[0].delete()
+            with CaptureQueriesContext(connection) as queries:
+                cl = self.changelist().context['cl']
+        self.assertEqual(cl.result_count, Event.objects.filter(status=1).count())
+        self.assertEqual(cl.full_result_count, Event.objects.count())
+        self.assertFalse([q for q in queries.captured_queries if 'COUNT' in q['sql'] and 'scheduler_event' in q['sql']])
@@ -0,0 +1,55 @@
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from adminfilters import execution
+from scheduler.models import Event
+
+from .base import AdminFiltersTransactionTestCase, SAVE_FILTER_URL, patched
+
+
+class ConcurrentQueriesTest(AdminFiltersTransactionTestCase):
+
+    def test_results_and_choices(self):
+        self.save_filter({'status': ('exact', '1'), 'user': ('exact', str(self.user.pk))})
+        with patched(self.model_admin, concurrent_queries=True):
+            response = self.changelist()
+            fragment = self.client.get(SAVE_FILTER_URL, {'add_adminfilters': 'user'})
+        self.assertEqual(self.result_pks(response), self.event_pks(status=1, user=self.user))
+        self.assertEqual(response.context['cl'].full_result_count, Event.objects.count())
+        self.assertContains(fragment, 'bob')
+
+
+class RunParallelTest(SimpleTestCase):
+
+    def test_workers_are_shared_by_concurrent_calls(self):
+        lock = threading.Lock()
+        active, peak, workers, results = [0], [0], set(), []
+
+        def task():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                workers.add(threading.current_thread().name)
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            return 1
+
+        callers = [threading.Thread(target=lambda: results.append(execution.run_parallel([task] * 6))) for i in range(3)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        self.assertEqual(results, [[1] * 6] * 3)
+        self.assertTrue(peak[0] <= execution.ADMINFILTERS_MAX_WORKERS)
+        self.assertTrue(len(workers) <= execution.ADMINFILTERS_MAX_WORKERS)
+
+    def test_nested_call_is_run_by_worker(self):
+        results = execution.run_parallel([lambda: execution.run_parallel([lambda: 1, lambda: 2]), lambda: 3])
+        self.assertEqual(results, [[1, 2], 3])
+
+    def test_error_is_raised_in_caller(self):
+        with self.assertRaises(ZeroDivisionError):
+            execution.run_parallel([lambda: 1, lambda: 1 / 0])
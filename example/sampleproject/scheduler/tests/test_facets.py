@@ -0,0 +1,67 @@
+import datetime
+
+import simplejson
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test.client import Client
+
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, CHANGELIST_URL, patched
+
+HISTOGRAM_URL = CHANGELIST_URL + 'histogram/'
+
+
+class DateHistogramTest(AdminFiltersTestCase):
+
+    def tearDown(self):
+        super(DateHistogramTest, self).tearDown()
+        cache.clear()
+
+    def histogram(self, client=None, **params):
+        response = (client or self.client).get(HISTOGRAM_URL, dict({'field': 'start', 'period': 'month'}, **params))
+        self.assertEqual(response.status_code, 200)
+        return [(bucket['start'], bucket['count']) for bucket in simplejson.loads(response.content)['buckets']]
+
+    def histogram_total(self, client=None, **params):
+        return sum(count for start, count in self.histogram(client, **params))
+
+    def second_client(self):
+        # logins update users, which changes data version, so both users are logged in before histograms
+        User.objects.create_superuser('carol', 'carol@example.com', 'password')
+        client = Client()
+        client.login(username='carol', password='password')
+        client.get(CHANGELIST_URL, {'use_new_filters': 'true'})
+        client.get(CHANGELIST_URL)
+        return client
+
+    def own_events(self, request):
+        return Event.objects.filter(user=request.user)
+
+    def test_histogram_counts_filtered_rows(self):
+        self.assertEqual(self.histogram_total(), Event.objects.count())
+
+    def test_histogram_is_cached_per_user(self):
+        with patched(self.model_admin, get_queryset=self.own_events):
+            client = self.second_client()
+            self.assertEqual(self.histogram_total(), Event.objects.filter(user=self.user).count())
+            self.assertEqual(self.histogram_total(client), 0)
+
+    def test_histogram_is_shared_by_users_of_user_independent_queryset(self):
+        with patched(self.model_admin, get_queryset=self.own_events, user_independent_queryset=True):
+            client = self.second_client()
+            self.assertEqual(self.histogram_total(), Event.objects.filter(user=self.user).count())
+            self.assertEqual(self.histogram_total(client), Event.objects.filter(user=self.user).count())
+
+    def test_histogram_of_related_date_field(self):
+        User.objects.filter(pk=self.user.pk).update(date_joined=datetime.datetime(2013, 5, 10))
+        User.objects.filter(pk=self.other_user.pk).update(date_joined=datetime.datetime(2014, 2, 20))
+        self.assertEqual(self.histogram(field='user__date_joined'), [('2013-05-01', Event.objects.filter(user=self.user).count()),
+                                   ('2014-02-01', Event.objects.filter(user=self.other_user).count())])
+
+    def test_histogram_of_related_date_field_by_week(self):
+        User.objects.filter(pk=self.user.pk).update(date_joined=datetime.datetime(2014, 2, 18))
+        User.objects.filter(pk=self.other_user.pk).update(date_joined=datetime.datetime(2014, 2, 20))
+        self.assertEqual(self.histogram(field='user__date_joined', period='week'),
+                         [('2014-02-17', Event.objects.count())])
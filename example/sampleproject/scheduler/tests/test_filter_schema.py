@@ -0,0 +1,23 @@
+import json
+
+from .base import AdminFiltersTestCase, CHANGELIST_URL
+
+
+class FilterSchemaEndpointTest(AdminFiltersTestCase):
+
+    def test_rows_and_etag(self):
+        self.save_filter({'status': ('exact', '1')})
+        response = self.client.get(CHANGELIST_URL + 'filter_schema/')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual([row['field'] for row in data['rows']], ['status'])
+        self.assertEqual(data['rows'][0]['widget'], 'select')
+
+        response = self.client.get(CHANGELIST_URL + 'filter_schema/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_row_of_new_field(self):
+        response = self.client.get(CHANGELIST_URL + 'filter_schema/', {'field': 'user'})
+        rows = json.loads(response.content)['rows']
+        self.assertEqual(rows[0]['field'], 'user')
+        self.assertIn([str(self.user.pk), 'admin'], rows[0]['choices'])
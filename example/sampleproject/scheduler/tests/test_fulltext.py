@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.db import connection
+
+from adminfilters import fulltext
+from scheduler.models import Category, Event
+
+from .base import AdminFiltersTestCase, patched
+
+
+class FullTextTest(AdminFiltersTestCase):
+
+    def setUp(self):
+        super(FullTextTest, self).setUp()
+        self.indexes = []
+
+    def tearDown(self):
+        super(FullTextTest, self).tearDown()
+        for model, field_name in self.indexes:
+            fulltext.drop_index(connection, model, model._meta.get_field(field_name))
+
+    def create_index(self, model, field_name):
+        self.assertTrue(fulltext.create_index(connection, model, model._meta.get_field(field_name)))
+        self.indexes.append((model, field_name))
+
+    def search(self, field, text):
+        self.save_filter({field: ('search', text)})
+        return self.result_pks(self.changelist())
+
+    def test_local_field(self):
+        expected = self.event_pks(description__icontains='word3')
+        self.assertEqual(self.search('description', 'word3'), expected)
+        self.create_index(Event, 'description')
+        self.assertEqual(self.search('description', 'word3 meeting'), expected)
+
+    def test_field_of_single_valued_relation(self):
+        expected = self.event_pks(user=self.other_user)
+        self.assertEqual(self.search('user__username', 'bob'), expected)
+        self.create_index(User, 'username')
+        self.assertEqual(self.search('user__username', 'bob'), expected)
+
+    def test_field_of_multi_valued_relation(self):
+        expected = self.event_pks(pk__in=Event.objects.filter(category=self.categories[1]))
+        self.assertEqual(self.search('category__name', 'category 1'), expected)
+        self.create_index(Category, 'name')
+        self.assertEqual(self.search('category__name', 'category 1'), expected)
+
+    def test_missing_index_is_checked_again(self):
+        field = Event._meta.get_field('description')
+        self.assertFalse(fulltext.has_index(connection, Event, field))
+        self.create_index(Event, 'description')
+        with patched(fulltext, _indexes={}):
+            self.assertFalse(fulltext.has_index(connection, Event, Event._meta.get_field('name')))
+            with patched(fulltext, INDEX_RECHECK_INTERVAL=0):
+                self.assertTrue(fulltext.has_index(connection, Event, field))
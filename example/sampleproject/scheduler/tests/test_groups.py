@@ -0,0 +1,47 @@
+from django.db.models import Q
+
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase
+
+
+class GroupTest(AdminFiltersTestCase):
+
+    def test_or_group(self):
+        self.save_filter({'status': ('exact', '0'), 'importance': ('exact', '1')},
+                         status_group='a', importance_group='a')
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks(pk__in=Event.objects.filter(Q(status=0) | Q(importance=1))))
+
+    def test_negated_group(self):
+        self.save_filter({'status': ('exact', '0'), 'importance': ('exact', '1')},
+                         status_group='a', importance_group='a', importance_group_negated='on')
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks(pk__in=Event.objects.exclude(Q(status=0) | Q(importance=1))))
+
+    def test_negated_group_with_ungrouped_criterias(self):
+        self.save_filter({'status': ('exact', '0'), 'importance': ('exact', '1'), 'user': ('exact', str(self.user.pk))},
+                         status_group='a', importance_group='a', importance_group_negated='on')
+        expected = Event.objects.filter(user=self.user).exclude(Q(status=0) | Q(importance=1))
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks(pk__in=expected))
+
+    def test_groups_are_joined_with_and(self):
+        self.save_filter({'status': ('exact', '0'), 'importance': ('exact', '1'),
+                          'user': ('exact', str(self.user.pk)), 'name': ('icontains', 'event 2')},
+                         status_group='a', importance_group='a', user_group='b', name_group='b')
+        expected = Event.objects.filter(Q(status=0) | Q(importance=1))
+        expected = expected.filter(Q(user=self.user) | Q(name__icontains='event 2'))
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks(pk__in=expected))
+
+    def test_group_with_multi_valued_relation_doesnt_duplicate_rows(self):
+        self.save_filter({'status': ('exact', '0'), 'category__name': ('icontains', 'category')},
+                         status_group='a', category__name_group='a')
+        response = self.changelist()
+        expected = self.event_pks(pk__in=Event.objects.filter(Q(status=0) | Q(category__name__icontains='category')))
+        self.assertEqual(self.result_pks(response), expected)
+        self.assertEqual(response.context['cl'].result_count, len(expected))
+
+    def test_negated_group_with_value_list_of_multi_valued_relation(self):
+        self.save_filter({'status': ('exact', '0'), 'category__name': ('in_list', '')},
+                         category__name_list='category 1', status_group='a', category__name_group='a',
+                         status_group_negated='on')
+        expected = Event.objects.exclude(Q(status=0) | Q(category__name='category 1'))
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks(pk__in=expected))
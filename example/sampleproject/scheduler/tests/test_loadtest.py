@@ -0,0 +1,43 @@
+from StringIO import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TransactionTestCase
+
+from .base import patched
+
+
+class LoadTestCommandTest(TransactionTestCase):
+
+    def test_refused_without_debug(self):
+        with self.assertRaises(CommandError):
+            call_command('loadtest_adminfilters', users=1, iterations=1, events=10, stdout=StringIO())
+        self.assertFalse(User.objects.exists())
+
+    def report(self, **session_methods):
+        from scheduler.management.commands import loadtest_adminfilters
+
+        output = StringIO()
+        actions = tuple((name, 1) for name in session_methods)
+        with patched(loadtest_adminfilters, ACTIONS=actions):
+            with patched(loadtest_adminfilters.Session, **session_methods):
+                call_command('loadtest_adminfilters', users=2, iterations=3, events=10, force=True, stdout=output)
+        # columns of request type: count, errors, percentiles and queries
+        return dict((line.split()[0], line.split()[1:]) for line in output.getvalue().splitlines())
+
+    def test_users_get_random_password(self):
+        lines = self.report(page=lambda session: session.request('page', '/admin/scheduler/event/'))
+        self.assertFalse(User.objects.get(username='loadtest0').check_password('loadtest'))
+        self.assertEqual(lines['login'][:2], ['2', '0'])
+        self.assertEqual(lines['page'][:2], ['6', '0'])
+        self.assertTrue(float(lines['page'][-1]) > 0)
+
+    def test_failures_are_counted_as_errors(self):
+        lines = self.report(page=lambda session: session.request('page', None))
+        self.assertEqual(lines['page'][:2], ['6', '6'])
+
+        def fail(session):
+            raise ValueError
+        lines = self.report(sort=fail)
+        self.assertEqual(lines['session'][:2], ['2', '2'])
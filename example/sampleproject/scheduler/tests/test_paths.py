@@ -0,0 +1,55 @@
+from django.contrib.auth.models import Group
+from django.test import SimpleTestCase
+
+from adminfilters import paths
+from adminfilters.models import CustomQuery
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, patched
+
+
+class RelationPathTest(AdminFiltersTestCase):
+
+    def test_single_valued_relation(self):
+        self.save_filter({'user__username': ('icontains', 'adm')})
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks(user=self.user))
+
+    def test_multi_valued_relation_doesnt_duplicate_rows(self):
+        self.save_filter({'category__name': ('icontains', 'category')})
+        response = self.changelist()
+        expected = self.event_pks(pk__in=Event.objects.filter(category__isnull=False))
+        self.assertEqual(self.result_pks(response), expected)
+        self.assertEqual(response.context['cl'].result_count, len(expected))
+
+    def test_deep_path_through_multi_valued_relation(self):
+        group = Group.objects.create(name=u'editors')
+        self.user.groups.add(group)
+        self.save_filter({'user__groups__name': ('exact', 'editors')})
+        response = self.changelist()
+        self.assertEqual(self.result_pks(response), self.event_pks(user=self.user))
+        self.assertEqual(response.context['cl'].result_count, len(self.event_pks(user=self.user)))
+
+    def test_reverse_foreign_key_path(self):
+        # events of user, who has "event 3"
+        self.save_filter({'user__event__name': ('exact', 'event 3')})
+        users = Event.objects.filter(name='event 3').values('user')
+        response = self.changelist()
+        self.assertEqual(self.result_pks(response), self.event_pks(user__in=users))
+        self.assertEqual(response.context['cl'].result_count, len(self.event_pks(user__in=users)))
+
+    def test_unresolvable_path_is_skipped_with_error(self):
+        CustomQuery.objects.create(custom_filter=self.default_filter, field='user__missing', criteria='exact',
+                                   value='x')
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks())
+        self.assertIn('"user__missing"', unicode(self.default_filter.errors))
+        self.assertEqual(CustomQuery(custom_filter=self.default_filter, field='user__missing').field_type, None)
+
+
+class ResolvedPathsTest(SimpleTestCase):
+
+    def test_only_existing_paths_within_depth_are_cached(self):
+        with patched(paths, _paths={}, ADMINFILTERS_RELATION_DEPTH=1):
+            self.assertEqual(paths.resolve(Event, 'user__missing'), None)
+            self.assertEqual(paths.resolve(Event, 'user__groups__name').field.name, 'name')
+            self.assertEqual(paths.resolve(Event, 'user__username').field.name, 'username')
+            self.assertEqual(paths._paths.keys(), [(Event, 'user__username')])
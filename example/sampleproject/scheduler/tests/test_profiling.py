@@ -0,0 +1,46 @@
+import os
+import pstats
+import shutil
+import tempfile
+
+import simplejson
+
+from adminfilters import profiling
+
+from .base import AdminFiltersTestCase, patched
+
+
+class ProfilingTest(AdminFiltersTestCase):
+
+    def setUp(self):
+        super(ProfilingTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(ProfilingTest, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    def profile(self):
+        with patched(profiling, ADMINFILTERS_PROFILE_DIRECTORY=self.directory):
+            with patched(self.model_admin, list_per_page=10):
+                response = self.changelist(profile_adminfilters='1')
+        captured = [path for path in os.listdir(self.directory) if path.endswith('.pstats')]
+        self.assertEqual(len(captured), 1)
+        return response, captured[0][:-len('.pstats')]
+
+    def test_rendering_is_profiled(self):
+        response, name = self.profile()
+        with open(os.path.join(self.directory, name + '.sql.json')) as source:
+            queries = simplejson.load(source)['queries']
+        # paginated results are loaded while template is rendered
+        self.assertTrue([query for query in queries if 'LIMIT' in query['sql']])
+        functions = set(function for filename, line, function in pstats.Stats(os.path.join(self.directory, name + '.pstats')).stats)
+        self.assertIn('render', functions)
+        self.assertIn('render_filters', functions)
+
+    def test_filters_are_rendered_once(self):
+        response, name = self.profile()
+        self.assertEqual(response.content.count('var custom_filter_id'), 1)
+        # message with links is shown on the profiled page
+        self.assertIn('Request was profiled', response.content)
+        self.assertIn(name, response.content)
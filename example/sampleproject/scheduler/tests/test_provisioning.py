@@ -0,0 +1,21 @@
+from adminfilters import admin as filters_admin
+from adminfilters.models import CustomFilter
+
+from .base import AdminFiltersTestCase, CHANGELIST_URL, patched
+
+
+class DefaultFilterSetTest(AdminFiltersTestCase):
+
+    def test_definition_hash_of_created_default_filter_set(self):
+        self.other_user.is_staff = self.other_user.is_superuser = True
+        self.other_user.save()
+        self.client.login(username='bob', password='password')
+        # new filters are switched on directly, since default filter set would be created by the switch
+        session = self.client.session
+        session['use_new_filters'] = True
+        session.save()
+        with patched(filters_admin, ADMINFILTERS_CREATE_FILTERS=True):
+            self.client.get(CHANGELIST_URL)
+        custom_filter = CustomFilter.objects.get(user=self.other_user, model_name='Event', default=True)
+        self.assertTrue(set(['status', 'user']) <= set(custom_filter.queries.values_list('field', flat=True)))
+        self.assertEqual(custom_filter.definition_hash, custom_filter.definition)
@@ -0,0 +1,28 @@
+from .base import AdminFiltersTestCase, patched
+
+
+class QueryPlanTest(AdminFiltersTestCase):
+
+    def test_shown_foreign_keys_are_joined_and_wide_columns_deferred(self):
+        with patched(self.model_admin, list_display=('name', 'user')):
+            query = self.changelist().context['cl'].queryset.query
+        self.assertEqual(query.select_related, {'user': {}})
+        self.assertEqual(query.deferred_loading, (set(['description']), True))
+
+    def test_foreign_keys_arent_joined_when_they_arent_shown(self):
+        with patched(self.model_admin, list_display=('name', 'description')):
+            query = self.changelist().context['cl'].queryset.query
+        self.assertFalse(query.select_related)
+        self.assertEqual(query.deferred_loading, (set(), True))
+
+    def test_model_admin_overrides_plan(self):
+        with patched(self.model_admin, list_display=('name',), list_select_related_fields=('user',),
+                     list_defer_fields=('name',)):
+            query = self.changelist().context['cl'].queryset.query
+        self.assertEqual(query.select_related, {'user': {}})
+        self.assertEqual(query.deferred_loading, (set(['name']), True))
+
+    def test_columns_arent_deferred_for_calculated_column(self):
+        with patched(self.model_admin, list_display=('name', '__unicode__')):
+            query = self.changelist().context['cl'].queryset.query
+        self.assertEqual(query.deferred_loading, (set(), True))
@@ -0,0 +1,63 @@
+from django.db import router
+
+from adminfilters import routing
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, CHANGELIST_URL, patched
+
+
+class ReadReplicaTest(AdminFiltersTestCase):
+    """Replica of test settings is separate database, so rows tell which database was used."""
+
+    def setUp(self):
+        super(ReadReplicaTest, self).setUp()
+        self.replica_pks = sorted(Event.objects.using('replica').create(name=u'replica event %d' % i).pk
+                                  for i in range(2))
+
+    def run(self, *args, **kwargs):
+        with patched(routing, ADMINFILTERS_READ_DATABASE='replica'):
+            with patched(router, routers=[routing.ReadReplicaRouter()]):
+                return super(ReadReplicaTest, self).run(*args, **kwargs)
+
+    def test_changelist_is_read_from_replica(self):
+        self.save_filter({'user': ('exact', '')})
+        response = self.changelist()
+        self.assertEqual(self.result_pks(response), self.replica_pks)
+        self.assertEqual(response.context['cl'].full_result_count, 2)
+        self.assertContains(response, 'id="id_user_value"')
+
+    def test_action_deletes_rows_of_primary(self):
+        response = self.client.post(CHANGELIST_URL, {'action': 'delete_selected', 'index': 0, 'post': 'yes',
+                                                     '_selected_action': self.replica_pks})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Event.objects.count(), 28)
+        self.assertEqual(Event.objects.using('replica').count(), 2)
+
+    def test_change_form_saves_on_primary(self):
+        pk = self.replica_pks[0]
+        response = self.client.post(CHANGELIST_URL + '%s/' % pk, {'name': u'renamed', 'status': 0})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Event.objects.get(pk=pk).name, u'renamed')
+        self.assertEqual(Event.objects.using('replica').get(pk=pk).name, u'replica event 0')
+
+    def test_objects_of_replica_are_saved_on_primary(self):
+        event = Event.objects.using('replica').get(pk=self.replica_pks[0])
+        event.name = u'renamed'
+        event.save()
+        self.assertEqual(Event.objects.get(pk=event.pk).name, u'renamed')
+        self.assertEqual(Event.objects.using('replica').get(pk=event.pk).name, u'replica event 0')
+
+    def test_objects_of_other_databases_are_saved_where_they_were_loaded(self):
+        event = Event.objects.using('shard').create(name=u'shard event')
+        event = Event.objects.using('shard').get(pk=event.pk)
+        event.name = u'renamed'
+        event.save()
+        self.assertEqual(Event.objects.using('shard').get(pk=event.pk).name, u'renamed')
+        self.assertNotEqual(Event.objects.get(pk=event.pk).name, u'renamed')
+
+    def test_login_of_user_missing_on_replica(self):
+        self.client.logout()
+        response = self.client.post('/admin/', {'username': 'admin', 'password': 'password',
+                                                'this_is_the_login_form': 1, 'next': '/admin/'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.session['_auth_user_id'], self.user.pk)
@@ -0,0 +1,76 @@
+import json
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from django.core.management import call_command
+from django.utils import translation
+
+from adminfilters import schema
+from adminfilters.models import CustomQuery
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, patched
+
+
+class PrecomputedSchemaTest(AdminFiltersTestCase):
+
+    def setUp(self):
+        super(PrecomputedSchemaTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'schema.json')
+
+    def tearDown(self):
+        super(PrecomputedSchemaTest, self).tearDown()
+        shutil.rmtree(self.directory)
+        schema._model_schemas.clear()
+
+    def test_schema_is_used_for_criterias(self):
+        with patched(schema, _schema=None):
+            call_command('build_adminfilters_schema', output=self.path, stdout=StringIO())
+            self.assertEqual(schema.get_model_schema(Event)['fields']['status']['criterias'], 'choice')
+            query = CustomQuery(custom_filter=self.default_filter, field='importance')
+            self.assertEqual(query.field_type, 'integer')
+            self.assertEqual([c[0] for c in query.criterias][:2], ['exact', '_not'])
+
+    def test_stale_entry_is_ignored(self):
+        with patched(schema, _schema=None):
+            call_command('build_adminfilters_schema', output=self.path, stdout=StringIO())
+            with open(self.path) as schema_file:
+                data = json.load(schema_file)
+            data['models']['scheduler.Event']['fingerprint'] = 'stale'
+            with open(self.path, 'w') as schema_file:
+                json.dump(data, schema_file)
+            schema._schema = None
+            schema.load(self.path)
+            self.assertEqual(schema.get_model_schema(Event), None)
+
+    def test_entry_with_changed_labels_is_ignored(self):
+        status = Event._meta.get_field('status')
+        with patched(schema, _schema=None):
+            call_command('build_adminfilters_schema', output=self.path, stdout=StringIO())
+            schema.load(self.path)
+            self.assertNotEqual(schema.get_model_schema(Event), None)
+            renamed_choices = [(value, u'renamed') for value, label in status.choices]
+            for changes in ({'verbose_name': u'state'}, {'_choices': renamed_choices}):
+                schema._model_schemas.clear()
+                with patched(status, **changes):
+                    self.assertEqual(schema.get_model_schema(Event), None)
+
+    def test_choices_are_used_for_language_of_schema(self):
+        with patched(schema, _schema=None):
+            call_command('build_adminfilters_schema', output=self.path, stdout=StringIO())
+            with open(self.path) as schema_file:
+                data = json.load(schema_file)
+            data['models']['scheduler.Event']['fields']['status']['choices'][0][1] = 'precomputed'
+            with open(self.path, 'w') as schema_file:
+                json.dump(data, schema_file)
+            schema._schema = None
+            schema.load(self.path)
+            query = CustomQuery(custom_filter=self.default_filter, field='status', value='0')
+            with translation.override('en-us'):
+                self.assertEqual(query.choices[0], ('0', 'precomputed'))
+            with translation.override('uk'):
+                self.assertEqual(query.choices[0], ('0', 'New'))
+
@@ -0,0 +1,87 @@
+from django.contrib import admin
+
+from adminfilters import snapshots
+from adminfilters.models import CustomFilter
+from scheduler.models import Category, Event
+
+from .base import AdminFiltersTransactionTestCase, CHANGELIST_URL, SAVE_FILTER_URL, patched
+
+
+class ShardedChangeListTest(AdminFiltersTransactionTestCase):
+    """Events are split between default and shard databases of test settings, shards are queried by workers."""
+
+    def setUp(self):
+        super(ShardedChangeListTest, self).setUp()
+        category = Category.objects.using('shard').create(name=u'category 1')
+        for i in range(4):
+            event = Event.objects.using('shard').create(name=u'shard event %d' % i, status=i % 2,
+                                                        description=u'meeting word%d' % i)
+            if i % 2:
+                event.category.add(category)
+
+    def run(self, *args, **kwargs):
+        with patched(admin.site._registry[Event], shard_databases=('default', 'shard')):
+            return super(ShardedChangeListTest, self).run(*args, **kwargs)
+
+    def rows(self, response):
+        return sorted((obj._state.db, obj.pk) for obj in response.context['cl'].result_list)
+
+    def expected_rows(self, **lookups):
+        return sorted((alias, pk) for alias in ('default', 'shard')
+                      for pk in Event.objects.using(alias).filter(**lookups).values_list('pk', flat=True))
+
+    def test_counts_and_pages_are_merged(self):
+        self.save_filter({'status': ('exact', '1')})
+        response = self.changelist()
+        self.assertEqual(self.rows(response), self.expected_rows(status=1))
+        self.assertEqual(response.context['cl'].result_count, len(self.expected_rows(status=1)))
+        self.assertEqual(response.context['cl'].full_result_count, 34)
+
+    def test_criteria_of_multi_valued_relation(self):
+        self.save_filter({'category__name': ('icontains', 'category 1')})
+        self.assertEqual(self.rows(self.changelist()), self.expected_rows(category__name__icontains='category 1'))
+
+    def test_search_in_multi_valued_relation(self):
+        self.save_filter({'category__name': ('search', 'category 1')})
+        self.assertEqual(self.rows(self.changelist()), self.expected_rows(category__name__icontains='category 1'))
+
+    def test_snapshot_isnt_used(self):
+        self.save_filter({'status': ('exact', '1')})
+        preset = CustomFilter.objects.create(user=self.user, name='active', app_name='scheduler', model_name='Event',
+                                             path_info=self.default_filter.path_info)
+        for query in self.default_filter.queries.all():
+            query.pk, query.custom_filter = None, preset
+            query.save()
+        self.client.get(SAVE_FILTER_URL, {'load_adminfilters': preset.pk})
+        # snapshot taken before model admin was sharded
+        snapshots.materialize(self.default_filter, admin.site._registry[Event])
+        response = self.changelist()
+        self.assertEqual(response.context['cl'].snapshot, None)
+        self.assertEqual(self.rows(response), self.expected_rows(status=1))
+
+    def delete_selected(self, selected, **params):
+        params.update({'action': 'delete_selected', 'index': 0, '_selected_action': selected})
+        return self.client.post(CHANGELIST_URL, params)
+
+    def test_rows_are_selected_with_database(self):
+        response = self.changelist()
+        self.assertIn('value="shard:1"', response.content)
+        self.assertIn('value="default:1"', response.content)
+
+    def test_action_deletes_selected_rows_of_their_database_only(self):
+        response = self.delete_selected(['default:1', 'shard:2'], post='yes')
+        self.assertEqual(response.status_code, 302)
+        # rows with the same primary keys on the other database aren't selected
+        self.assertEqual(sorted(Event.objects.values_list('pk', flat=True)), range(2, 31))
+        self.assertEqual(sorted(Event.objects.using('shard').values_list('pk', flat=True)), [1, 3, 4])
+
+    def test_confirmation_keeps_databases_of_selected_rows(self):
+        response = self.delete_selected(['shard:2'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('value="shard:2"', response.content)
+        self.assertNotIn('value="default:2"', response.content)
+
+    def test_rows_selected_without_database_are_ignored(self):
+        self.delete_selected(['1', '2'], post='yes')
+        self.assertEqual(Event.objects.count(), 30)
+        self.assertEqual(Event.objects.using('shard').count(), 4)
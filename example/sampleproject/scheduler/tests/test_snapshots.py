@@ -0,0 +1,30 @@
+from StringIO import StringIO
+
+from django.core.management import call_command
+
+from adminfilters.models import CustomFilter
+
+from .base import AdminFiltersTestCase, SAVE_FILTER_URL
+
+
+class SnapshotTest(AdminFiltersTestCase):
+
+    def test_loaded_filter_set_is_served_from_snapshot(self):
+        self.save_filter({'status': ('exact', '2')})
+        preset = CustomFilter.objects.create(user=self.user, name='finished', app_name='scheduler', model_name='Event',
+                                             path_info=self.default_filter.path_info)
+        for query in self.default_filter.queries.all():
+            query.pk, query.custom_filter = None, preset
+            query.save()
+        self.client.get(SAVE_FILTER_URL, {'load_adminfilters': preset.pk})
+        call_command('materialize_adminfilters', stdout=StringIO())
+
+        response = self.changelist()
+        self.assertNotEqual(response.context['cl'].snapshot, None)
+        self.assertEqual(self.result_pks(response), self.event_pks(status=2))
+        self.assertContains(response, 'Show live results')
+
+        self.client.get(response.request['PATH_INFO'], {'live_adminfilters': '1'})
+        response = self.changelist()
+        self.assertEqual(response.context['cl'].snapshot, None)
+        self.assertEqual(self.result_pks(response), self.event_pks(status=2))
@@ -0,0 +1,44 @@
+from adminfilters.models import CustomQueryValue
+
+from .base import AdminFiltersTestCase
+
+
+class ValueListTest(AdminFiltersTestCase):
+
+    def stored_values(self):
+        values = CustomQueryValue.objects.filter(query__custom_filter=self.default_filter)
+        return sorted(values.values_list('number', flat=True))
+
+    def test_integer_list(self):
+        self.save_filter({'importance': ('in_list', '')}, importance_list='1, 2\n5')
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks(importance__in=[1, 2, 5]))
+
+    def test_empty_list_keeps_stored_values(self):
+        self.save_filter({'importance': ('in_list', '')}, importance_list='1, 2')
+        self.save_filter({'importance': ('in_list', '')}, importance_list='')
+        self.assertEqual(self.stored_values(), [1, 2])
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks(importance__in=[1, 2]))
+
+    def test_new_list_replaces_stored_values(self):
+        self.save_filter({'importance': ('in_list', '')}, importance_list='1, 2')
+        self.save_filter({'importance': ('in_list', '')}, importance_list='3')
+        self.assertEqual(self.stored_values(), [3])
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks(importance=3))
+
+    def test_invalid_and_duplicate_values_are_skipped(self):
+        self.save_filter({'importance': ('in_list', '')}, importance_list='1; 1, x\n2.5 4')
+        self.assertEqual(self.stored_values(), [1, 4])
+
+    def test_list_above_variable_limit_of_sqlite(self):
+        names = [u'event %d' % i for i in range(3000)]
+        self.save_filter({'name': ('in_list', '')}, name_list='\n'.join(names))
+        self.assertEqual(CustomQueryValue.objects.filter(query__custom_filter=self.default_filter).count(), 3000)
+        self.assertEqual(self.result_pks(self.changelist()), self.event_pks())
+
+    def test_list_of_multi_valued_relation(self):
+        self.save_filter({'category__name': ('in_list', '')}, category__name_list='category 1\ncategory 2')
+        expected = sorted(set(self.event_pks(category__name__in=['category 1', 'category 2'])))
+        response = self.changelist()
+        # events in both categories are listed and counted once
+        self.assertEqual(self.result_pks(response), expected)
+        self.assertEqual(response.context['cl'].result_count, len(expected))
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from adminfilters import caching, warmup
+from adminfilters.models import CustomFilter
+from scheduler.models import Event
+
+from .base import AdminFiltersTestCase, CHANGELIST_URL, patched
+
+
+class WarmUpTest(AdminFiltersTestCase):
+
+    def tearDown(self):
+        super(WarmUpTest, self).tearDown()
+        cache.clear()
+
+    def warm_up(self, user):
+        custom_filter = CustomFilter.objects.get(user=user, app_name='scheduler', model_name='Event', default=True)
+        warmup.warm_filter(custom_filter, self.model_admin)
+        return warmup.cached_count(custom_filter, self.model_admin.queryset_cache_scope(user.pk))
+
+    def test_counts_are_cached_per_user(self):
+        self.other_user.is_staff = self.other_user.is_superuser = True
+        self.other_user.save()
+        self.client.login(username='bob', password='password')
+        self.client.get(CHANGELIST_URL, {'use_new_filters': 'true'})
+        self.client.get(CHANGELIST_URL)
+        with patched(self.model_admin, get_queryset=lambda request: Event.objects.filter(user=request.user)):
+            self.assertEqual(self.warm_up(self.user), Event.objects.filter(user=self.user).count())
+            self.assertEqual(self.warm_up(self.other_user), Event.objects.filter(user=self.other_user).count())
+
+    def warmup_queries(self, **settings):
+        self.save_filter({'user': ('exact', str(self.other_user.pk))})
+        custom_filter = self.default_filter
+        cache.clear()
+        with patched(caching, **settings):
+            with CaptureQueriesContext(connection) as context:
+                warmup.warm_filter(custom_filter, self.model_admin)
+        return context.captured_queries
+
+    def test_choices_are_warmed_up_only_when_cached(self):
+        queries = self.warmup_queries(ADMINFILTERS_CACHE_CHOICES=False)
+        self.assertFalse([query for query in queries if 'GROUP BY' in query['sql']])
+        # queries of filter set, values of relation field and related objects
+        self.assertEqual(len(self.warmup_queries(ADMINFILTERS_CACHE_CHOICES=True)), len(queries) + 3)
+
+    def test_compiled_params_are_warmed_up(self):
+        self.warmup_queries(ADMINFILTERS_CACHE_FRAGMENTS=True)
+        custom_filter = self.default_filter
+        with patched(caching, ADMINFILTERS_CACHE_FRAGMENTS=True):
+            with self.assertNumQueries(0):
+                filter_params = custom_filter.get_compiled_params()[0]
+        self.assertEqual(filter_params.keys(), ['user__exact'])
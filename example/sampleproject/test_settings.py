@@ -0,0 +1,25 @@
+"""Settings for running tests of adminfilters against the sample application."""
+from settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'scheduler.sqlite3',
+        # queries run by worker threads use their own connections, so test database isn't in memory
+        'TEST_NAME': 'test-scheduler.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'scheduler-replica.sqlite3',
+        'TEST_NAME': 'test-scheduler-replica.sqlite3',
+    },
+    'shard': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'scheduler-shard.sqlite3',
+        'TEST_NAME': 'test-scheduler-shard.sqlite3',
+    },
+}
+
+ROOT_URLCONF = 'urls'
+PASSWORD_HASHERS = ('django.contrib.auth.hashers.MD5PasswordHasher',)
+SOUTH_TESTS_MIGRATE = True